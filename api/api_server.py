@@ -1,127 +1,172 @@
-from fastapi import FastAPI, Query, HTTPException, Request
-import sqlite3
+from fastapi import FastAPI, Query, HTTPException, Request, Response
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 import json
 
-app = FastAPI()
+from dotenv import load_dotenv
+
+from database.db import run_db, run_read, close_pool
+from logging_config import logger
+import metrics
+
+# .env тот же, что у бота; config не импортируем — без BOT_TOKEN он завершает процесс
+load_dotenv(override=True)
+REQUIRED_CHAT_ID = os.getenv("REQUIRED_CHAT_ID")
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def map_group_to_heat(group_name: str) -> str:
+    if group_name.lower() == "fast":
+        return "Группа 1"
+    elif group_name.lower() == "standard":
+        return "Группа 2"
+    else:
+        return "Группа 3"
+
+
+def _training_version(conn, date_key: str):
+    return conn.execute("""
+        SELECT t.id, COALESCE(v.version, 0)
+        FROM trainings t
+        LEFT JOIN training_versions v ON v.training_id = t.id
+        WHERE t.date_key = ? AND t.status != 'cancelled'
+        LIMIT 1
+    """, (date_key,)).fetchone()
+
+
+# Участники тренировки; план запроса проверяет tests/test_query_plans.py
+PARTICIPANTS_SQL = """
+    SELECT u.nickname, s.group_name, s.channel
+    FROM slots s
+    JOIN users u ON u.user_id = s.user_id
+    WHERE s.training_id = ? AND s.status = 'confirmed'
+"""
+
+
+def _participants(conn, training_id: int):
+    return conn.execute(PARTICIPANTS_SQL, (training_id,)).fetchall()
+
+
+# Ответ по дню: date_key -> (training_id, version, тело). Версию поднимают триггеры
+# на slots / trainings / users (миграция 0014), так что устаревший ответ не отдаётся.
+_participants_cache: dict[str, tuple[int, int, bytes]] = {}
+
 
 @app.get("/api/participants_by_date")
-def get_participants_by_date(date: str = Query(..., description="Формат DD.MM.YYYY")):
+async def get_participants_by_date(request: Request, date: str = Query(..., description="Формат DD.MM.YYYY")):
     try:
         date_obj = datetime.strptime(date, "%d.%m.%Y")
-        iso_prefix = date_obj.strftime("%Y-%m-%d")
+        date_key = date_obj.strftime("%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат даты. Используйте DD.MM.YYYY")
 
-    conn = sqlite3.connect(os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "bot.db"))
-    cursor = conn.cursor()
-
-    # Найти ID тренировки
-    cursor.execute("""
-        SELECT id FROM trainings WHERE date LIKE ? AND  status != 'cancelled' LIMIT 1
-    """, (f"{iso_prefix}%",))
-    row = cursor.fetchone()
+    # Найти ID тренировки и её версию — один запрос по индексу
+    row = await run_read(_training_version, date_key)
     if not row:
         raise HTTPException(status_code=404, detail="Тренировка не найдена")
-    training_id = row[0]
-
-    # Получить пилотов и каналы
-    cursor.execute("""
-        SELECT u.nickname, s.group_name, s.channel
-        FROM slots s
-        JOIN users u ON u.user_id = s.user_id
-        WHERE s.training_id = ? AND s.status = 'confirmed'
-    """, (training_id,))
-
-    def map_group_to_heat(group_name: str) -> str:
-        if group_name.lower() == "fast":
-            return "Группа 1"
-        elif group_name.lower() == "standard":
-            return "Группа 2"
-        else:
-            return "Группа 3"
-
-    return [
-        {
-            "name": nickname,
-            "callsign": nickname,
-            "group": group,
-            "heat": map_group_to_heat(group),
-            "channel": channel
-        }
-        for nickname, group, channel in cursor.fetchall()
-    ]
-
-from payments.service import apply_payment
+    training_id, version = row
+
+    etag = f'"{training_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    cached = _participants_cache.get(date_key)
+    if cached and cached[:2] == (training_id, version):
+        body = cached[2]
+    else:
+        # Получить пилотов и каналы
+        rows = await run_read(_participants, training_id)
+        body = json.dumps([
+            {
+                "name": nickname,
+                "callsign": nickname,
+                "group": group,
+                "heat": map_group_to_heat(group),
+                "channel": channel
+            }
+            for nickname, group, channel in rows
+        ], ensure_ascii=False).encode()
+        _participants_cache[date_key] = (training_id, version, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+from payments.service import apply_succeeded_event
+from payments.events import notify_payment_succeeded
 @app.post("/yookassa/webhook")
 async def yookassa_webhook(request: Request):
-    data = await request.json()
+    # Событие, которое нельзя применить ни сейчас, ни при повторе (битый JSON, нет или не число
+    # metadata.payment_id), подтверждаем 200 с предупреждением в логе: на 5xx Юкасса повторяет
+    # доставку сутками. Платёж, если он наш, всё равно найдёт сверка по yookassa_payment_id.
+    try:
+        data = await request.json()
+    except ValueError:
+        logger.warning("[yookassa_webhook] тело не JSON, событие пропущено")
+        return {"ok": True}
 
-    if data.get("event") != "payment.succeeded":
+    if not isinstance(data, dict) or data.get("event") != "payment.succeeded":
         return {"ok": True}
 
-    payment_obj = data.get("object", {})
+    payment_obj = data.get("object")
+    payment_obj = payment_obj if isinstance(payment_obj, dict) else {}
     yk_payment_id = payment_obj.get("id")
-    metadata = payment_obj.get("metadata", {})
+    metadata = payment_obj.get("metadata")
+    metadata = metadata if isinstance(metadata, dict) else {}
 
     internal_payment_id = metadata.get("payment_id")
-    if not internal_payment_id:
+    try:
+        internal_payment_id = int(internal_payment_id)
+    except (TypeError, ValueError):
+        logger.warning(
+            f"[yookassa_webhook] платёж {yk_payment_id}: metadata.payment_id={internal_payment_id!r}, событие пропущено"
+        )
         return {"ok": True}
 
-    db_path = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)),
-        "database",
-        "bot.db"
+    # одна транзакция в потоке пула; повтор вебхука — один поиск по ключу webhook_events
+    event_key = f"payment.succeeded:{yk_payment_id or internal_payment_id}"
+    applied = await run_db(
+        apply_succeeded_event, event_key, internal_payment_id, yk_payment_id, REQUIRED_CHAT_ID
     )
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    if applied:
+        # будим бота: он сразу обновит сообщение об оплате, не дожидаясь страховочного прохода
+        notify_payment_succeeded(applied)
 
-    cursor.execute("""
-        SELECT *
-        FROM payments
-        WHERE id = ?
-    """, (internal_payment_id,))
-    payment = cursor.fetchone()
+    return {"ok": True}
 
-    if not payment:
-        conn.close()
-        return {"ok": True}
 
-    if payment["status"] == "succeeded":
-        conn.close()
-        return {"ok": True}
+@app.get("/metrics")
+async def metrics_endpoint():
+    # метрики этого процесса: БД, Юкасса, а при BOT_IN_API=1 — ещё хендлеры, Bot API и задачи бота
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-    cursor.execute("""
-        UPDATE payments
-        SET
-            status = 'succeeded',
-            yookassa_payment_id = ?,
-            paid_at = ?
-        WHERE id = ? AND status != 'succeeded'
-    """, (
-        yk_payment_id,
-        datetime.now().isoformat(),
-        internal_payment_id
-    ))
-
-    if cursor.rowcount == 0:
-        conn.close()
-        return {"ok": True}
-
-    conn.commit()
 
-    cursor.execute("""
-        SELECT *
-        FROM payments
-        WHERE id = ?
-    """, (internal_payment_id,))
-    payment = cursor.fetchone()
+# Совмещённый деплой: бот принимает апдейты Telegram через этот же FastAPI
+# (BOT_IN_API=1 и WEBHOOK_URL, указывающий на api_server). bot.py тогда отдельно не запускается.
+if os.getenv("BOT_IN_API") == "1":
+    from bot import bot, dp, setup_dispatcher
+    from database.db import init_db
+    from webhook import build_fastapi_router, drain_updates, register_webhook
 
-    conn.close()
+    setup_dispatcher()
+    app.include_router(build_fastapi_router(dp, bot))
 
-    apply_payment(dict(payment))
+    @asynccontextmanager
+    async def bot_lifespan(_app):
+        init_db()
+        await dp.emit_startup(bot=bot, dispatcher=dp)
+        await register_webhook(bot, dp)
+        yield
+        await drain_updates()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
 
-    return {"ok": True}
+    app.router.lifespan_context = bot_lifespan
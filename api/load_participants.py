@@ -0,0 +1,57 @@
+"""
+Нагрузочный прогон /api/participants_by_date — как опрос программы хронометража в день гонки.
+
+    python -m api.load_participants --url http://127.0.0.1:8000 --date 18.10.2026 --clients 50 --seconds 20
+
+Каждый клиент в цикле опрашивает эндпоинт; с --etag он, как нормальный поллер,
+шлёт If-None-Match и получает 304, пока список участников не изменился.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+
+async def client(session: aiohttp.ClientSession, url: str, params: dict, deadline: float, use_etag: bool,
+                 latencies: list[float], statuses: dict[int, int]):
+    etag = None
+    while time.perf_counter() < deadline:
+        headers = {"If-None-Match": etag} if use_etag and etag else {}
+        started = time.perf_counter()
+        async with session.get(url, params=params, headers=headers) as response:
+            await response.read()
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            etag = response.headers.get("ETag", etag)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--date", required=True, help="DD.MM.YYYY")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--etag", action="store_true", help="слать If-None-Match")
+    args = parser.parse_args()
+
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    deadline = time.perf_counter() + args.seconds
+    url = args.url.rstrip("/") + "/api/participants_by_date"
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.clients)) as session:
+        await asyncio.gather(*(
+            client(session, url, {"date": args.date}, deadline, args.etag, latencies, statuses)
+            for _ in range(args.clients)
+        ))
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"запросов: {len(latencies)}, {len(latencies) / args.seconds:.0f} rps, статусы: {statuses}")
+    print(f"p50 {quantiles[49] * 1000:.1f} мс, p99 {quantiles[98] * 1000:.1f} мс, max {latencies[-1] * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,75 +1,201 @@
 import asyncio
-from datetime import datetime
-from database.db import get_connection
-from config import ADMINS, REQUIRED_CHAT_ID
+from datetime import datetime, timedelta
+from aiogram.exceptions import TelegramBadRequest
+from database.db import fetch_one, fetch_all, execute, run_db
+from config import ADMINS, REQUIRED_CHAT_ID, PENDING_SLOT_TTL
 from logging_config import logger
-from handlers.booking import get_group_label, TOTAL_SLOTS
+from handlers.booking import get_group_label, TOTAL_SLOTS, seat_maps
+from payments.client import yookassa
+from payments.events import PaymentEventListener
+from payments.reconcile import check_payment, reconcile_payments
+from payments.service import expire_slot
+from notifications.outbox import enqueue, enqueue_many, wake
+from database.tg_users import resolve_tg_user
+
+
+# Страховочный полный проход по payments: ловит платежи, чьё событие бот пропустил
+# (был перезапущен или api_server не достучался до сокета). Запускает планировщик.
+SWEEP_INTERVAL = 60
+
+# Проверка неоплаченных броней (PENDING_SLOT_TTL), сек
+REAP_INTERVAL = 60
+
+# Сверка зависших платежей с Юкассой, сек
+RECONCILE_INTERVAL = 300
+
+# событие и страховочный проход не должны обрабатывать один платёж одновременно
+_processing = asyncio.Lock()
+
+
+async def fetch_shown_payments(payment_ids: set[int] | None = None):
+    """Оплаченные платежи, о которых пользователь ещё не знает; payment_ids=None — все."""
+    sql = """
+        SELECT
+            p.id,
+            p.user_id,
+            p.chat_id,
+            p.message_id,
+            p.target_type,
+            p.target_id
+        FROM payments p
+        WHERE p.status = 'succeeded'
+          AND p.ui_status = 'shown'
+          AND p.target_type IN ('slot', 'subscription')
+    """
+    params = ()
+    if payment_ids is not None:
+        ids = list(payment_ids)
+        sql += f" AND p.id IN ({','.join('?' for _ in ids)})"
+        params = tuple(ids)
+    return await fetch_all(sql, params)
 
 
 async def payments_ui_watcher(bot):
+    """Сервис: обрабатывает платежи, о которых api_server сообщил через сокет."""
     logger.info("[payments_ui_watcher] started")
 
-    while True:
-        await asyncio.sleep(5)
-
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT
-                    p.id,
-                    p.user_id,
-                    p.chat_id,
-                    p.message_id,
-                    p.target_type,
-                    p.target_id
-                FROM payments p
-                WHERE p.status = 'succeeded'
-                  AND p.ui_status = 'shown'
-                  AND p.target_type IN ('slot', 'subscription')
-            """)
-            payments = cursor.fetchall()
-
-        for payment_id, user_id, chat_id, message_id, target_type, target_id in payments:
-            try:
-                if target_type == "slot":
-                    await handle_slot_payment(
-                        bot=bot,
-                        payment_id=payment_id,
-                        user_id=user_id,
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        slot_id=target_id
-                    )
-
-                elif target_type == "subscription":
-                    await handle_subscription_payment(
-                        bot=bot,
-                        payment_id=payment_id,
-                        user_id=user_id,
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        subscription_id=target_id
-                    )
-
-                else:
-                    logger.warning(
-                        f"[payments_ui_watcher] unknown target_type={target_type}"
-                    )
+    listener = PaymentEventListener()
+    listener.start()
+    try:
+        while True:
+            payment_ids = await listener.wait(None)
+            async with _processing:
+                await process_payments(bot, await fetch_shown_payments(payment_ids))
+    finally:
+        listener.close()
+
 
+async def sweep_payments(bot):
+    """Полный проход по неотображённым платежам. Планировщик: при старте и раз в SWEEP_INTERVAL."""
+    async with _processing:
+        await process_payments(bot, await fetch_shown_payments())
+
+
+async def reap_pending_slots(bot):
+    """
+    Снимает pending-записи, не оплаченные за PENDING_SLOT_TTL минут, и освобождает каналы.
+    СБП-бронь перед снятием сверяется с Юкассой: прошедший платёж, чей вебхук потерялся,
+    применяется. С поздним вебхуком гонки нет — обе стороны меняют слот в транзакции
+    при условии на статус, а поздняя оплата возвращает бронь, если канал ещё свободен.
+    Планировщик: раз в REAP_INTERVAL.
+    """
+    for payment_type, ttl in PENDING_SLOT_TTL.items():
+        if ttl <= 0:
+            continue
+
+        stale = await fetch_all("""
+            SELECT s.id, p.id, p.yookassa_payment_id
+            FROM slots s
+            LEFT JOIN payments p
+                ON p.target_type = 'slot' AND p.target_id = s.id AND p.status = 'pending'
+            WHERE s.status = 'pending'
+              AND s.created_at < ?
+              AND s.payment_type = ?
+        """, ((datetime.now() - timedelta(minutes=ttl)).isoformat(), payment_type))
+
+        for slot_id, payment_id, yookassa_payment_id in stale:
+            try:
+                if yookassa_payment_id and await paid_in_yookassa(bot, payment_id, yookassa_payment_id):
+                    continue
+                await release_slot(bot, slot_id, ttl)
             except Exception as e:
-                logger.exception(
-                    f"[payments_ui_watcher] error for payment {payment_id}: {e}"
+                # Юкасса недоступна и т.п. — бронь не снимаем вслепую, повторим в следующий проход
+                logger.exception(f"[reap_pending_slots] slot {slot_id}: {e}")
+
+
+async def paid_in_yookassa(bot, payment_id: int, yookassa_payment_id: str) -> bool:
+    """True — платёж в Юкассе не брошен (прошёл или ещё проводится), бронь снимать нельзя."""
+    status, applied = await check_payment(payment_id, yookassa_payment_id)
+    if applied:
+        logger.warning(f"[reap_pending_slots] платёж {payment_id} прошёл без вебхука — применён")
+        await show_applied_payments(bot, {applied})
+    return status not in ("pending", "canceled")
+
+
+async def reconcile_job(bot):
+    """Сверка pending-платежей с Юкассой (payments/reconcile.py). Планировщик: раз в RECONCILE_INTERVAL."""
+    counts, applied = await reconcile_payments()
+    if applied:
+        await show_applied_payments(bot, applied)
+    if any(counts.values()):
+        logger.info(
+            f"[reconcile] исправлено {counts['fixed']}, истекло {counts['expired']}, "
+            f"ещё ждут {counts['pending']}, ошибок {counts['failed']}"
+        )
+
+
+async def show_applied_payments(bot, payment_ids: set[int]):
+    """Платежи, применённые сверкой, а не вебхуком: сокета не было — обрабатываем сами."""
+    async with _processing:
+        await process_payments(bot, await fetch_shown_payments(payment_ids))
+
+
+async def release_slot(bot, slot_id: int, ttl: int):
+    expired = await run_db(expire_slot, slot_id)
+    if not expired:
+        return
+
+    training_id, group, channel, user_id, date_str, chat_id, message_id = expired
+    seat_maps.apply(training_id, group, channel, user_id, None)
+
+    date_fmt = datetime.fromisoformat(date_str).strftime("%d.%m.%Y %H:%M")
+    text = (
+        f"📅 <b>Тренировка {date_fmt}</b>\n"
+        f"⌛ Бронь канала <b>{channel}</b> ({get_group_label(group)}) снята: оплата не поступила за {ttl} мин.\n"
+        f"Если оплата всё же пройдёт, запись восстановится, пока канал свободен."
+    )
+
+    # сообщение с кнопкой оплаты — заменяем; нет его или оно удалено — пишем отдельно
+    if chat_id and message_id:
+        try:
+            await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode="HTML")
+            return
+        except TelegramBadRequest as e:
+            logger.warning(f"[reap_pending_slots] сообщение оплаты слота {slot_id} не изменено: {e}")
+    await enqueue(user_id, text, parse_mode="HTML")
+
+
+async def process_payments(bot, payments):
+    for payment_id, user_id, chat_id, message_id, target_type, target_id in payments:
+        try:
+            if target_type == "slot":
+                await handle_slot_payment(
+                    bot=bot,
+                    payment_id=payment_id,
+                    user_id=user_id,
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    slot_id=target_id
+                )
+
+            elif target_type == "subscription":
+                await handle_subscription_payment(
+                    bot=bot,
+                    payment_id=payment_id,
+                    user_id=user_id,
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    subscription_id=target_id
                 )
 
             else:
-                # помечаем UI как обработанный
-                with get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "UPDATE payments SET ui_status = 'paid' WHERE id = ?",
-                        (payment_id,)
-                    )
-                    conn.commit()
+                logger.warning(
+                    f"[payments_ui_watcher] unknown target_type={target_type}"
+                )
+
+        except Exception as e:
+            logger.exception(
+                f"[payments_ui_watcher] error for payment {payment_id}: {e}"
+            )
+
+        else:
+            # помечаем UI как обработанный
+            await execute(
+                "UPDATE payments SET ui_status = 'paid' WHERE id = ?",
+                (payment_id,)
+            )
+
+
 async def handle_slot_payment(
     *,
     bot,
@@ -79,27 +205,39 @@ async def handle_slot_payment(
     message_id: int,
     slot_id: int
 ):
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT
-                s.group_name,
-                s.channel,
-                t.date,
-                t.id
-            FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            WHERE s.id = ?
-        """, (slot_id,))
-        row = cursor.fetchone()
+    row = await fetch_one("""
+        SELECT
+            s.group_name,
+            s.channel,
+            t.date,
+            t.id,
+            s.status
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.id = ?
+    """, (slot_id,))
 
     if not row:
         return
 
-    group, channel, date_str, training_id = row
+    group, channel, date_str, training_id, slot_status = row
     date_fmt = datetime.fromisoformat(date_str).strftime("%d.%m.%Y %H:%M")
     group_label = get_group_label(group)
 
+    if slot_status == "expired":
+        # оплата пришла после снятия брони, а канал уже занят (confirm_slot не смог вернуть слот)
+        await handle_late_slot_payment(
+            bot=bot,
+            payment_id=payment_id,
+            user_id=user_id,
+            chat_id=chat_id,
+            message_id=message_id,
+            date_fmt=date_fmt,
+            group_label=group_label,
+            channel=channel
+        )
+        return
+
     # 1️⃣ обновляем сообщение оплаты (убираем кнопки)
     await bot.edit_message_text(
         chat_id=chat_id,
@@ -120,30 +258,17 @@ async def handle_slot_payment(
 #       f"🏁 {group_label}, канал {channel}"
 #   )
 
-    # 3️⃣ считаем свободные места
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM slots
-            WHERE training_id = ? AND status = 'confirmed'
-        """, (training_id,))
-        booked = cursor.fetchone()[0]
-
-    free_slots = TOTAL_SLOTS - booked
+    # 3️⃣ считаем свободные места (слот подтвердил api_server — карту мест перечитываем)
+    seat_maps.invalidate(training_id)
+    wake()  # api_server мог поставить в outbox «все места закончились» — диспетчер бота об этом не знает
+    training = await seat_maps.get(training_id)
+    free_slots = TOTAL_SLOTS - training.confirmed_count()
 
     # 4️⃣ уведомление в клубный чат
-    try:
-        chat_member = await bot.get_chat_member(user_id, user_id)
-        display_name = (
-            f"@{chat_member.user.username}"
-            if chat_member.user.username
-            else chat_member.user.full_name
-        )
-    except:
-        display_name = f"ID {user_id}"
+    username, full_name = await resolve_tg_user(bot, user_id)
+    display_name = f"@{username}" if username else (full_name or f"ID {user_id}")
 
-    await bot.send_message(
+    await enqueue(
         REQUIRED_CHAT_ID,
         f"🛸 {display_name} записался на тренировку <b>{date_fmt}</b>\n"
         f"Осталось мест: {free_slots}/{TOTAL_SLOTS}",
@@ -151,18 +276,56 @@ async def handle_slot_payment(
     )
 
     # 5️⃣ уведомление админам
-    for admin in ADMINS:
-        await bot.send_message(
-            admin,
-        (    
+    await enqueue_many(
+        ADMINS,
+        (
             f"✅ {display_name} записался на тренировку:\n"
             f"📅 {date_fmt}\n"
             f"🏁 <b>{group_label}</b>\n"
             f"📡 Канал: <b>{channel}</b>\n"
             f"💳 Оплата СБП\n"
         ),
-            parse_mode="HTML"
-        )
+        parse_mode="HTML"
+    )
+async def handle_late_slot_payment(
+    *,
+    bot,
+    payment_id: int,
+    user_id: int,
+    chat_id: int,
+    message_id: int,
+    date_fmt: str,
+    group_label: str,
+    channel: str
+):
+    await bot.edit_message_text(
+        chat_id=chat_id,
+        message_id=message_id,
+        text=(
+            f"📅 <b>Тренировка {date_fmt}</b>\n"
+            f"✅ <b>Оплата получена</b>, но бронь к этому времени была снята,\n"
+            f"а канал <b>{channel}</b> ({group_label}) уже занял другой участник.\n"
+            f"Администратор свяжется с вами: перенос записи или возврат."
+        ),
+        parse_mode="HTML"
+    )
+
+    username, full_name = await resolve_tg_user(bot, user_id)
+    display_name = f"@{username}" if username else (full_name or f"ID {user_id}")
+
+    await enqueue_many(
+        ADMINS,
+        (
+            f"⚠️ <b>Оплата после снятия брони</b>\n"
+            f"👤 {display_name}\n"
+            f"📅 {date_fmt}\n"
+            f"🏁 <b>{group_label}</b>, канал <b>{channel}</b> уже занят\n"
+            f"💳 Нужен перенос или возврат, Payment ID: <code>{payment_id}</code>"
+        ),
+        parse_mode="HTML"
+    )
+
+
 async def handle_subscription_payment(
     *,
     bot,
@@ -172,15 +335,12 @@ async def handle_subscription_payment(
     message_id: int,
     subscription_id: int
 ):
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT s.count, u.subscription
-            FROM subscriptions s
-            JOIN users u ON u.user_id = s.user_id
-            WHERE s.id = ?
-        """, (subscription_id,))
-        row = cursor.fetchone()
+    row = await fetch_one("""
+        SELECT s.count, u.subscription
+        FROM subscriptions s
+        JOIN users u ON u.user_id = s.user_id
+        WHERE s.id = ?
+    """, (subscription_id,))
 
     if not row:
         return
@@ -200,26 +360,18 @@ async def handle_subscription_payment(
     )
 
     # 2️⃣ получаем display_name (КАК В СЛОТАХ)
-    try:
-        chat_member = await bot.get_chat_member(user_id, user_id)
-        display_name = (
-            f"@{chat_member.user.username}"
-            if chat_member.user.username
-            else chat_member.user.full_name
-        )
-    except:
-        display_name = f"ID {user_id}"
+    username, full_name = await resolve_tg_user(bot, user_id)
+    display_name = f"@{username}" if username else (full_name or f"ID {user_id}")
 
     # 3️⃣ уведомление админам
-    for admin in ADMINS:
-        await bot.send_message(
-            admin,
-            (
-                f"🎟 <b>Оплачен абонемент</b>\n"
-                f"👤 {display_name}\n"
-                f"📦 Куплено: <b>{count}</b>\n"
-                f"📊 Всего: <b>{total}</b>\n"
-                f"🧾 Payment ID: <code>{payment_id}</code>"
-            ),
-            parse_mode="HTML"
-        )
+    await enqueue_many(
+        ADMINS,
+        (
+            f"🎟 <b>Оплачен абонемент</b>\n"
+            f"👤 {display_name}\n"
+            f"📦 Куплено: <b>{count}</b>\n"
+            f"📊 Всего: <b>{total}</b>\n"
+            f"🧾 Payment ID: <code>{payment_id}</code>"
+        ),
+        parse_mode="HTML"
+    )
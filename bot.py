@@ -3,16 +3,28 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
-
 from aiogram.client.session.aiohttp import AiohttpSession
 
-from config import BOT_TOKEN, PROXY
+from aiohttp import web
+
+from config import BOT_TOKEN, PROXY, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, METRICS_HOST, METRICS_PORT
 from handlers import registration, profile, admin, booking, participants, subscription
-from database.db import init_db
+from database.db import init_db, close_pool
+from database.fsm_storage import SQLiteStorage
 from middlewares.private_only import PrivateChatOnlyMiddleware
-from background_tasks import monitor_pending_slots, check_and_send_progrev, monitor_full_trainings
-from background_payments import payments_ui_watcher
+from middlewares.tg_users import TgUserCacheMiddleware
+from middlewares.metrics import HandlerMetricsMiddleware, TelegramMetricsMiddleware
+from background_tasks import monitor_pending_slots, check_and_send_progrev
+from background_payments import (
+    payments_ui_watcher, sweep_payments, SWEEP_INTERVAL,
+    reap_pending_slots, REAP_INTERVAL, reconcile_job, RECONCILE_INTERVAL,
+)
+from payments.client import yookassa
+from notifications.outbox import OutboxDispatcher
+from database.tg_users import refresh_tg_users, REFRESH_INTERVAL
+from scheduler import scheduler
+from webhook import build_aiohttp_app, register_webhook
+from metrics import serve_metrics
 
 
 # --- SESSION ---
@@ -25,6 +37,8 @@ else:
     print("🔌 Работаем без прокси")
     session = AiohttpSession()
 
+session.middleware(TelegramMetricsMiddleware())  # время и ошибки вызовов Bot API
+
 
 # --- BOT (как раньше — глобально) ---
 bot = Bot(
@@ -33,27 +47,40 @@ bot = Bot(
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
 
-dp = Dispatcher(storage=MemoryStorage())
+dp = Dispatcher(storage=SQLiteStorage())
 
 
 async def on_startup(bot: Bot):
-    asyncio.create_task(monitor_pending_slots(bot))
-    asyncio.create_task(check_and_send_progrev(bot))
-    asyncio.create_task(monitor_full_trainings(bot))
-    asyncio.create_task(payments_ui_watcher(bot))
+    scheduler.cron("0 13 * * *", check_and_send_progrev, bot, catch_up=6 * 3600)
+    scheduler.every(900, monitor_pending_slots, bot, jitter=30)
+    scheduler.every(SWEEP_INTERVAL, sweep_payments, bot, jitter=5, run_at_start=True)
+    scheduler.every(REAP_INTERVAL, reap_pending_slots, bot, jitter=5)
+    scheduler.every(RECONCILE_INTERVAL, reconcile_job, bot, jitter=30, run_at_start=True)
+    scheduler.every(REFRESH_INTERVAL, refresh_tg_users, bot, jitter=60)
+    await scheduler.start()
+
+    scheduler.service("payments_ui_watcher", payments_ui_watcher(bot))
+    scheduler.service("outbox", OutboxDispatcher(bot).run())
 
 
 async def on_shutdown(bot: Bot):
+    await scheduler.shutdown()
     await bot.session.close()
+    await yookassa.close()
+    close_pool()
 
 
-async def main():
-    init_db()
-    print("✅ Инициализация БД завершена")
-
+def setup_dispatcher():
     # Middleware
+    # кэш профилей — outer, чтобы видеть и апдейты из групп, которые отсекает PrivateChatOnly
+    tg_users_cache = TgUserCacheMiddleware()
+    dp.message.outer_middleware(tg_users_cache)
+    dp.callback_query.outer_middleware(tg_users_cache)
     dp.message.middleware(PrivateChatOnlyMiddleware(allowed_chat_commands={"/help", "/participants"}))
     dp.callback_query.middleware(PrivateChatOnlyMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
 
     # Routers
     dp.include_router(registration.router)
@@ -68,9 +95,37 @@ async def main():
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
-    print("🚀 Бот запущен...")
-    await dp.start_polling(bot)
+
+async def run_webhook():
+    dp.startup.register(register_webhook)
+    runner = web.AppRunner(build_aiohttp_app(dp, bot))
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    print(f"🚀 Бот запущен (webhook {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH})...")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()  # вызовет dp.shutdown
+
+
+async def main():
+    init_db()
+    print("✅ Инициализация БД завершена")
+
+    setup_dispatcher()
+
+    if WEBHOOK_URL:
+        await run_webhook()
+    else:
+        metrics_runner = await serve_metrics(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        print("🚀 Бот запущен...")
+        await bot.delete_webhook()  # после webhook-режима getUpdates иначе вернёт конфликт
+        try:
+            await dp.start_polling(bot)
+        finally:
+            if metrics_runner:
+                await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
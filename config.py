@@ -17,4 +17,24 @@ CARD = os.getenv("CARD")
 YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
 YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
 YOOKASSA_RETURN_URL = os.getenv("YOOKASSA_RETURN_URL")
-PROXY = os.getenv("PROXY")
\ No newline at end of file
+PROXY = os.getenv("PROXY")
+
+# Сколько минут неоплаченная (pending) запись держит канал, по типу оплаты; 0 — не снимать
+PENDING_SLOT_TTL = {
+    "yookassa": int(os.getenv("PENDING_TTL_YOOKASSA", "30")),
+    "manual": int(os.getenv("PENDING_TTL_MANUAL", "0")),
+}
+
+# Сверка с Юкассой берёт pending-платежи старше стольких минут
+RECONCILE_AGE_MINUTES = int(os.getenv("RECONCILE_AGE_MINUTES", "10"))
+
+# Webhook вместо polling: задан WEBHOOK_URL — бот слушает WEBHOOK_HOST:WEBHOOK_PORT
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный адрес, например https://bot.whoopclub.ru
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8081"))
+
+# /metrics бота в режиме polling (в режиме webhook — на сервере вебхука); 0 — не поднимать
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
@@ -0,0 +1,196 @@
+"""
+Бенчмарк экранов записи: список «Записаться» и выбор группы одной тренировки.
+
+    python -m database.bench_booking --trainings 3000 --flows 300 --concurrency 20
+
+Поток — то, что делает участник: открывает список ближайших тренировок и выбирает одну.
+counts — прежние хендлеры: в списке по три коррелированных COUNT на тренировку, выбор
+группы — ещё три запроса; availability — один запрос с group_concat и EXISTS на экран;
+seat_maps cold / warm — нынешний SeatMapCache из database/seatmap.py, с пустым и
+прогретым кэшем. concurrency потоков идут одновременно через общий пул run_db, как
+апдейты в боте. Файл БД временный, database/bot.db не трогается.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from database import db
+from database.seatmap import SeatMapCache
+from groups import GROUPS
+
+# занятый канал чаще всего подтверждён; снятые и отменённые брони остаются историей
+ACTIVE_CHOICES = ("confirmed", "confirmed", "pending", "pending_cancel")
+HISTORY_STATUSES = ("expired", "canceled")
+
+
+def fill(trainings: int, users: int, seed: int) -> str:
+    """Тренировки через день на несколько лет вокруг сегодняшнего дня и их слоты; cutoff для списка."""
+    rng = random.Random(seed)
+    now = datetime.now().replace(hour=19, minute=0, second=0, microsecond=0)
+    first = now - timedelta(days=2 * (trainings - 30))
+    with db.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, nickname, system) VALUES (?, ?, 'HDZero')",
+            [(user_id, f"pilot{user_id}") for user_id in range(1, users + 1)],
+        )
+        for n in range(trainings):
+            date = (first + timedelta(days=2 * n)).isoformat()
+            status = "cancelled" if rng.random() < 0.05 else "open"
+            training_id = conn.execute(
+                "INSERT INTO trainings (date, status) VALUES (?, ?)", (date, status)
+            ).lastrowid
+            slots = []
+            for group, cfg in GROUPS.items():
+                for channel in cfg["channels"]:
+                    for _ in range(rng.randint(0, 4)):
+                        slots.append((training_id, rng.randint(1, users), group, channel, rng.choice(HISTORY_STATUSES)))
+                    if rng.random() < 0.7:
+                        slots.append((training_id, rng.randint(1, users), group, channel, rng.choice(ACTIVE_CHOICES)))
+            conn.executemany("""
+                INSERT INTO slots (training_id, user_id, group_name, channel, status, created_at, payment_type)
+                VALUES (?, ?, ?, ?, ?, '2026-01-01T12:00:00', 'manual')
+            """, slots)
+        counts = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+        conn.execute("ANALYZE")
+    print(f"тренировок: {trainings}, слотов: {counts}, пользователей: {users}")
+    return (now - timedelta(hours=1)).isoformat()
+
+
+# --- прежние хендлеры: счётчики в коррелированных подзапросах ---
+
+def counts_list(conn, user_id: int, cutoff: str):
+    return conn.execute("""
+        SELECT t.id, t.date,
+            (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND status IN ('pending', 'confirmed')) AS booked_count,
+            (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND user_id = ? AND status IN ('pending', 'confirmed')) AS user_booked,
+            (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND user_id = ? AND status IN ('pending_cancel')) AS user_pending
+        FROM trainings t
+        WHERE t.status = 'open' AND t.date > ?
+        ORDER BY t.date ASC
+        LIMIT 6
+    """, (user_id, user_id, cutoff)).fetchall()
+
+
+def counts_group(conn, user_id: int, training_id: int):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) FROM slots
+        WHERE training_id = ? AND user_id = ? AND status IN ('pending', 'confirmed', 'pending_cancel')
+    """, (training_id, user_id))
+    already = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT group_name, COUNT(*)
+        FROM slots
+        WHERE training_id = ? AND status IN ('pending', 'confirmed')
+        GROUP BY group_name
+    """, (training_id,))
+    counts = dict(cursor.fetchall())
+    cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
+    return already, counts, cursor.fetchone()
+
+
+# --- один запрос на экран: group_concat и EXISTS ---
+
+def availability(conn, user_id: int, *, training_id: int = None, cutoff: str = None):
+    if training_id is not None:
+        where, params = "t.id = ?", (training_id,)
+    else:
+        where, params = "t.status = 'open' AND t.date > ? ORDER BY t.date ASC LIMIT 6", (cutoff,)
+    rows = conn.execute(f"""
+        SELECT t.id, t.date,
+            (SELECT group_concat(group_name) FROM slots
+             WHERE training_id = t.id AND status IN ('pending', 'confirmed')) AS booked_groups,
+            EXISTS (SELECT 1 FROM slots
+                    WHERE training_id = t.id AND user_id = ? AND status IN ('pending', 'confirmed')) AS user_booked,
+            EXISTS (SELECT 1 FROM slots
+                    WHERE training_id = t.id AND user_id = ? AND status = 'pending_cancel') AS user_pending
+        FROM trainings t
+        WHERE {where}
+    """, (user_id, user_id, *params)).fetchall()
+    return [(row[0], row[1], Counter(row[2].split(",")) if row[2] else Counter(), row[3], row[4]) for row in rows]
+
+
+async def flow_counts(user_id: int, cutoff: str, pick: int):
+    trainings = await db.run_db(counts_list, user_id, cutoff)
+    await db.run_db(counts_group, user_id, trainings[pick % len(trainings)][0])
+
+
+async def flow_availability(user_id: int, cutoff: str, pick: int):
+    trainings = await db.run_db(lambda conn: availability(conn, user_id, cutoff=cutoff))
+    training_id = trainings[pick % len(trainings)][0]
+    await db.run_db(lambda conn: availability(conn, user_id, training_id=training_id))
+
+
+def flow_seat_maps(shared: SeatMapCache | None):
+    """shared=None — свой пустой кэш на каждый поток (invalidate общего сбил бы соседние потоки)."""
+    async def flow(user_id: int, cutoff: str, pick: int):
+        cache = shared or SeatMapCache(GROUPS)
+        trainings = await cache.upcoming(cutoff)
+        seat_map = await cache.get(trainings[pick % len(trainings)].training_id)
+        seat_map.user_status(user_id)
+        for group in GROUPS:
+            seat_map.booked(group)
+    return flow
+
+
+async def run(flow, cutoff: str, flows: int, concurrency: int, users: int) -> list[float]:
+    """flows потоков, не больше concurrency одновременно; время каждого потока в секундах."""
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(n: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await flow(n % users + 1, cutoff, n)
+            timings.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(n) for n in range(flows)))
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    q = statistics.quantiles(timings, n=100)
+    print(f"{name:>15}: {statistics.fmean(timings) * 1e6:8.1f} мкс/поток, "
+          f"p50 {q[49] * 1e6:.1f} мкс, p99 {q[98] * 1e6:.1f} мкс")
+
+
+async def bench(cutoff: str, flows: int, concurrency: int, users: int):
+    variants = {
+        "counts": flow_counts,
+        "availability": flow_availability,
+        "seat_maps cold": flow_seat_maps(None),
+        "seat_maps warm": flow_seat_maps(SeatMapCache(GROUPS)),
+    }
+    for name, flow in variants.items():
+        # прогрев пула и страничного кэша SQLite
+        await run(flow, cutoff, concurrency, concurrency, users)
+        report(name, await run(flow, cutoff, flows, concurrency, users))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainings", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--flows", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20, help="потоков одновременно")
+    parser.add_argument("--seed", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        try:
+            cutoff = fill(args.trainings, args.users, args.seed)
+            asyncio.run(bench(cutoff, args.flows, args.concurrency, args.users))
+        finally:
+            db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Бенчмарк FSM-хранилища: SQLiteStorage из database/fsm_storage.py против MemoryStorage aiogram.
+
+    python -m database.bench_fsm --users 500 --steps 6
+
+Шаг — то, что aiogram и хендлер регистрации делают на один апдейт:
+get_state (фильтр по состоянию), get_data, update_data и set_state.
+warm — записи уже в кэше, cold — новый экземпляр хранилища, первый шаг каждого
+пользователя читает запись из БД (как после перезапуска бота). flush — запись всех
+изменений одной транзакцией. Файл БД временный, database/bot.db не трогается.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from database import db
+from database.fsm_storage import SQLiteStorage
+
+# сколько добавляет SQLiteStorage к шагу по сравнению с MemoryStorage, мс
+BUDGET_MS = 1.0
+
+
+class Registration(StatesGroup):
+    name = State()
+    phone = State()
+    channel = State()
+    vtx = State()
+    goggles = State()
+    confirm = State()
+
+
+STATES = Registration.__all_states__
+
+
+def _key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+async def step(storage: BaseStorage, key: StorageKey, n: int):
+    await storage.get_state(key)
+    data = await storage.get_data(key)
+    await storage.update_data(key, {f"field{n}": f"value{n}", "steps": data.get("steps", 0) + 1})
+    await storage.set_state(key, STATES[n % len(STATES)])
+
+
+async def run(storage: BaseStorage, users: int, steps: int) -> list[float]:
+    """Пользователи идут по шагам вперемешку, как апдейты в боте; время каждого шага в секундах."""
+    timings = []
+    for n in range(steps):
+        for user_id in range(1, users + 1):
+            started = time.perf_counter()
+            await step(storage, _key(user_id), n)
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    q = statistics.quantiles(timings, n=100)
+    print(f"{name:>12}: {statistics.fmean(timings) * 1e6:8.1f} мкс/шаг, "
+          f"p50 {q[49] * 1e6:.1f} мкс, p99 {q[98] * 1e6:.1f} мкс, max {max(timings) * 1e6:.1f} мкс")
+
+
+async def bench(users: int, steps: int) -> float:
+    memory = await run(MemoryStorage(), users, steps)
+    report("memory", memory)
+
+    storage = SQLiteStorage()
+    warm = await run(storage, users, steps)
+    report("sqlite warm", warm)
+
+    dirty = len(storage._dirty)
+    started = time.perf_counter()
+    await storage.close()
+    print(f"{'flush':>12}: {dirty} записей за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    # после «перезапуска» первый шаг каждого пользователя — промах кэша и чтение из БД
+    restarted = SQLiteStorage()
+    cold = await run(restarted, users, 1)
+    report("sqlite cold", cold)
+    assert await restarted.get_state(_key(1)) == STATES[0].state
+    await restarted.close()
+
+    overhead = max(statistics.fmean(warm), statistics.fmean(cold)) - statistics.fmean(memory)
+    print(f"накладные расходы SQLiteStorage: {overhead * 1000:.3f} мс/шаг (бюджет {BUDGET_MS} мс)")
+    return overhead * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=len(STATES), help="шагов на пользователя")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        try:
+            overhead = asyncio.run(bench(args.users, args.steps))
+        finally:
+            db.close_pool()
+
+    if overhead >= BUDGET_MS:
+        raise SystemExit(f"❌ SQLiteStorage медленнее MemoryStorage на {overhead:.3f} мс/шаг")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Бенчмарк агрегатов /stats и /finance: помесячные таблицы (database/stats.py) против
+прежних запросов, которые каждый раз агрегировали всю историю slots.
+
+    python -m database.bench_stats --years 10 --users 400 --repeat 20
+
+Синтетика — тренировки два раза в неделю за years лет, на каждой часть каналов занята
+разными участниками, часть броней снята или отменена. Чтения: /stats за всё время,
+за год, за месяц и /finance за месяц; строки обоих вариантов сверяются. Запись:
+rebuild_stats() целиком и вставка со сменой статуса слота с триггерами и без них
+(цена агрегатов для каждой брони). Файл БД временный, database/bot.db не трогается.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import db
+from database.stats import STATS_STATUSES, attendance_rows, month_finance, rebuild_stats
+from groups import GROUPS
+
+# как ADMIN_USER_IDS в /stats: их слоты не считаются
+EXCLUDE_USERS = (1, 2)
+SLOT_STATUSES = ("confirmed", "confirmed", "confirmed", "pending", "pending_cancel", "expired", "canceled")
+PAYMENT_TYPES = ("subscription", "subscription", "manual", "yookassa")
+CHANNELS = [(group, channel) for group, cfg in GROUPS.items() for channel in cfg["channels"]]
+
+
+def fill(years: int, users: int, seed: int) -> tuple[str, str]:
+    """Тренировки по вторникам и субботам с прошлого года назад; (последний год, последний месяц)."""
+    rng = random.Random(seed)
+    end = datetime(datetime.now().year, 1, 1) - timedelta(days=1)
+    day = end - timedelta(days=365 * years)
+    with db.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, nickname, system) VALUES (?, ?, 'HDZero')",
+            [(user_id, f"pilot{user_id}") for user_id in range(1, users + 1)],
+        )
+        while day <= end:
+            if day.weekday() in (1, 5):
+                status = "cancelled" if rng.random() < 0.03 else "open"
+                training_id = conn.execute(
+                    "INSERT INTO trainings (date, status) VALUES (?, ?)", (day.replace(hour=19).isoformat(), status)
+                ).lastrowid
+                pilots = rng.sample(range(1, users + 1), len(CHANNELS))
+                conn.executemany("""
+                    INSERT INTO slots (training_id, user_id, group_name, channel, payment_type, status, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (training_id, user_id, group, channel, rng.choice(PAYMENT_TYPES), rng.choice(SLOT_STATUSES),
+                     day.isoformat())
+                    for (group, channel), user_id in zip(CHANNELS, pilots) if rng.random() < 0.8
+                ])
+            day += timedelta(days=1)
+        trainings = conn.execute("SELECT COUNT(*) FROM trainings").fetchone()[0]
+        slots = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+        conn.execute("ANALYZE")
+    print(f"лет: {years}, тренировок: {trainings}, слотов: {slots}, пользователей: {users}")
+    return end.strftime("%Y"), end.strftime("%Y-%m")
+
+
+# --- прежние запросы: агрегат по всей истории slots на каждый вызов ---
+
+async def old_attendance(period_where: str, params: tuple):
+    placeholders = ",".join("?" for _ in EXCLUDE_USERS)
+    return await db.fetch_all(f"""
+        SELECT
+            u.nickname,
+            COUNT(DISTINCT s.training_id) AS cnt,
+            SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END) AS sub_cnt,
+            SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END) AS one_cnt
+        FROM slots s
+        JOIN users u ON u.user_id = s.user_id
+        JOIN trainings t ON t.id = s.training_id
+        WHERE t.status != 'cancelled'
+          AND s.status IN {STATS_STATUSES}
+          AND s.user_id NOT IN ({placeholders})
+          {period_where}
+        GROUP BY u.user_id
+        ORDER BY cnt DESC
+    """, (*EXCLUDE_USERS, *params))
+
+
+async def old_finance(month: str):
+    placeholders = ",".join("?" for _ in EXCLUDE_USERS)
+    trainings = (await db.fetch_one("""
+        SELECT COUNT(*) FROM trainings WHERE status != 'cancelled' AND strftime('%Y-%m', date) = ?
+    """, (month,)))[0]
+    slots, sub_slots, one_slots = await db.fetch_one(f"""
+        SELECT
+            COUNT(*),
+            SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END)
+        FROM slots s
+        JOIN trainings t ON t.id = s.training_id
+        WHERE t.status != 'cancelled'
+          AND s.status IN {STATS_STATUSES}
+          AND strftime('%Y-%m', t.date) = ?
+          AND s.user_id NOT IN ({placeholders})
+    """, (month, *EXCLUDE_USERS))
+    return trainings, slots, sub_slots or 0, one_slots or 0
+
+
+def same_rows(old, new) -> bool:
+    # при равном числе посещений порядок строк в обоих вариантах не определён
+    return sorted(map(tuple, old)) == sorted(map(tuple, new))
+
+
+async def timed(call, repeat: int) -> tuple[float, object]:
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+async def bench_reads(year: str, month: str, repeat: int):
+    cases = {
+        "/stats все": (
+            lambda: old_attendance("", ()),
+            lambda: attendance_rows(None, None, EXCLUDE_USERS),
+        ),
+        "/stats год": (
+            lambda: old_attendance("AND strftime('%Y', t.date) = ?", (year,)),
+            lambda: attendance_rows(f"{year}-01", f"{year}-12", EXCLUDE_USERS),
+        ),
+        "/stats месяц": (
+            lambda: old_attendance("AND strftime('%Y-%m', t.date) = ?", (month,)),
+            lambda: attendance_rows(month, month, EXCLUDE_USERS),
+        ),
+        "/finance": (
+            lambda: old_finance(month),
+            lambda: month_finance(month, EXCLUDE_USERS),
+        ),
+    }
+    for name, (old, new) in cases.items():
+        old_time, old_result = await timed(old, repeat)
+        new_time, new_result = await timed(new, repeat)
+        if name == "/finance":
+            match = tuple(old_result) == tuple(new_result)
+        else:
+            match = same_rows(old_result, new_result)
+        print(f"{name:>13}: {old_time * 1000:8.2f} мс -> {new_time * 1000:6.2f} мс"
+              f"{'' if match else '  ❌ строки различаются'}")
+
+
+def insert_and_update(conn, slots: int, seed: int) -> float:
+    """Средняя цена одной брони (вставка + подтверждение) в секундах; откатывает вызывающий."""
+    rng = random.Random(seed)
+    training_ids = [row[0] for row in conn.execute("SELECT id FROM trainings")]
+    started = time.perf_counter()
+    for n in range(slots):
+        slot_id = conn.execute("""
+            INSERT INTO slots (training_id, user_id, group_name, channel, payment_type, status, created_at)
+            VALUES (?, ?, 'bench', ?, 'subscription', 'pending', '2026-01-01T12:00:00')
+        """, (rng.choice(training_ids), rng.randint(1, 400), f"B{n}")).lastrowid
+        conn.execute("UPDATE slots SET status = 'confirmed' WHERE id = ?", (slot_id,))
+    return (time.perf_counter() - started) / slots
+
+
+def bench_writes(slots: int, seed: int):
+    conn = db.get_connection()
+    try:
+        started = time.perf_counter()
+        rebuild_stats(conn)
+        elapsed = time.perf_counter() - started
+        conn.rollback()
+        print(f"{'rebuild_stats':>13}: {elapsed * 1000:8.1f} мс")
+
+        with_triggers = insert_and_update(conn, slots, seed)
+        conn.rollback()
+
+        # последний замер: триггеры агрегатов удаляются насовсем, база всё равно временная
+        triggers = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stats\\_%' ESCAPE '\\'"
+        )]
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        without_triggers = insert_and_update(conn, slots, seed)
+        conn.rollback()
+        print(f"{'бронь':>13}: {without_triggers * 1e6:8.1f} мкс без триггеров -> "
+              f"{with_triggers * 1e6:.1f} мкс с триггерами агрегатов ({len(triggers)} шт.)")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=20, help="повторов каждого чтения, берётся медиана")
+    parser.add_argument("--slots", type=int, default=2000, help="броней в замере записи")
+    parser.add_argument("--seed", type=int, default=18)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        try:
+            year, month = fill(args.years, args.users, args.seed)
+            asyncio.run(bench_reads(year, month, args.repeat))
+            bench_writes(args.slots, args.seed)
+        finally:
+            db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
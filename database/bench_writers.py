@@ -0,0 +1,80 @@
+"""
+Бенчмарк конкурентных писателей: профиль PRAGMAS из database/db.py против настроек SQLite по умолчанию.
+
+    python -m database.bench_writers --processes 4 --transactions 2000
+
+Каждый процесс — как бот и api_server — пишет в один файл БД однострочные транзакции.
+Профиль default — голый sqlite3.connect(path), как соединения открывались до общего профиля
+(rollback-журнал, встроенный таймаут 5 с); profile — соединение через _configure (WAL, busy_timeout, …).
+Файл БД временный, database/bot.db не трогается.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from database.db import PRAGMAS, _configure
+
+
+def _connect(path: str, profile: str) -> sqlite3.Connection:
+    if profile == "default":
+        return sqlite3.connect(path)
+    return _configure(sqlite3.connect(path))
+
+
+def writer(path: str, profile: str, worker: int, transactions: int, results):
+    conn = _connect(path, profile)
+    ok = locked = 0
+    for n in range(transactions):
+        try:
+            with conn:
+                conn.execute("INSERT INTO bench (worker, n, payload) VALUES (?, ?, ?)", (worker, n, "x" * 64))
+            ok += 1
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+    conn.close()
+    results.put((ok, locked))
+
+
+def run(profile: str, processes: int, transactions: int) -> tuple[float, int, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        with _connect(path, profile) as conn:
+            conn.execute("CREATE TABLE bench (id INTEGER PRIMARY KEY, worker INTEGER, n INTEGER, payload TEXT)")
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=writer, args=(path, profile, worker, transactions, results))
+            for worker in range(processes)
+        ]
+        started = time.perf_counter()
+        for process in workers:
+            process.start()
+        totals = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+    ok = sum(t[0] for t in totals)
+    locked = sum(t[1] for t in totals)
+    return elapsed, ok, locked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=2000, help="транзакций на процесс")
+    args = parser.parse_args()
+
+    print(f"PRAGMAS: {PRAGMAS}")
+    for profile in ("default", "profile"):
+        elapsed, ok, locked = run(profile, args.processes, args.transactions)
+        print(f"{profile:>8}: {ok / elapsed:,.0f} tx/s, успешно {ok}, 'database is locked': {locked}, {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
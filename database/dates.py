@@ -0,0 +1,15 @@
+import calendar
+from datetime import datetime
+
+# trainings.date — ISO-строка локального времени без пояса. Для индексов у trainings есть
+# вычисляемые колонки (миграция 0013):
+#   date_ts   — секунды, наивное время трактуется как UTC: CAST(strftime('%s', date) AS INTEGER)
+#   date_key  — 'YYYY-MM-DD'
+#   month_key — 'YYYY-MM', месяц для агрегатов статистики (без индекса, миграция 0017)
+
+
+def date_ts(value: datetime | str) -> int:
+    """Значение для сравнения с trainings.date_ts — тем же способом, что и strftime('%s') в SQLite."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return calendar.timegm(value.timetuple())
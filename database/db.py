@@ -1,91 +1,197 @@
-import sqlite3
+import asyncio
 import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-DB_PATH = "database/bot.db"
+from database import querylog
+from database.migrate import run_migrations, current_version
+from metrics import Counter, Histogram
 
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.db")
+
+# Сколько потоков (и, соответственно, долгоживущих соединений) обслуживают запросы бота
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Отдельный пул только для чтения (API): чтения не ждут в очереди за записями run_db
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+
+# Профиль PRAGMA, применяется к каждому соединению — и в боте, и в api_server.
+# WAL позволяет вебхуку писать payments, пока бот пишет slots, без "database is locked".
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -16000,        # ~16 МБ страничного кэша
+    "mmap_size": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+DB_SECONDS = Histogram(
+    "db_query_seconds", "Время транзакции run_db / снимка run_read в потоке пула", ("statement", "pool")
+)
+DB_ERRORS = Counter("db_errors_total", "Транзакции, завершившиеся исключением", ("statement", "pool", "error"))
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool_connections: list[sqlite3.Connection] = []
+_executor: ThreadPoolExecutor | None = None
+_read_executor: ThreadPoolExecutor | None = None
+
+
+def _configure(conn: sqlite3.Connection) -> sqlite3.Connection:
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def get_connection(**kwargs):
+    # TimedConnection замеряет каждый оператор для журнала медленных запросов (database/querylog.py)
+    return _configure(sqlite3.connect(DB_PATH, factory=querylog.TimedConnection, **kwargs))
+
+
+# ==========================
+# Пул соединений
+# ==========================
+
+def _pooled_connection() -> sqlite3.Connection:
+    """Соединение текущего потока пула. Открывается один раз и живёт до close_pool()."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(check_same_thread=False)
+        _local.conn = conn
+        with _pool_lock:
+            _pool_connections.append(conn)
+    return conn
+
+
+def _read_connection() -> sqlite3.Connection:
+    """Соединение потока пула чтения: query_only, случайная запись упадёт с ошибкой."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = get_connection(check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        _local.conn = conn
+        with _pool_lock:
+            _pool_connections.append(conn)
+    return conn
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+    return _executor
 
-def init_db():
-    os.makedirs("database", exist_ok=True)
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                nickname TEXT NOT NULL,
-                system TEXT NOT NULL,
-                subscription INTEGER DEFAULT 0       
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS trainings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                status TEXT NOT NULL
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS subscription_notifications (
-                subscription_id INTEGER,
-                admin_id INTEGER,
-                message_id INTEGER
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin_notifications (
-                slot_id INTEGER,
-                admin_id INTEGER,
-                message_id INTEGER
-            );
-        """)        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS slots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                training_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                group_name TEXT NOT NULL,
-                channel TEXT NOT NULL,
-                payment_type TEXT NOT NULL,
-                status TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY (training_id) REFERENCES trainings(id)
-            )
-                       
-        """)
-        cursor.execute("""
-             CREATE TABLE IF NOT EXISTS subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                count INTEGER,
-                status TEXT,
-                created_at TEXT
-    )
-""")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
 
-                slot_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
+def _get_read_executor() -> ThreadPoolExecutor:
+    global _read_executor
+    if _read_executor is None:
+        _read_executor = ThreadPoolExecutor(max_workers=DB_READ_POOL_SIZE, thread_name_prefix="db-read")
+    return _read_executor
 
-                yookassa_payment_id TEXT UNIQUE NOT NULL,
 
-                amount INTEGER NOT NULL,
-                currency TEXT NOT NULL DEFAULT 'RUB',
+def _statement(fn) -> str:
+    """Имя для метрик: функция транзакции (reserve_channel, confirm_booking.confirm), у lambda — объемлющая."""
+    return fn.__qualname__.replace(".<locals>", "").replace(".<lambda>", "")
 
-                payment_method TEXT NOT NULL,
-                status TEXT NOT NULL,
 
-                created_at TEXT NOT NULL,
-                paid_at TEXT,
+@lru_cache(maxsize=512)
+def _sql_statement(sql: str) -> str:
+    """Имя для метрик по тексту запроса: «select slots», «update payments»."""
+    verb = sql.split(None, 1)[0].lower()
+    table = re.search(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", sql, re.IGNORECASE)
+    return f"{verb} {table.group(1)}" if table else verb
 
-                FOREIGN KEY (slot_id) REFERENCES slots(id)
+
+def _observe(pool: str, statement: str, started: float, error: Exception | None):
+    DB_SECONDS.observe(time.perf_counter() - started, statement, pool)
+    if error is not None:
+        DB_ERRORS.inc(statement, pool, type(error).__name__)
+
+
+def _run_in_transaction(fn, args, statement, caller):
+    conn = _pooled_connection()
+    querylog.set_caller(caller)
+    started, error = time.perf_counter(), None
+    try:
+        with conn:  # commit при успехе, rollback при исключении
+            return fn(conn, *args)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        conn.flush_statements()
+        _observe("write", statement, started, error)
+
+
+async def run_db(fn, *args, statement: str = None):
+    """
+    Выполняет fn(conn, *args) в отдельном потоке пула, не блокируя event loop.
+    Всё, что делает fn, — одна транзакция. statement — имя в метриках, по умолчанию имя fn.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), _run_in_transaction, fn, args, statement or _statement(fn), querylog.caller()
+    )
+
+
+def _read_in_snapshot(fn, args, statement, caller):
+    conn = _read_connection()
+    querylog.set_caller(caller)
+    started, error = time.perf_counter(), None
+    conn.execute("BEGIN")  # все SELECT внутри fn видят один снимок WAL
+    try:
+        return fn(conn, *args)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        conn.flush_statements()
+        conn.execute("ROLLBACK")
+        _observe("read", statement, started, error)
+
+
+async def run_read(fn, *args, statement: str = None):
+    """Как run_db, но только для чтения и на отдельном пуле соединений."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_read_executor(), _read_in_snapshot, fn, args, statement or _statement(fn), querylog.caller()
     )
-""")
 
 
+async def fetch_one(sql: str, params: tuple = ()):
+    return await run_db(lambda conn: conn.execute(sql, params).fetchone(), statement=_sql_statement(sql))
+
+
+async def fetch_all(sql: str, params: tuple = ()):
+    return await run_db(lambda conn: conn.execute(sql, params).fetchall(), statement=_sql_statement(sql))
+
+
+async def execute(sql: str, params: tuple = ()) -> sqlite3.Cursor:
+    """INSERT / UPDATE / DELETE одним запросом. У результата доступны lastrowid и rowcount."""
+    return await run_db(lambda conn: conn.execute(sql, params), statement=_sql_statement(sql))
+
+
+def close_pool():
+    global _executor, _read_executor
+    for executor in (_executor, _read_executor):
+        if executor is not None:
+            executor.shutdown(wait=True)
+    _executor = _read_executor = None
+    with _pool_lock:
+        for conn in _pool_connections:
+            conn.close()
+        _pool_connections.clear()
+
+
+def init_db():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    with get_connection() as conn:
+        run_migrations(conn)
+        conn.execute("PRAGMA optimize")
+        version = current_version(conn)
 
-    print("✅ Таблицы users, trainings и slots, subscription_usage созданы (если не существовали)")
+    print(f"✅ Схема БД актуальна, версия {version}")
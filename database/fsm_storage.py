@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.db import run_db
+from logging_config import logger
+
+# Брошенное состояние (пользователь ушёл посреди регистрации) живёт сутки
+FSM_TTL = 24 * 3600
+# Как часто грязные записи уходят в SQLite одной транзакцией
+FLUSH_INTERVAL = 0.5
+# Чистые записи, к которым давно не обращались, выкидываются из памяти
+CACHE_IDLE = 600
+
+
+class _Record:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, state: str | None = None, data: dict | None = None, touched: float = 0.0):
+        self.state = state
+        self.data = data or {}
+        self.touched = touched
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        "" if part is None else str(part)
+        for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+    )
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_states с write-back кэшем в памяти.
+    Чтение и запись идут в кэш; изменения копятся и раз в FLUSH_INTERVAL пишутся пачкой.
+    При промахе запись читается из БД один раз. Кэш — свой у каждого процесса,
+    поэтому при нескольких воркерах апдейты одного пользователя должны приходить в один процесс.
+    """
+
+    def __init__(self, ttl: float = FSM_TTL, flush_interval: float = FLUSH_INTERVAL):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._cache: dict[str, _Record] = {}
+        self._dirty: set[str] = set()
+        self._flusher: asyncio.Task | None = None
+        self._last_purge = 0.0
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        record = await self._record(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    # --- кэш ---
+
+    async def _record(self, key: StorageKey) -> _Record:
+        k = _key(key)
+        record = self._cache.get(k)
+        if record is None:
+            row = await run_db(lambda conn: conn.execute(
+                "SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (k,)
+            ).fetchone())
+            # пока читали, запись могла появиться (параллельный апдейт того же пользователя)
+            record = self._cache.get(k)
+            if record is None:
+                if row:
+                    record = _Record(row[0], json.loads(row[1]), row[2])
+                else:
+                    record = _Record(touched=time.time())
+                self._cache[k] = record
+
+        if record.touched and time.time() - record.touched > self.ttl:
+            record.state, record.data = None, {}
+            self._touch(key, record)
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record):
+        record.touched = time.time()
+        self._dirty.add(_key(key))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(f"[fsm] не удалось записать состояния: {e}")
+
+    async def flush(self):
+        """Пишет все изменения одной транзакцией; пустые записи удаляются."""
+        now = time.time()
+        purge = now - self._last_purge > 3600
+        dirty, self._dirty = self._dirty, set()
+
+        upserts, deletes = [], []
+        for k in dirty:
+            record = self._cache.get(k)
+            if record is None:
+                continue
+            if record.state is None and not record.data:
+                deletes.append((k,))
+            else:
+                upserts.append((k, record.state, json.dumps(record.data, ensure_ascii=False), record.touched))
+
+        def write(conn):
+            if upserts:
+                conn.executemany("""
+                    INSERT INTO fsm_states (key, state, data, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                """, upserts)
+            if deletes:
+                conn.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+            if purge:
+                conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (now - self.ttl,))
+
+        if upserts or deletes or purge:
+            try:
+                await run_db(write)
+            except Exception:
+                self._dirty |= dirty  # не потеряем изменения — попробуем в следующий раз
+                raise
+        if purge:
+            self._last_purge = now
+
+        # чистые и давно не тронутые записи в памяти не держим
+        idle = [k for k, record in self._cache.items() if k not in self._dirty and now - record.touched > CACHE_IDLE]
+        for k in idle:
+            del self._cache[k]
@@ -0,0 +1,106 @@
+import importlib.util
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+# ==========================
+# Хелперы для файлов миграций
+# ==========================
+
+def table_columns(conn: sqlite3.Connection, table: str) -> dict[str, tuple]:
+    """{имя колонки: строка PRAGMA table_info}"""
+    return {row[1]: row for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """ADD COLUMN, если колонки ещё нет. В SQLite это правка схемы без перезаписи таблицы."""
+    # table_xinfo, а не table_info: вычисляемые колонки table_info не показывает
+    if column not in {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_index(conn: sqlite3.Connection, name: str, table: str, columns: str, where: str = "", unique: bool = False):
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(sql)
+
+
+# ==========================
+# Раннер
+# ==========================
+
+def discover_migrations() -> list[tuple[int, str, object]]:
+    """Файлы database/migrations/NNNN_name.py по возрастанию номера."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version, name = int(match.group(1)), match.group(2)
+        spec = importlib.util.spec_from_file_location(
+            f"database.migrations.m{version:04d}_{name}",
+            os.path.join(MIGRATIONS_DIR, filename),
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append((version, name, module))
+    return migrations
+
+
+def run_migrations(conn: sqlite3.Connection) -> list[int]:
+    """
+    Применяет все ещё не применённые миграции, каждую в своей транзакции.
+
+    BEGIN IMMEDIATE берёт только блокировку записи: в WAL читатели (бот, api_server)
+    продолжают работать, а второй процесс, стартующий одновременно, дождётся
+    busy_timeout и увидит, что миграция уже записана в schema_version.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # транзакциями управляем сами
+    applied_now = []
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        """)
+
+        for version, name, module in discover_migrations():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                already = conn.execute(
+                    "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+                ).fetchone()
+                if already:
+                    conn.execute("COMMIT")
+                    continue
+
+                module.upgrade(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.now().isoformat())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            applied_now.append(version)
+            print(f"✅ Миграция {version:04d}_{name} применена")
+    finally:
+        conn.isolation_level = isolation_level
+
+    return applied_now
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
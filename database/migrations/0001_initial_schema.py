@@ -0,0 +1,70 @@
+"""Базовая схема — то, что раньше создавал init_db()."""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            nickname TEXT NOT NULL,
+            system TEXT NOT NULL,
+            subscription INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trainings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subscription_notifications (
+            subscription_id INTEGER,
+            admin_id INTEGER,
+            message_id INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS admin_notifications (
+            slot_id INTEGER,
+            admin_id INTEGER,
+            message_id INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS slots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            training_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            group_name TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            payment_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (training_id) REFERENCES trainings(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            count INTEGER,
+            status TEXT,
+            created_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            slot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            yookassa_payment_id TEXT UNIQUE NOT NULL,
+            amount INTEGER NOT NULL,
+            currency TEXT NOT NULL DEFAULT 'RUB',
+            payment_method TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            paid_at TEXT,
+            FOREIGN KEY (slot_id) REFERENCES slots(id)
+        )
+    """)
@@ -0,0 +1,15 @@
+"""
+Колонки, которые код уже использует, но которых не было в CREATE:
+trainings.full_message_sent (background_tasks.py) и UI/target-поля payments (payments/service.py).
+"""
+from database.migrate import add_column
+
+
+def upgrade(conn):
+    add_column(conn, "trainings", "full_message_sent", "INTEGER NOT NULL DEFAULT 0")
+
+    add_column(conn, "payments", "target_type", "TEXT")
+    add_column(conn, "payments", "target_id", "INTEGER")
+    add_column(conn, "payments", "chat_id", "INTEGER")
+    add_column(conn, "payments", "message_id", "INTEGER")
+    add_column(conn, "payments", "ui_status", "TEXT")
@@ -0,0 +1,43 @@
+"""
+create_payment() вставляет платёж без slot_id и yookassa_payment_id (id от Юкассы приходит позже),
+а исходная схема требовала их NOT NULL. Пересобираем payments, только если ограничения ещё на месте.
+"""
+from database.migrate import table_columns
+
+PAYMENTS_SCHEMA = """
+    CREATE TABLE payments_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER,
+        user_id INTEGER NOT NULL,
+        yookassa_payment_id TEXT UNIQUE,
+        amount INTEGER NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'RUB',
+        payment_method TEXT NOT NULL,
+        status TEXT NOT NULL,
+        target_type TEXT,
+        target_id INTEGER,
+        chat_id INTEGER,
+        message_id INTEGER,
+        ui_status TEXT,
+        created_at TEXT NOT NULL,
+        paid_at TEXT,
+        FOREIGN KEY (slot_id) REFERENCES slots(id)
+    )
+"""
+
+
+def upgrade(conn):
+    columns = table_columns(conn, "payments")
+    # PRAGMA table_info: (cid, name, type, notnull, dflt_value, pk)
+    if not (columns["slot_id"][3] or columns["yookassa_payment_id"][3]):
+        return
+
+    conn.execute("DROP TABLE IF EXISTS payments_new")
+    conn.execute(PAYMENTS_SCHEMA)
+
+    new_columns = table_columns(conn, "payments_new")
+    common = ", ".join(name for name in columns if name in new_columns)
+    conn.execute(f"INSERT INTO payments_new ({common}) SELECT {common} FROM payments")
+
+    conn.execute("DROP TABLE payments")
+    conn.execute("ALTER TABLE payments_new RENAME TO payments")
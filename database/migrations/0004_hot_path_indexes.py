@@ -0,0 +1,17 @@
+"""Индексы под WHERE-условия хендлеров и фоновых задач."""
+from database.migrate import create_index
+
+
+def upgrade(conn):
+    # счётчики мест, GROUP BY group_name, свободные каналы, участники
+    create_index(conn, "idx_slots_training_status", "slots", "training_id, status, group_name, channel")
+    # "уже записан?" и отметки ✅ / ⏳ в списке тренировок
+    create_index(conn, "idx_slots_training_user", "slots", "training_id, user_id, status")
+    # "Мои записи" и отмена своей записи
+    create_index(conn, "idx_slots_user_status", "slots", "user_id, status")
+    # залипшие pending-слоты
+    create_index(conn, "idx_slots_status_created", "slots", "status, created_at")
+    create_index(conn, "idx_trainings_status_date", "trainings", "status, date")
+    create_index(conn, "idx_admin_notifications_slot", "admin_notifications", "slot_id")
+    create_index(conn, "idx_payments_status_ui", "payments", "status, ui_status")
+    create_index(conn, "idx_payments_target", "payments", "target_type, target_id, status")
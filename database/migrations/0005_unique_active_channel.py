@@ -0,0 +1,36 @@
+"""
+Один канал группы на тренировке может занимать только одна активная запись.
+Дубликаты, которые успели появиться из-за гонки SELECT COUNT(*) → INSERT,
+переводятся в статус 'duplicate' (кроме самой ранней записи), чтобы индекс создался.
+"""
+from database.migrate import create_index
+
+ACTIVE_STATUSES = "('pending', 'confirmed', 'pending_cancel')"
+
+
+def upgrade(conn):
+    duplicates = conn.execute(f"""
+        SELECT s.id, s.training_id, s.group_name, s.channel, s.user_id
+        FROM slots s
+        WHERE s.status IN {ACTIVE_STATUSES}
+          AND EXISTS (
+            SELECT 1 FROM slots e
+            WHERE e.training_id = s.training_id
+              AND e.group_name = s.group_name
+              AND e.channel = s.channel
+              AND e.status IN {ACTIVE_STATUSES}
+              AND e.id < s.id
+          )
+    """).fetchall()
+
+    for slot_id, training_id, group_name, channel, user_id in duplicates:
+        print(
+            f"[!] Дубликат канала: slot {slot_id} (training {training_id}, {group_name}/{channel}, "
+            f"user {user_id}) переведён в 'duplicate' — проверьте вручную"
+        )
+        conn.execute("UPDATE slots SET status = 'duplicate' WHERE id = ?", (slot_id,))
+
+    create_index(
+        conn, "uq_slots_active_channel", "slots", "training_id, group_name, channel",
+        where=f"status IN {ACTIVE_STATUSES}", unique=True,
+    )
@@ -0,0 +1,22 @@
+"""Очередь исходящих сообщений Telegram (notifications/outbox.py)."""
+from database.migrate import create_index
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            params TEXT,                              -- JSON: parse_mode, reply_markup, ...
+            slot_id INTEGER,                          -- задан — message_id пишется в admin_notifications
+            status TEXT NOT NULL DEFAULT 'pending',   -- pending / sent / failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            not_before REAL NOT NULL DEFAULT 0,       -- unix time, раньше которого не отправлять
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            sent_at TEXT
+        )
+    """)
+    # диспетчер берёт первое ожидающее сообщение каждого чата
+    create_index(conn, "idx_outbox_pending", "outbox", "chat_id, id", where="status = 'pending'")
@@ -0,0 +1,15 @@
+"""Кэш username / имени из Telegram вместо get_chat_member на каждую строку (database/tg_users.py)."""
+from database.migrate import create_index
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tg_users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            full_name TEXT,
+            fetched_at TEXT NOT NULL
+        )
+    """)
+    # фоновое обновление устаревших записей
+    create_index(conn, "idx_tg_users_fetched", "tg_users", "fetched_at")
@@ -0,0 +1,14 @@
+"""Состояния FSM (регистрация, правка профиля) переживают перезапуск бота (database/fsm_storage.py)."""
+from database.migrate import create_index
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,          -- bot_id:chat_id:user_id:thread_id:business_connection_id:destiny
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL       -- unix time, по нему истекают брошенные состояния
+        )
+    """)
+    create_index(conn, "idx_fsm_states_updated", "fsm_states", "updated_at")
@@ -0,0 +1,17 @@
+"""Последние запуски фоновых задач планировщика (scheduler.py): догон после простоя и метрики."""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            last_started_at REAL,          -- unix time
+            last_finished_at REAL,
+            last_duration REAL,            -- сек
+            last_status TEXT,              -- ok / error
+            last_error TEXT,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            total_duration REAL NOT NULL DEFAULT 0
+        )
+    """)
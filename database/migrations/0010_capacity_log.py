@@ -0,0 +1,25 @@
+"""Переходы «тренировка заполнена / снова есть места» (notifications/capacity.py) вместо опроса monitor_full_trainings."""
+from database.migrate import create_index
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS capacity_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            training_id INTEGER NOT NULL,
+            state TEXT NOT NULL,            -- full / open
+            confirmed INTEGER NOT NULL,     -- подтверждённых слотов в момент перехода
+            created_at TEXT NOT NULL
+        )
+    """)
+    create_index(conn, "idx_capacity_log_training", "capacity_log", "training_id, id")
+
+    # о заполненных раньше тренировках уже объявлено — повторно не шлём
+    conn.execute("""
+        INSERT INTO capacity_log (training_id, state, confirmed, created_at)
+        SELECT t.id, 'full',
+               (SELECT COUNT(*) FROM slots s WHERE s.training_id = t.id AND s.status = 'confirmed'),
+               datetime('now')
+        FROM trainings t
+        WHERE t.full_message_sent = 1
+    """)
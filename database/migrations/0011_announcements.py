@@ -0,0 +1,15 @@
+"""История объявлений в чат клуба: прогрев не уходит дважды ни после перезапуска, ни из /progrev (notifications/announcements.py)."""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS announcements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,            -- progrev
+            training_id INTEGER NOT NULL,
+            date TEXT NOT NULL,            -- день отправки, YYYY-MM-DD
+            source TEXT,                   -- scheduler / admin:<user_id>
+            created_at TEXT NOT NULL,
+            UNIQUE (kind, training_id, date)
+        )
+    """)
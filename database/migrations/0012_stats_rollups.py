@@ -0,0 +1,284 @@
+"""
+Помесячные агрегаты посещаемости и финансов, которые ведут триггеры (читает database/stats.py).
+SQL триггеров и пересчёта записан здесь как есть: миграция делает то же, что в момент выпуска,
+как бы потом ни менялся код. month_key появится только в 0013 — месяц берётся из date.
+"""
+from database.migrate import create_index
+
+TRIGGERS = {
+    "stats_slot_insert": """
+        AFTER INSERT ON slots
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT substr(t.date, 1, 7), NEW.user_id
+            FROM trainings t
+            WHERE t.id = NEW.training_id AND t.status != 'cancelled' AND NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits + (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = NEW.training_id AND o.user_id = NEW.user_id
+                      AND o.id != NEW.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots + 1,
+                sub_slots = sub_slots + COALESCE(NEW.payment_type = 'subscription', 0),
+                one_slots = one_slots + COALESCE(NEW.payment_type != 'subscription', 0)
+            WHERE NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT substr(t.date, 1, 7), NEW.user_id FROM trainings t
+                  WHERE t.id = NEW.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots + 1
+            WHERE training_id = NEW.training_id AND NEW.status IN ('pending', 'confirmed', 'pending_cancel');
+        END
+    """,
+    "stats_slot_delete": """
+        AFTER DELETE ON slots
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT substr(t.date, 1, 7), OLD.user_id
+            FROM trainings t
+            WHERE t.id = OLD.training_id AND t.status != 'cancelled' AND OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = OLD.training_id AND o.user_id = OLD.user_id
+                      AND o.id != OLD.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots - 1,
+                sub_slots = sub_slots - COALESCE(OLD.payment_type = 'subscription', 0),
+                one_slots = one_slots - COALESCE(OLD.payment_type != 'subscription', 0)
+            WHERE OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT substr(t.date, 1, 7), OLD.user_id FROM trainings t
+                  WHERE t.id = OLD.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots - 1
+            WHERE training_id = OLD.training_id AND OLD.status IN ('pending', 'confirmed', 'pending_cancel');
+        END
+    """,
+    "stats_slot_update": """
+        AFTER UPDATE OF status, payment_type, training_id, user_id ON slots
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT substr(t.date, 1, 7), OLD.user_id
+            FROM trainings t
+            WHERE t.id = OLD.training_id AND t.status != 'cancelled' AND OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = OLD.training_id AND o.user_id = OLD.user_id
+                      AND o.id != OLD.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots - 1,
+                sub_slots = sub_slots - COALESCE(OLD.payment_type = 'subscription', 0),
+                one_slots = one_slots - COALESCE(OLD.payment_type != 'subscription', 0)
+            WHERE OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT substr(t.date, 1, 7), OLD.user_id FROM trainings t
+                  WHERE t.id = OLD.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots - 1
+            WHERE training_id = OLD.training_id AND OLD.status IN ('pending', 'confirmed', 'pending_cancel');
+
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT substr(t.date, 1, 7), NEW.user_id
+            FROM trainings t
+            WHERE t.id = NEW.training_id AND t.status != 'cancelled' AND NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits + (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = NEW.training_id AND o.user_id = NEW.user_id
+                      AND o.id != NEW.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots + 1,
+                sub_slots = sub_slots + COALESCE(NEW.payment_type = 'subscription', 0),
+                one_slots = one_slots + COALESCE(NEW.payment_type != 'subscription', 0)
+            WHERE NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT substr(t.date, 1, 7), NEW.user_id FROM trainings t
+                  WHERE t.id = NEW.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots + 1
+            WHERE training_id = NEW.training_id AND NEW.status IN ('pending', 'confirmed', 'pending_cancel');
+        END
+    """,
+    "stats_training_insert": """
+        AFTER INSERT ON trainings
+        BEGIN
+            INSERT INTO stats_training (training_id, month, active)
+            VALUES (NEW.id, substr(NEW.date, 1, 7), NEW.status != 'cancelled');
+        END
+    """,
+    "stats_training_update": """
+        AFTER UPDATE OF status, date ON trainings
+        WHEN (OLD.status != 'cancelled') != (NEW.status != 'cancelled')
+          OR substr(OLD.date, 1, 7) != substr(NEW.date, 1, 7)
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT DISTINCT substr(OLD.date, 1, 7), s.user_id
+            FROM slots s
+            WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND OLD.status != 'cancelled'
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - 1,
+                slots = slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel')),
+                sub_slots = sub_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type = 'subscription'),
+                one_slots = one_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type != 'subscription')
+            WHERE OLD.status != 'cancelled'
+              AND month = substr(OLD.date, 1, 7)
+              AND user_id IN (
+                  SELECT s.user_id FROM slots s
+                  WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+              );
+
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT DISTINCT substr(NEW.date, 1, 7), s.user_id
+            FROM slots s
+            WHERE s.training_id = NEW.id AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND NEW.status != 'cancelled'
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits + 1,
+                slots = slots + (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = NEW.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel')),
+                sub_slots = sub_slots + (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = NEW.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type = 'subscription'),
+                one_slots = one_slots + (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = NEW.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type != 'subscription')
+            WHERE NEW.status != 'cancelled'
+              AND month = substr(NEW.date, 1, 7)
+              AND user_id IN (
+                  SELECT s.user_id FROM slots s
+                  WHERE s.training_id = NEW.id AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+              );
+
+            UPDATE stats_training SET month = substr(NEW.date, 1, 7), active = NEW.status != 'cancelled'
+            WHERE training_id = NEW.id;
+        END
+    """,
+    "stats_training_delete": """
+        AFTER DELETE ON trainings
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT DISTINCT substr(OLD.date, 1, 7), s.user_id
+            FROM slots s
+            WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND OLD.status != 'cancelled'
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - 1,
+                slots = slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel')),
+                sub_slots = sub_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type = 'subscription'),
+                one_slots = one_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type != 'subscription')
+            WHERE OLD.status != 'cancelled'
+              AND month = substr(OLD.date, 1, 7)
+              AND user_id IN (
+                  SELECT s.user_id FROM slots s
+                  WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+              );
+
+            DELETE FROM stats_training WHERE training_id = OLD.id;
+        END
+    """,
+}
+
+# пересчёт агрегатов с нуля по уже существующим слотам
+BACKFILL = (
+    """
+        INSERT INTO stats_training (training_id, month, active, slots)
+        SELECT t.id, substr(t.date, 1, 7), t.status != 'cancelled',
+               (SELECT COUNT(*) FROM slots s WHERE s.training_id = t.id AND s.status IN ('pending', 'confirmed', 'pending_cancel'))
+        FROM trainings t
+    """,
+    """
+        INSERT INTO stats_user_month (month, user_id, visits, slots, sub_slots, one_slots)
+        SELECT
+            substr(t.date, 1, 7),
+            s.user_id,
+            COUNT(DISTINCT s.training_id),
+            COUNT(*),
+            SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END)
+        FROM slots s
+        JOIN trainings t ON t.id = s.training_id
+        WHERE t.status != 'cancelled' AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+        GROUP BY 1, 2
+    """,
+)
+
+
+def install_triggers(conn):
+    # executescript закоммитил бы транзакцию миграции — только execute
+    for name, sql in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {sql}")
+
+
+def backfill(conn):
+    conn.execute("DELETE FROM stats_user_month")
+    conn.execute("DELETE FROM stats_training")
+    for sql in BACKFILL:
+        conn.execute(sql)
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_user_month (
+            month TEXT NOT NULL,                      -- YYYY-MM
+            user_id INTEGER NOT NULL,
+            visits INTEGER NOT NULL DEFAULT 0,        -- разных тренировок
+            slots INTEGER NOT NULL DEFAULT 0,
+            sub_slots INTEGER NOT NULL DEFAULT 0,
+            one_slots INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, user_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_training (
+            training_id INTEGER PRIMARY KEY,
+            month TEXT NOT NULL,
+            active INTEGER NOT NULL,                  -- 0 — тренировка отменена
+            slots INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    create_index(conn, "idx_stats_training_month", "stats_training", "month, active")
+
+    install_triggers(conn)
+    backfill(conn)
@@ -0,0 +1,278 @@
+"""
+Индексируемые ключи даты тренировки вместо DATE(date) / datetime(date) / LIKE / strftime,
+которые не дают использовать индекс (database/dates.py).
+Колонки вычисляемые (VIRTUAL): SQLite считает их из date сам, поэтому они не расходятся
+с date при любой записи; значения попадают в индексы при их создании.
+
+Триггеры агрегатов (0012) пересоздаются с месяцем из month_key; их SQL записан здесь как есть.
+"""
+from database.migrate import add_column, create_index
+
+TRIGGERS = {
+    "stats_slot_insert": """
+        AFTER INSERT ON slots
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT t.month_key, NEW.user_id
+            FROM trainings t
+            WHERE t.id = NEW.training_id AND t.status != 'cancelled' AND NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits + (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = NEW.training_id AND o.user_id = NEW.user_id
+                      AND o.id != NEW.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots + 1,
+                sub_slots = sub_slots + COALESCE(NEW.payment_type = 'subscription', 0),
+                one_slots = one_slots + COALESCE(NEW.payment_type != 'subscription', 0)
+            WHERE NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT t.month_key, NEW.user_id FROM trainings t
+                  WHERE t.id = NEW.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots + 1
+            WHERE training_id = NEW.training_id AND NEW.status IN ('pending', 'confirmed', 'pending_cancel');
+        END
+    """,
+    "stats_slot_delete": """
+        AFTER DELETE ON slots
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT t.month_key, OLD.user_id
+            FROM trainings t
+            WHERE t.id = OLD.training_id AND t.status != 'cancelled' AND OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = OLD.training_id AND o.user_id = OLD.user_id
+                      AND o.id != OLD.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots - 1,
+                sub_slots = sub_slots - COALESCE(OLD.payment_type = 'subscription', 0),
+                one_slots = one_slots - COALESCE(OLD.payment_type != 'subscription', 0)
+            WHERE OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT t.month_key, OLD.user_id FROM trainings t
+                  WHERE t.id = OLD.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots - 1
+            WHERE training_id = OLD.training_id AND OLD.status IN ('pending', 'confirmed', 'pending_cancel');
+        END
+    """,
+    "stats_slot_update": """
+        AFTER UPDATE OF status, payment_type, training_id, user_id ON slots
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT t.month_key, OLD.user_id
+            FROM trainings t
+            WHERE t.id = OLD.training_id AND t.status != 'cancelled' AND OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = OLD.training_id AND o.user_id = OLD.user_id
+                      AND o.id != OLD.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots - 1,
+                sub_slots = sub_slots - COALESCE(OLD.payment_type = 'subscription', 0),
+                one_slots = one_slots - COALESCE(OLD.payment_type != 'subscription', 0)
+            WHERE OLD.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT t.month_key, OLD.user_id FROM trainings t
+                  WHERE t.id = OLD.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots - 1
+            WHERE training_id = OLD.training_id AND OLD.status IN ('pending', 'confirmed', 'pending_cancel');
+
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT t.month_key, NEW.user_id
+            FROM trainings t
+            WHERE t.id = NEW.training_id AND t.status != 'cancelled' AND NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits + (NOT EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = NEW.training_id AND o.user_id = NEW.user_id
+                      AND o.id != NEW.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )),
+                slots = slots + 1,
+                sub_slots = sub_slots + COALESCE(NEW.payment_type = 'subscription', 0),
+                one_slots = one_slots + COALESCE(NEW.payment_type != 'subscription', 0)
+            WHERE NEW.status IN ('pending', 'confirmed', 'pending_cancel')
+              AND (month, user_id) = (
+                  SELECT t.month_key, NEW.user_id FROM trainings t
+                  WHERE t.id = NEW.training_id AND t.status != 'cancelled'
+              );
+
+            UPDATE stats_training SET slots = slots + 1
+            WHERE training_id = NEW.training_id AND NEW.status IN ('pending', 'confirmed', 'pending_cancel');
+        END
+    """,
+    "stats_training_insert": """
+        AFTER INSERT ON trainings
+        BEGIN
+            INSERT INTO stats_training (training_id, month, active)
+            VALUES (NEW.id, NEW.month_key, NEW.status != 'cancelled');
+        END
+    """,
+    "stats_training_update": """
+        AFTER UPDATE OF status, date ON trainings
+        WHEN (OLD.status != 'cancelled') != (NEW.status != 'cancelled')
+          OR OLD.month_key != NEW.month_key
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT DISTINCT OLD.month_key, s.user_id
+            FROM slots s
+            WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND OLD.status != 'cancelled'
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - 1,
+                slots = slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel')),
+                sub_slots = sub_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type = 'subscription'),
+                one_slots = one_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type != 'subscription')
+            WHERE OLD.status != 'cancelled'
+              AND month = OLD.month_key
+              AND user_id IN (
+                  SELECT s.user_id FROM slots s
+                  WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+              );
+
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT DISTINCT NEW.month_key, s.user_id
+            FROM slots s
+            WHERE s.training_id = NEW.id AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND NEW.status != 'cancelled'
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits + 1,
+                slots = slots + (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = NEW.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel')),
+                sub_slots = sub_slots + (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = NEW.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type = 'subscription'),
+                one_slots = one_slots + (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = NEW.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type != 'subscription')
+            WHERE NEW.status != 'cancelled'
+              AND month = NEW.month_key
+              AND user_id IN (
+                  SELECT s.user_id FROM slots s
+                  WHERE s.training_id = NEW.id AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+              );
+
+            UPDATE stats_training SET month = NEW.month_key, active = NEW.status != 'cancelled'
+            WHERE training_id = NEW.id;
+        END
+    """,
+    "stats_training_delete": """
+        AFTER DELETE ON trainings
+        BEGIN
+            INSERT INTO stats_user_month (month, user_id)
+            SELECT DISTINCT OLD.month_key, s.user_id
+            FROM slots s
+            WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND OLD.status != 'cancelled'
+            ON CONFLICT DO NOTHING;
+
+            UPDATE stats_user_month SET
+                visits = visits - 1,
+                slots = slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel')),
+                sub_slots = sub_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type = 'subscription'),
+                one_slots = one_slots - (SELECT COUNT(*)
+                    FROM slots s
+                    WHERE s.training_id = OLD.id AND s.user_id = stats_user_month.user_id
+                      AND s.status IN ('pending', 'confirmed', 'pending_cancel') AND s.payment_type != 'subscription')
+            WHERE OLD.status != 'cancelled'
+              AND month = OLD.month_key
+              AND user_id IN (
+                  SELECT s.user_id FROM slots s
+                  WHERE s.training_id = OLD.id AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+              );
+
+            DELETE FROM stats_training WHERE training_id = OLD.id;
+        END
+    """,
+}
+
+# пересчёт агрегатов с нуля по уже существующим слотам
+BACKFILL = (
+    """
+        INSERT INTO stats_training (training_id, month, active, slots)
+        SELECT t.id, t.month_key, t.status != 'cancelled',
+               (SELECT COUNT(*) FROM slots s WHERE s.training_id = t.id AND s.status IN ('pending', 'confirmed', 'pending_cancel'))
+        FROM trainings t
+    """,
+    """
+        INSERT INTO stats_user_month (month, user_id, visits, slots, sub_slots, one_slots)
+        SELECT
+            t.month_key,
+            s.user_id,
+            COUNT(DISTINCT s.training_id),
+            COUNT(*),
+            SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END)
+        FROM slots s
+        JOIN trainings t ON t.id = s.training_id
+        WHERE t.status != 'cancelled' AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+        GROUP BY 1, 2
+    """,
+)
+
+
+def install_triggers(conn):
+    # executescript закоммитил бы транзакцию миграции — только execute
+    for name, sql in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {sql}")
+
+
+def backfill(conn):
+    conn.execute("DELETE FROM stats_user_month")
+    conn.execute("DELETE FROM stats_training")
+    for sql in BACKFILL:
+        conn.execute(sql)
+
+
+def upgrade(conn):
+    add_column(conn, "trainings", "date_ts",
+               "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', date) AS INTEGER)) VIRTUAL")
+    add_column(conn, "trainings", "date_key", "TEXT GENERATED ALWAYS AS (substr(date, 1, 10)) VIRTUAL")
+    add_column(conn, "trainings", "month_key", "TEXT GENERATED ALWAYS AS (substr(date, 1, 7)) VIRTUAL")
+
+    # будущие открытые тренировки (отмена, участники), по порядку даты
+    create_index(conn, "idx_trainings_status_date_ts", "trainings", "status, date_ts")
+    # тренировка по дню (api /participants_by_date)
+    create_index(conn, "idx_trainings_date_key", "trainings", "date_key")
+    create_index(conn, "idx_trainings_month_key", "trainings", "month_key")
+
+    # агрегаты статистики теперь берут месяц из month_key
+    install_triggers(conn)
+    backfill(conn)
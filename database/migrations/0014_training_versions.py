@@ -0,0 +1,44 @@
+"""
+Версия тренировки для кэша и ETag API: любой триггер ниже увеличивает version,
+когда меняется то, что видно в списке участников (слоты, сама тренировка, ник участника).
+"""
+
+BUMP = """
+    INSERT INTO training_versions (training_id, version) VALUES ({ref}, 1)
+    ON CONFLICT (training_id) DO UPDATE SET version = version + 1;
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS training_versions (
+            training_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO training_versions (training_id, version) SELECT id, 1 FROM trainings")
+
+    triggers = {
+        "version_slot_insert": f"AFTER INSERT ON slots BEGIN {BUMP.format(ref='NEW.training_id')} END",
+        "version_slot_delete": f"AFTER DELETE ON slots BEGIN {BUMP.format(ref='OLD.training_id')} END",
+        "version_slot_update": f"""
+            AFTER UPDATE ON slots
+            BEGIN
+                {BUMP.format(ref='OLD.training_id')}
+                UPDATE training_versions SET version = version + 1
+                WHERE training_id = NEW.training_id AND NEW.training_id != OLD.training_id;
+            END
+        """,
+        "version_training_update": f"AFTER UPDATE ON trainings BEGIN {BUMP.format(ref='NEW.id')} END",
+        "version_training_delete": "AFTER DELETE ON trainings BEGIN DELETE FROM training_versions WHERE training_id = OLD.id; END",
+        "version_user_nickname": """
+            AFTER UPDATE OF nickname ON users
+            BEGIN
+                UPDATE training_versions SET version = version + 1
+                WHERE training_id IN (SELECT training_id FROM slots WHERE user_id = NEW.user_id);
+            END
+        """,
+    }
+    for name, body in triggers.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
@@ -0,0 +1,11 @@
+"""Уже обработанные события вебхука Юкассы: повтор того же события не применяется второй раз (payments/service.py)."""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_events (
+            event_key TEXT PRIMARY KEY,       -- payment.succeeded:<id платежа в Юкассе>
+            payment_id INTEGER,
+            received_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
@@ -0,0 +1,35 @@
+"""
+Попытки фонового обновления tg_users (database/tg_users.py): неудачный get_chat_member
+записывается в last_attempt_at, и пакет идёт с самых давних попыток. Для пользователя,
+чей профиль ни разу не получен, строка есть, но fetched_at пуст — пересобираем tg_users
+с fetched_at без NOT NULL, только если ограничение ещё на месте.
+"""
+from database.migrate import add_column, create_index, table_columns
+
+TG_USERS_SCHEMA = """
+    CREATE TABLE tg_users_new (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        fetched_at TEXT,                  -- NULL: профиль ещё ни разу не получен
+        last_attempt_at TEXT              -- последняя неудачная попытка get_chat_member
+    )
+"""
+
+
+def upgrade(conn):
+    columns = table_columns(conn, "tg_users")
+    # PRAGMA table_info: (cid, name, type, notnull, dflt_value, pk)
+    if columns["fetched_at"][3]:
+        conn.execute("DROP TABLE IF EXISTS tg_users_new")
+        conn.execute(TG_USERS_SCHEMA)
+
+        new_columns = table_columns(conn, "tg_users_new")
+        common = ", ".join(name for name in columns if name in new_columns)
+        conn.execute(f"INSERT INTO tg_users_new ({common}) SELECT {common} FROM tg_users")
+
+        conn.execute("DROP TABLE tg_users")
+        conn.execute("ALTER TABLE tg_users_new RENAME TO tg_users")
+
+    add_column(conn, "tg_users", "last_attempt_at", "TEXT")
+    create_index(conn, "idx_tg_users_fetched", "tg_users", "fetched_at")
@@ -0,0 +1,9 @@
+"""
+idx_trainings_month_key (0013) не читает ни один запрос: /stats и /finance берут месяц
+из агрегатов (database/stats.py), а триггерам и rebuild_stats() month_key нужен как значение,
+не как ключ поиска. Индекс только замедлял каждую запись в trainings. Сама колонка остаётся.
+"""
+
+
+def upgrade(conn):
+    conn.execute("DROP INDEX IF EXISTS idx_trainings_month_key")
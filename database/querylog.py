@@ -0,0 +1,269 @@
+"""
+Журнал медленных запросов SQLite.
+
+Соединения из get_connection() создаются с фабрикой TimedConnection: каждый оператор
+(execute / executemany и выборка его строк) замеряется, статистика копится в памяти
+процесса по нормализованному тексту запроса. Оператор дольше SLOW_QUERY_MS уходит в лог
+вместе с формой параметров, числом строк, вызвавшей функцией и EXPLAIN QUERY PLAN.
+Топ самых медленных с момента запуска показывает /slow_queries.
+
+Время SELECT включает fetch*: замер закрывается при следующем execute на курсоре или когда
+курсор собран — обычно сразу после conn.execute(...).fetchone(). EXPLAIN и запись в лог —
+в конце транзакции (flush_statements), а не посреди чужого запроса: в run_db / run_read,
+на выходе из with conn и в close() — так пишутся и init_db с миграциями.
+
+BEGIN / COMMIT / ROLLBACK / SAVEPOINT / RELEASE медленны не из-за запроса, а из-за ожидания
+блокировки записи (busy_timeout) или fsync: они считаются отдельно (lock_waits) и пишутся
+в лог как [lock_wait], без плана.
+"""
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from logging_config import logger
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+
+_DB_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.py")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SPACES = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_TRANSACTION = re.compile(r"\s*(?:BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+
+
+@dataclass
+class QueryStats:
+    sql: str
+    calls: int = 0
+    total: float = 0.0          # сек
+    max: float = 0.0
+    slow: int = 0               # запусков дольше SLOW_QUERY_MS
+    rows: int = 0               # строк в самом долгом запуске
+    params: str = ""            # форма параметров самого долгого запуска
+    caller: str = ""            # кто вызвал самый долгий запуск
+    plan: str | None = None     # EXPLAIN QUERY PLAN, снимается при первом медленном запуске
+    lock_wait: bool = False     # BEGIN / COMMIT / …: время — ожидание блокировки, а не запрос
+
+
+_stats: dict[str, QueryStats] = {}
+_lock_waits: dict[str, QueryStats] = {}
+_stats_lock = threading.Lock()
+
+
+class _Context(threading.local):
+    caller = "?"                # кто начал текущую транзакцию в этом потоке пула
+
+
+_context = _Context()
+
+
+@lru_cache(maxsize=1024)
+def normalize(sql: str) -> str:
+    """Одна строка, литералы и списки IN (?, ?, …) свёрнуты — одинаковые запросы считаются вместе."""
+    sql = _LITERALS.sub("?", _SPACES.sub(" ", sql).strip())
+    return _IN_LIST.sub("IN (?, …)", sql)
+
+
+@lru_cache(maxsize=1024)
+def is_transaction_control(sql: str) -> bool:
+    return _TRANSACTION.match(sql) is not None
+
+
+def params_shape(parameters) -> str:
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+
+
+def caller() -> str:
+    """
+    Первая функция проекта вне database/db.py в стеке вызывающего — например handlers/booking.py:reserve_slot.
+    Кадры стандартной библиотеки и site-packages (asyncio, aiogram, run_in_executor) пропускаются.
+    """
+    frame = sys._getframe(1)
+    while frame is not None and not _is_project_frame(frame.f_code.co_filename):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return _where(frame.f_code.co_filename, frame.f_code.co_name)
+
+
+@lru_cache(maxsize=1024)
+def _is_project_frame(filename: str) -> bool:
+    if filename == _DB_MODULE:
+        return False
+    path = os.path.abspath(filename)
+    if not path.startswith(_ROOT + os.sep):
+        return False
+    # виртуальное окружение внутри проекта (.venv/lib/.../site-packages)
+    return not {"site-packages", "dist-packages"} & set(path.split(os.sep))
+
+
+@lru_cache(maxsize=1024)
+def _where(filename: str, function: str) -> str:
+    return f"{os.path.relpath(filename, _ROOT)}:{function}"
+
+
+def set_caller(name: str | None):
+    _context.caller = name or "?"
+
+
+def slowest(limit: int = 10) -> list[QueryStats]:
+    """Самые медленные операторы (по максимальному времени) с момента запуска процесса."""
+    with _stats_lock:
+        stats = list(_stats.values())
+    return sorted(stats, key=lambda s: s.max, reverse=True)[:limit]
+
+
+def lock_waits(limit: int = 10) -> list[QueryStats]:
+    """BEGIN / COMMIT / … с самым долгим ожиданием с момента запуска процесса."""
+    with _stats_lock:
+        stats = list(_lock_waits.values())
+    return sorted(stats, key=lambda s: s.max, reverse=True)[:limit]
+
+
+def _record(conn: "TimedConnection", sql: str, parameters, elapsed: float, rows: int, where: str):
+    key = normalize(sql)
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    lock_wait = is_transaction_control(sql)
+    registry = _lock_waits if lock_wait else _stats
+
+    with _stats_lock:
+        stats = registry.get(key)
+        if stats is None:
+            stats = registry[key] = QueryStats(key, lock_wait=lock_wait)
+        stats.calls += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+            stats.max, stats.rows, stats.caller = elapsed, rows, where
+            stats.params = params_shape(parameters)
+        if slow:
+            stats.slow += 1
+
+    if slow:
+        conn._slow.append((stats, sql, parameters, elapsed, rows, where))
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который замеряет execute и выборку строк текущего оператора."""
+
+    _sql = None     # текст оператора, чей замер ещё открыт
+
+    def execute(self, sql, parameters=()):
+        if self._sql is not None:
+            self.finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._open(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._sql is not None:
+            self.finish()
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._open(sql, seq_of_parameters[0] if seq_of_parameters else (), time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - started, row is not None)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(time.perf_counter() - started, len(rows))
+        return rows
+
+    def _open(self, sql, parameters, elapsed: float):
+        self._sql, self._parameters, self._elapsed, self._rows = sql, parameters, elapsed, 0
+        # курсор может пережить транзакцию (execute() отдаёт его в event loop) — caller запоминаем сразу
+        self._caller = _context.caller
+
+    def _fetched(self, elapsed: float, rows: int):
+        if self._sql is not None:
+            self._elapsed += elapsed
+            self._rows += rows
+
+    def __del__(self):
+        if self._sql is not None:
+            self.finish()
+
+    def finish(self):
+        """Закрывает замер текущего оператора и записывает его в статистику."""
+        if self._sql is None:
+            return
+        sql, parameters, elapsed = self._sql, self._parameters, self._elapsed
+        # для SELECT rowcount = -1 — считаем выбранные строки
+        rows = self._rows if self.rowcount < 0 else self.rowcount
+        self._sql = self._parameters = None
+        _record(self.connection, sql, parameters, elapsed, rows, self._caller)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Соединение, у которого все курсоры — TimedCursor (в том числе у conn.execute)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slow: list[tuple] = []   # медленные операторы транзакции, ждут EXPLAIN и лога
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return sqlite3.Connection.cursor(self, TimedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return sqlite3.Connection.cursor(self, TimedCursor).executemany(sql, seq_of_parameters)
+
+    def __exit__(self, *exc_info):
+        try:
+            return super().__exit__(*exc_info)
+        finally:
+            self.flush_statements()
+
+    def close(self):
+        # соединения вне пула (init_db, миграции, скрипты) тоже сбрасывают накопленное
+        self.flush_statements()
+        super().close()
+
+    def flush_statements(self):
+        """Конец транзакции: пишет в лог медленные операторы вместе с планом."""
+        slow, self._slow = self._slow, []
+        for stats, sql, parameters, elapsed, rows, where in slow:
+            if stats.lock_wait:
+                logger.warning(f"[lock_wait] {stats.sql}: {elapsed * 1000:.1f} мс, {where}")
+                continue
+            if stats.plan is None:
+                stats.plan = self.explain(sql, parameters)
+            logger.warning(
+                f"[slow_query] {elapsed * 1000:.1f} мс, строк: {rows}, {where}\n"
+                f"  SQL: {stats.sql}\n"
+                f"  параметры: {params_shape(parameters)}\n"
+                f"  план: {stats.plan}"
+            )
+
+    def explain(self, sql: str, parameters) -> str:
+        try:
+            rows = sqlite3.Connection.execute(self, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        except sqlite3.Error as e:
+            return f"недоступен ({e})"
+        return "; ".join(row[-1] for row in rows) or "—"
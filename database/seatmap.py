@@ -0,0 +1,221 @@
+import time
+
+from database.dates import date_ts
+from database.db import run_db
+
+# Статусы, при которых канал считается занятым (совпадает с uq_slots_active_channel)
+ACTIVE_STATUSES = ("pending", "confirmed", "pending_cancel")
+
+# Карты мест тренировок: {statuses} и {placeholders} — списки «?» под ACTIVE_STATUSES и id тренировок
+LOAD_SQL = """
+    SELECT t.id, t.date, t.status, s.group_name, s.channel, s.user_id, s.status
+    FROM trainings t
+    LEFT JOIN slots s ON s.training_id = t.id AND s.status IN ({statuses})
+    WHERE t.id IN ({placeholders})
+"""
+
+# Ближайшие открытые тренировки: граница и LIMIT в SQL, по idx_trainings_status_date_ts
+UPCOMING_SQL = """
+    SELECT id, date, date_ts
+    FROM trainings
+    WHERE status = 'open' AND date_ts > ?
+    ORDER BY date_ts
+    LIMIT ?
+"""
+
+# Сколько живёт карта без инвалидации. Страховка от записей, которые бот не видит
+# (например, api_server подтверждает слот по вебхуку).
+SEATMAP_TTL = 60
+
+
+class SeatMap:
+    """
+    Занятость каналов одной тренировки.
+    occupied / confirmed — битовые маски по группам: бит i = GROUPS[group]["channels"][i].
+    holders — кто держит канал: {(group, channel): (user_id, status)}.
+    """
+
+    __slots__ = ("training_id", "date", "status", "occupied", "confirmed", "holders", "loaded_at")
+
+    def __init__(self, training_id: int, date: str, status: str, groups: dict):
+        self.training_id = training_id
+        self.date = date
+        self.status = status
+        self.occupied = {group: 0 for group in groups}
+        self.confirmed = {group: 0 for group in groups}
+        self.holders: dict[tuple[str, str], tuple[int, str]] = {}
+        self.loaded_at = time.monotonic()
+
+    def booked(self, group: str = None) -> int:
+        if group is not None:
+            return self.occupied.get(group, 0).bit_count()
+        return sum(mask.bit_count() for mask in self.occupied.values())
+
+    def confirmed_count(self, group: str = None) -> int:
+        if group is not None:
+            return self.confirmed.get(group, 0).bit_count()
+        return sum(mask.bit_count() for mask in self.confirmed.values())
+
+    def user_status(self, user_id: int) -> str | None:
+        for holder_id, status in self.holders.values():
+            if holder_id == user_id:
+                return status
+        return None
+
+
+class SeatMapCache:
+    """
+    Кэш карт мест открытых тренировок в памяти процесса бота.
+    Хендлеры обновляют его сразу после записи в БД (apply) или сбрасывают (invalidate);
+    промах — один запрос на все нужные тренировки.
+    """
+
+    def __init__(self, groups: dict):
+        self.groups = groups
+        self._channel_bits = {
+            group: {channel: 1 << i for i, channel in enumerate(cfg["channels"])}
+            for group, cfg in groups.items()
+        }
+        self._maps: dict[int, SeatMap] = {}
+        self._generation: dict[int, int] = {}
+        # limit -> (after_ts, loaded_at, строки UPCOMING_SQL): последнее окно списка для каждого limit
+        self._open: dict[int, tuple[int, float, list[tuple[int, str, int]]]] = {}
+        self._open_generation = 0
+        self._listeners = []
+
+    # --- чтение ---
+
+    async def get(self, training_id: int) -> SeatMap | None:
+        seat_map = self._maps.get(training_id)
+        if seat_map and time.monotonic() - seat_map.loaded_at < SEATMAP_TTL:
+            return seat_map
+        loaded = await self._load([training_id])
+        return loaded.get(training_id)
+
+    async def upcoming(self, after: str, limit: int = 6) -> list[SeatMap]:
+        """Ближайшие открытые тренировки с датой позже after (ISO-строка)."""
+        after_ts = date_ts(after)
+        ids = self._cached_upcoming(after_ts, limit)
+        if ids is None:
+            generation = self._open_generation
+            rows = await run_db(lambda conn: conn.execute(UPCOMING_SQL, (after_ts, limit)).fetchall())
+            if generation == self._open_generation:
+                self._open[limit] = (after_ts, time.monotonic(), rows)
+            ids = [training_id for training_id, _, _ in rows]
+
+        now = time.monotonic()
+        missing = [
+            training_id for training_id in ids
+            if training_id not in self._maps or now - self._maps[training_id].loaded_at >= SEATMAP_TTL
+        ]
+        loaded = await self._load(missing) if missing else {}
+
+        result = []
+        for training_id in ids:
+            seat_map = loaded.get(training_id) or self._maps.get(training_id)
+            if seat_map:
+                result.append(seat_map)
+        return result
+
+    def free_channels(self, seat_map: SeatMap, group: str) -> list[str]:
+        """Свободные каналы группы в порядке из GROUPS."""
+        mask = seat_map.occupied.get(group, 0)
+        return [channel for channel, bit in self._channel_bits.get(group, {}).items() if not mask & bit]
+
+    # --- запись ---
+
+    def apply(self, training_id: int, group: str, channel: str, user_id: int, status: str | None):
+        """
+        Write-through: канал занят со статусом status или освобождён (status=None).
+        Освобождает канал только бронь user_id: если канал уже у другого участника, карта не меняется.
+        """
+        seat_map = self._maps.get(training_id)
+        bit = self._channel_bits.get(group, {}).get(channel)
+        if seat_map is None or bit is None:
+            self.invalidate(training_id)
+            return
+        if status is None and seat_map.holders.get((group, channel), (None,))[0] != user_id:
+            return
+
+        self._generation[training_id] = self._generation.get(training_id, 0) + 1
+        seat_map.occupied[group] &= ~bit
+        seat_map.confirmed[group] &= ~bit
+        seat_map.holders.pop((group, channel), None)
+        if status in ACTIVE_STATUSES:
+            seat_map.occupied[group] |= bit
+            if status == "confirmed":
+                seat_map.confirmed[group] |= bit
+            seat_map.holders[(group, channel)] = (user_id, status)
+        self._notify(training_id)
+
+    def invalidate(self, training_id: int = None):
+        """Сбросить карту тренировки (или весь кэш, если training_id не задан)."""
+        if training_id is None:
+            for known_id in list(self._maps):
+                self._generation[known_id] = self._generation.get(known_id, 0) + 1
+            self._maps.clear()
+            self.invalidate_schedule()
+        else:
+            self._generation[training_id] = self._generation.get(training_id, 0) + 1
+            self._maps.pop(training_id, None)
+        self._notify(training_id)
+
+    def invalidate_schedule(self):
+        """Список открытых тренировок изменился (создана / отменена тренировка)."""
+        self._open_generation += 1
+        self._open.clear()
+
+    def add_listener(self, callback):
+        """callback(training_id | None) вызывается при каждом изменении занятости."""
+        self._listeners.append(callback)
+
+    # --- внутреннее ---
+
+    def _cached_upcoming(self, after_ts: int, limit: int) -> list[int] | None:
+        """
+        id из окна, загруженного с границей не позже after_ts; None — окно не подходит.
+        Окно с limit строками отвечает, пока после сдвига границы в нём остаётся limit строк;
+        неполное окно — это все открытые тренировки после его границы.
+        """
+        window = self._open.get(limit)
+        if window is None:
+            return None
+        window_after_ts, loaded_at, rows = window
+        if time.monotonic() - loaded_at >= SEATMAP_TTL or after_ts < window_after_ts:
+            return None
+        ids = [training_id for training_id, _, ts in rows if ts > after_ts]
+        if len(ids) < limit and len(rows) == limit:
+            return None
+        return ids
+
+    def _notify(self, training_id):
+        for callback in self._listeners:
+            callback(training_id)
+
+    async def _load(self, training_ids: list[int]) -> dict[int, SeatMap]:
+        generations = {training_id: self._generation.get(training_id, 0) for training_id in training_ids}
+        placeholders = ",".join("?" for _ in training_ids)
+        statuses = ",".join("?" for _ in ACTIVE_STATUSES)
+
+        rows = await run_db(lambda conn: conn.execute(
+            LOAD_SQL.format(statuses=statuses, placeholders=placeholders), (*ACTIVE_STATUSES, *training_ids)
+        ).fetchall())
+
+        loaded: dict[int, SeatMap] = {}
+        for training_id, date, training_status, group, channel, user_id, slot_status in rows:
+            seat_map = loaded.get(training_id)
+            if seat_map is None:
+                seat_map = loaded[training_id] = SeatMap(training_id, date, training_status, self.groups)
+            bit = self._channel_bits.get(group, {}).get(channel)
+            if bit is None:
+                continue
+            seat_map.occupied[group] |= bit
+            if slot_status == "confirmed":
+                seat_map.confirmed[group] |= bit
+            seat_map.holders[(group, channel)] = (user_id, slot_status)
+
+        # пока шёл запрос, карту могли изменить — такую загрузку не кладём в кэш
+        for training_id, seat_map in loaded.items():
+            if self._generation.get(training_id, 0) == generations[training_id]:
+                self._maps[training_id] = seat_map
+        return loaded
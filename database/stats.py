@@ -0,0 +1,82 @@
+"""
+Помесячные агрегаты для /stats и /finance.
+
+stats_user_month (month, user_id) — посещения и слоты участника за месяц,
+stats_training (training_id) — месяц тренировки, не отменена ли она, число слотов.
+Обе таблицы ведут триггеры SQLite на slots и trainings (создаются миграциями 0012 и 0013):
+слоты меняют и бот, и api_server, и так ни один путь записи не пройдёт мимо агрегатов.
+rebuild_stats() пересчитывает всё с нуля.
+
+Считаются активные слоты (pending / confirmed / pending_cancel) на неотменённых тренировках;
+visits — число разных тренировок, как COUNT(DISTINCT training_id) в прежних запросах.
+"""
+from database.db import fetch_all, fetch_one
+
+STATS_STATUSES = "('pending', 'confirmed', 'pending_cancel')"
+
+
+def rebuild_stats(conn):
+    """Пересчёт агрегатов с нуля (/rebuild_stats). Внутри транзакции вызывающего."""
+    conn.execute("DELETE FROM stats_user_month")
+    conn.execute("DELETE FROM stats_training")
+
+    conn.execute(f"""
+        INSERT INTO stats_training (training_id, month, active, slots)
+        SELECT t.id, t.month_key, t.status != 'cancelled',
+               (SELECT COUNT(*) FROM slots s WHERE s.training_id = t.id AND s.status IN {STATS_STATUSES})
+        FROM trainings t
+    """)
+    conn.execute(f"""
+        INSERT INTO stats_user_month (month, user_id, visits, slots, sub_slots, one_slots)
+        SELECT
+            t.month_key,
+            s.user_id,
+            COUNT(DISTINCT s.training_id),
+            COUNT(*),
+            SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END)
+        FROM slots s
+        JOIN trainings t ON t.id = s.training_id
+        WHERE t.status != 'cancelled' AND s.status IN {STATS_STATUSES}
+        GROUP BY 1, 2
+    """)
+
+
+# ==========================
+# Чтение
+# ==========================
+
+async def attendance_rows(first_month: str | None, last_month: str | None, exclude_users):
+    """(nickname, visits, sub_slots, one_slots) по участникам за месяцы [first_month, last_month]; None — всё время."""
+    exclude_users = tuple(exclude_users)
+    placeholders = ",".join("?" for _ in exclude_users)
+    where, params = f"r.user_id NOT IN ({placeholders})", [*exclude_users]
+    if first_month is not None:
+        where += " AND r.month BETWEEN ? AND ?"
+        params += [first_month, last_month]
+
+    return await fetch_all(f"""
+        SELECT u.nickname, SUM(r.visits) AS cnt, SUM(r.sub_slots), SUM(r.one_slots)
+        FROM stats_user_month r
+        JOIN users u ON u.user_id = r.user_id
+        WHERE {where}
+        GROUP BY r.user_id
+        HAVING SUM(r.slots) > 0
+        ORDER BY cnt DESC
+    """, tuple(params))
+
+
+async def month_finance(month: str, exclude_users):
+    """(тренировок, слотов, по абонементу, разовых) за месяц YYYY-MM."""
+    exclude_users = tuple(exclude_users)
+    placeholders = ",".join("?" for _ in exclude_users)
+
+    trainings = (await fetch_one(
+        "SELECT COUNT(*) FROM stats_training WHERE month = ? AND active = 1", (month,)
+    ))[0]
+    slots, sub_slots, one_slots = await fetch_one(f"""
+        SELECT COALESCE(SUM(slots), 0), COALESCE(SUM(sub_slots), 0), COALESCE(SUM(one_slots), 0)
+        FROM stats_user_month
+        WHERE month = ? AND user_id NOT IN ({placeholders})
+    """, (month, *exclude_users))
+    return trainings, slots, sub_slots, one_slots
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+
+from database.db import fetch_all, fetch_one, run_db
+from logging_config import logger
+
+# Через сколько запись считается устаревшей и обновляется фоновой задачей
+TG_USER_TTL = timedelta(days=3)
+REFRESH_INTERVAL = 3600
+REFRESH_BATCH = 200
+REFRESH_CONCURRENCY = 4
+
+
+def remember(conn, user_id: int, username: str | None, full_name: str | None):
+    """Upsert идентичности пользователя; fetched_at обновляется всегда."""
+    conn.execute("""
+        INSERT INTO tg_users (user_id, username, full_name, fetched_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            username = excluded.username,
+            full_name = excluded.full_name,
+            fetched_at = excluded.fetched_at
+    """, (user_id, username, full_name, datetime.now().isoformat()))
+
+
+def record_attempt(conn, user_id: int):
+    """Неудачный get_chat_member: профиль (если был) не трогаем, запоминаем время попытки."""
+    conn.execute("""
+        INSERT INTO tg_users (user_id, last_attempt_at)
+        VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET last_attempt_at = excluded.last_attempt_at
+    """, (user_id, datetime.now().isoformat()))
+
+
+async def resolve_tg_user(bot: Bot, user_id: int) -> tuple[str | None, str | None]:
+    """(username, full_name) из кэша, при промахе — один get_chat_member с записью в кэш."""
+    row = await fetch_one(
+        "SELECT username, full_name FROM tg_users WHERE user_id = ? AND fetched_at IS NOT NULL", (user_id,)
+    )
+    if row:
+        return row
+    return await _fetch_and_remember(bot, user_id)
+
+
+async def _fetch_and_remember(bot: Bot, user_id: int) -> tuple[str | None, str | None]:
+    try:
+        chat_member = await bot.get_chat_member(chat_id=user_id, user_id=user_id)
+    except Exception as e:
+        logger.info(f"[tg_users] не удалось получить профиль {user_id}: {e}")
+        await run_db(record_attempt, user_id)
+        return None, None
+    username, full_name = chat_member.user.username, chat_member.user.full_name
+    await run_db(remember, user_id, username, full_name)
+    return username, full_name
+
+
+async def refresh_tg_users(bot: Bot):
+    """
+    Фоновое обновление: зарегистрированные пользователи без профиля в кэше
+    или с профилем старше TG_USER_TTL, не больше REFRESH_CONCURRENCY запросов сразу.
+    Первыми идут те, кого ещё не пробовали, дальше — по давности неудачной попытки:
+    пользователи, для которых get_chat_member всегда падает, не занимают весь пакет.
+    Планировщик: раз в REFRESH_INTERVAL.
+    """
+    semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+    async def refresh(user_id):
+        async with semaphore:
+            await _fetch_and_remember(bot, user_id)
+
+    border = (datetime.now() - TG_USER_TTL).isoformat()
+    stale = await fetch_all("""
+        SELECT u.user_id
+        FROM users u
+        LEFT JOIN tg_users t ON t.user_id = u.user_id
+        WHERE t.fetched_at IS NULL OR t.fetched_at < ?
+        ORDER BY t.last_attempt_at IS NOT NULL, t.last_attempt_at, t.fetched_at IS NOT NULL, t.fetched_at
+        LIMIT ?
+    """, (border, REFRESH_BATCH))
+
+    if stale:
+        await asyncio.gather(*(refresh(user_id) for user_id, in stale))
+        logger.info(f"[tg_users] обновлено профилей: {len(stale)}")
@@ -0,0 +1,35 @@
+"""
+Конфиг групп и каналов тренировки.
+
+Без побочных эффектов при импорте (ни config, ни aiogram): его берут и хендлеры бота,
+и платёжный путь api_server, которому BOT_TOKEN не нужен.
+"""
+
+GROUPS = {
+    "fast": {
+        "label": "⚡ Быстрая",
+        "channels": ["R1", "R2", "F2", "F4", "R8"],
+    },
+    "standard": {
+        "label": "🚀 Средняя",
+        "channels": ["R1", "R2", "F2", "F4", "R8"],
+    },
+    "third": {
+        "label": "🏁 Стандартная",
+        "channels": ["R1", "R2", "F2", "F4", "R8"],
+    },
+}
+
+# Максимум слотов в каждой группе — по длине списка каналов
+MAX_SLOTS_PER_GROUP = {
+    name: len(cfg["channels"])
+    for name, cfg in GROUPS.items()
+}
+
+# Общее количество слотов на тренировку
+TOTAL_SLOTS = sum(MAX_SLOTS_PER_GROUP.values())
+
+
+def get_group_label(group_name: str) -> str:
+    """Красивое имя группы по её коду."""
+    return GROUPS.get(group_name, {}).get("label", group_name)
@@ -4,17 +4,21 @@ from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime, timedelta
 from config import ADMINS, REQUIRED_CHAT_ID
-from database.db import get_connection
+from database.db import fetch_one, fetch_all, execute, run_db
+from notifications.outbox import enqueue, queue_messages, wake
+from notifications.announcements import send_progrev
+from database.stats import attendance_rows, month_finance, rebuild_stats
+from database.dates import date_ts
+from database import querylog
 from aiogram.filters.command import Command, CommandObject
 from aiogram.utils.markdown import hbold
 from handlers.booking import (
     notify_admins_about_booking,
-    GROUPS,
-    MAX_SLOTS_PER_GROUP,
     TOTAL_SLOTS,
-    get_group_label,
+    seat_maps,
 )
 import calendar
+import html
 
 router = Router()
 MAX_LEN = 4096  # лимит Telegram
@@ -36,19 +40,16 @@ def chunk_text_by_lines(text: str, limit: int = MAX_LEN):
     return parts
 
 
-def get_existing_training_dates() -> set[str]:
+async def get_existing_training_dates() -> set[str]:
     """Получает даты только открытых тренировок (без времени) в формате 'YYYY-MM-DD'."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT date FROM trainings WHERE status = 'open'")
-        results = cursor.fetchall()
+    results = await fetch_all("SELECT date FROM trainings WHERE status = 'open'")
     return {datetime.fromisoformat(row[0]).date().isoformat() for row in results}
 
 
-def build_calendar(year: int, month: int) -> InlineKeyboardMarkup:
+async def build_calendar(year: int, month: int) -> InlineKeyboardMarkup:
     now = datetime.now()
     today = now.date()
-    existing_dates = get_existing_training_dates()
+    existing_dates = await get_existing_training_dates()
 
     calendar.setfirstweekday(calendar.MONDAY)
     month_calendar = calendar.monthcalendar(year, month)
@@ -112,28 +113,21 @@ async def list_users(message: Message):
         await message.answer("❌ У тебя нет прав администратора.")
         return
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT user_id, nickname, system, subscription
-            FROM users
-            ORDER BY user_id
-        """)
-        users = cursor.fetchall()
+    users = await fetch_all("""
+        SELECT u.user_id, u.nickname, u.system, u.subscription, t.username, t.full_name
+        FROM users u
+        LEFT JOIN tg_users t ON t.user_id = u.user_id
+        ORDER BY u.user_id
+    """)
 
     if not users:
         await message.answer("📭 В базе нет зарегистрированных пользователей.")
         return
 
     lines = ["📋 Список пользователей:\n"]
-    for user_id, nickname, system, subscription in users:
-        # Пытаемся получить username и полное имя
-        try:
-            chat_member = await message.bot.get_chat_member(chat_id=user_id, user_id=user_id)
-            full_name = chat_member.user.full_name
-            username = chat_member.user.username
-        except Exception:
-            full_name, username = "—", None
+    for user_id, nickname, system, subscription, username, full_name in users:
+        # username и имя — из кэша tg_users (middleware + фоновое обновление)
+        full_name = full_name or "—"
 
         user_link = f"@{username}" if username else f"<a href='tg://user?id={user_id}'>{full_name}</a>"
 
@@ -173,7 +167,7 @@ async def navigate_calendar(callback: CallbackQuery):
     year = int(year)
     month = int(month)
 
-    keyboard = build_calendar(year, month)
+    keyboard = await build_calendar(year, month)
     await callback.message.edit_reply_markup(reply_markup=keyboard)
     await callback.answer()
 
@@ -192,7 +186,7 @@ async def create_training(callback: CallbackQuery):
         await callback.answer("Можно выбрать только вторник или субботу", show_alert=True)
         return
 
-    with get_connection() as conn:
+    def create(conn):
         cursor = conn.cursor()
         # Создание тренировки
         cursor.execute("INSERT INTO trainings (date, status) VALUES (?, ?)", (dt.isoformat(), "open"))
@@ -209,7 +203,8 @@ async def create_training(callback: CallbackQuery):
                 VALUES (?, ?, ?, ?, 'confirmed', ?, 'admin')
             """, (training_id, admin_id, group, channel, now))
 
-        conn.commit()
+    await run_db(create)
+    seat_maps.invalidate_schedule()
 
     await callback.message.edit_text(f"✅ Тренировка создана на {dt.strftime('%d.%m.%Y %H:%M')}")
     await callback.answer()
@@ -217,7 +212,7 @@ async def create_training(callback: CallbackQuery):
 
 async def send_calendar(target, year: int, month: int):
     text = f"📅 Выбери дату тренировки ({calendar.month_name[month]} {year})"
-    kb = build_calendar(year, month)
+    kb = await build_calendar(year, month)
     if isinstance(target, Message):
         await target.answer(text, reply_markup=kb)
     else:
@@ -248,10 +243,7 @@ async def add_subscription_command(message: Message):
         return
 
     # Проверим, существует ли пользователь
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nickname FROM users WHERE user_id = ?", (target_user_id,))
-        row = cursor.fetchone()
+    row = await fetch_one("SELECT nickname FROM users WHERE user_id = ?", (target_user_id,))
 
     if not row:
         await message.answer("❌ Пользователь не найден.")
@@ -278,12 +270,11 @@ async def confirm_add_subscription(callback: CallbackQuery):
     user_id = int(user_id_str)
     count = int(count_str)
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET subscription = subscription + ? WHERE user_id = ?", (count, user_id))
-        cursor.execute("SELECT nickname FROM users WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        conn.commit()
+    def add(conn):
+        conn.execute("UPDATE users SET subscription = subscription + ? WHERE user_id = ?", (count, user_id))
+        return conn.execute("SELECT nickname FROM users WHERE user_id = ?", (user_id,)).fetchone()
+
+    row = await run_db(add)
 
     nickname = row[0] if row else "неизвестный"
 
@@ -317,16 +308,11 @@ async def cancel_training(message: Message):
         await message.answer("❌ У тебя нет прав администратора.")
         return
 
-    now = datetime.now().isoformat()
-
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, date FROM trainings
-            WHERE status = 'open' AND datetime(date) > ?
-            ORDER BY date ASC
-        """, (now,))
-        rows = cursor.fetchall()
+    rows = await fetch_all("""
+        SELECT id, date FROM trainings
+        WHERE status = 'open' AND date_ts > ?
+        ORDER BY date_ts ASC
+    """, (date_ts(datetime.now()),))
 
     if not rows:
         await message.answer("❌ Нет будущих открытых тренировок.")
@@ -347,16 +333,14 @@ async def cancel_training(message: Message):
 async def confirm_training_cancel(callback: CallbackQuery):
     training_id = int(callback.data.split(":")[1])
 
-    with get_connection() as conn:
+    def cancel(conn):
         cursor = conn.cursor()
 
         # Получаем дату тренировки
         cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
         row = cursor.fetchone()
         if not row:
-            await callback.answer("❌ Тренировка не найдена", show_alert=True)
-            return
-        date_str = datetime.fromisoformat(row[0]).strftime("%d.%m.%Y %H:%M")
+            return None, []
 
         # Получаем всех участников
         cursor.execute("""
@@ -368,28 +352,26 @@ async def confirm_training_cancel(callback: CallbackQuery):
 
         # Обновляем статус тренировки
         cursor.execute("UPDATE trainings SET status = 'cancelled' WHERE id = ?", (training_id,))
-        conn.commit()
 
-    # Рассылаем уведомления
-    for user_id, status in participants:
-        try:
-            if status == "confirmed":
-                # Возврат абонемента
-                with get_connection() as conn:
-                    conn.execute(
-                        "UPDATE users SET subscription = subscription + 1 WHERE user_id = ?", (user_id,)
-                    )
-                await callback.bot.send_message(
-                    user_id,
-                    f"❌ Тренировка {date_str} была отменена.\n🎟 Вам возвращён 1 абонемент."
-                )
-            else:
-                await callback.bot.send_message(
-                    user_id,
-                    f"❌ Тренировка {date_str} была отменена."
-                )
-        except Exception as e:
-            print(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
+        # Возврат абонементов подтверждённым участникам и уведомления — в той же транзакции
+        date_str = datetime.fromisoformat(row[0]).strftime("%d.%m.%Y %H:%M")
+        confirmed = [user_id for user_id, status in participants if status == "confirmed"]
+        others = [user_id for user_id, status in participants if status != "confirmed"]
+        cursor.executemany(
+            "UPDATE users SET subscription = subscription + 1 WHERE user_id = ?", [(user_id,) for user_id in confirmed]
+        )
+        queue_messages(conn, confirmed, f"❌ Тренировка {date_str} была отменена.\n🎟 Вам возвращён 1 абонемент.")
+        queue_messages(conn, others, f"❌ Тренировка {date_str} была отменена.")
+        return row, participants
+
+    row, participants = await run_db(cancel)
+    if not row:
+        await callback.answer("❌ Тренировка не найдена", show_alert=True)
+        return
+    seat_maps.invalidate(training_id)
+    seat_maps.invalidate_schedule()
+    wake()
+    date_str = datetime.fromisoformat(row[0]).strftime("%d.%m.%Y %H:%M")
 
     await callback.message.edit_text(f"✅ Тренировка {date_str} отменена, пользователи уведомлены.")
     await callback.answer()
@@ -426,6 +408,9 @@ async def admin_help(message: Message):
         "  • <code>/finance</code> — текущий месяц\n"
         "  • <code>/finance 2026-01</code> — выбранный месяц\n"
         "  Считает аренду, разовые доходы, слоты по абонементам и баланс месяца\n\n"
+        "🧮 <b>/rebuild_stats</b> — пересчитать статистику с нуля\n\n"
+        "🐢 <b>/slow_queries</b> — самые медленные SQL-запросы бота с запуска\n"
+        "  • <code>/slow_queries 20</code> — топ-20 (по умолчанию 10)\n\n"
         "🪪 <b>/id</b> — узнать свой Telegram ID\n"
         "🚒 <b>/progrev</b> — отправить прогрев о свободных местах\n"
         "🔁 <b>/resend_pending</b> — проверить нет ли залипших слотов\n"
@@ -445,20 +430,18 @@ async def resend_pending_handler(message: Message, bot: Bot):
         await message.answer("❌ У тебя нет прав.")
         return
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT s.id, s.training_id, s.user_id, s.group_name, s.channel, s.payment_type, s.created_at,
-                   t.date, u.nickname, u.system
-            FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            JOIN users u ON s.user_id = u.user_id
-            WHERE s.status = 'pending'
-              AND NOT EXISTS (
-                SELECT 1 FROM admin_notifications n WHERE n.slot_id = s.id
-              )
-        """)
-        slots = cursor.fetchall()
+    slots = await fetch_all("""
+        SELECT s.id, s.training_id, s.user_id, s.group_name, s.channel, s.payment_type, s.created_at,
+               t.date, u.nickname, u.system, tg.username, tg.full_name
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        JOIN users u ON s.user_id = u.user_id
+        LEFT JOIN tg_users tg ON tg.user_id = s.user_id
+        WHERE s.status = 'pending'
+          AND NOT EXISTS (
+            SELECT 1 FROM admin_notifications n WHERE n.slot_id = s.id
+          )
+    """)
 
     if not slots:
         await message.answer("✅ Все уведомления отправлены. Ничего не найдено.")
@@ -467,15 +450,8 @@ async def resend_pending_handler(message: Message, bot: Bot):
     sent_count = 0
 
     for row in slots:
-        slot_id, training_id, user_id, group, channel, payment_type, _, training_date, _, _, = row
-
-        try:
-            chat_member = await bot.get_chat_member(chat_id=user_id, user_id=user_id)
-            username = chat_member.user.username
-            full_name = chat_member.user.full_name
-        except:
-            full_name = "Пользователь"
-            username = None
+        slot_id, training_id, user_id, group, channel, payment_type, _, training_date, _, _, username, full_name = row
+        full_name = full_name or "Пользователь"
 
         await notify_admins_about_booking(
             bot=bot,
@@ -500,52 +476,18 @@ async def send_progrev_message(message: Message):
         await message.answer("❌ У тебя нет прав администратора.")
         return
 
-    now = datetime.now()
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, date FROM trainings
-            WHERE status = 'open' AND date > ?
-            ORDER BY date
-            LIMIT 1
-        """, (now.isoformat(),))
-        training = cursor.fetchone()
-
-    if not training:
+    trainings = await seat_maps.upcoming(datetime.now().isoformat(), limit=1)
+    if not trainings:
         await message.answer("❌ Нет ближайших открытых тренировок.")
         return
 
-    training_id, date_str = training
-    date_fmt = datetime.fromisoformat(date_str).strftime("%d.%m.%Y %H:%M")
-
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT group_name, COUNT(*)
-            FROM slots
-            WHERE training_id = ? AND status IN ('confirmed')
-            GROUP BY group_name
-        """, (training_id,))
-        counts = dict(cursor.fetchall())
-
-    # Формируем строки по всем группам из конфига
-    lines = []
-    for group_name in GROUPS.keys():
-        used = counts.get(group_name, 0)
-        free = MAX_SLOTS_PER_GROUP[group_name] - used
-        status = f"{free} мест" if free > 0 else "места закончились"
-        lines.append(f"{get_group_label(group_name)}: <b>{status}</b>")
-
-    text = (
-        f"🔥 <b>Остались места на ближайшую тренировку!</b>\n"
-        f"📅 <b>{date_fmt}</b>\n\n"
-        + "\n".join(lines) +
-        "\n\n"
-        f"🚀 Успей записаться, пока есть места!"
-    )
-
-    await message.bot.send_message(REQUIRED_CHAT_ID, text, parse_mode="HTML")
-    await message.answer("✅ Сообщение прогрева отправлено в чат клуба.")
+    result = await send_progrev(trainings[0], f"admin:{message.from_user.id}", REQUIRED_CHAT_ID)
+    if result == "no_seats":
+        await message.answer("❌ На ближайшую тренировку мест нет — прогрев не отправлен.")
+    elif result == "duplicate":
+        await message.answer("ℹ️ Прогрев на эту тренировку сегодня уже отправлялся.")
+    else:
+        await message.answer("✅ Сообщение прогрева отправлено в чат клуба.")
 
 
 @admin_router.message(Command("announce"))
@@ -561,10 +503,11 @@ async def announce_handler(message: Message, bot: Bot, command: CommandObject):
     # Вариант 1: есть текст — шлём как HTML, режем на части
     if args_text:
         parts = chunk_text_by_lines(args_text)  # твоя функция уже есть
+        # части одного чата диспетчер отправляет строго по порядку
         for chunk in parts:
-            await bot.send_message(
-                chat_id=REQUIRED_CHAT_ID,
-                text=chunk,
+            await enqueue(
+                REQUIRED_CHAT_ID,
+                chunk,
                 parse_mode=ParseMode.HTML,
                 disable_web_page_preview=True,
             )
@@ -603,19 +546,22 @@ async def list_abonement_users(message: Message):
         await message.answer("❌ У тебя нет прав администратора.")
         return
 
-    with get_connection() as conn:
+    def load(conn):
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT user_id, nickname, system, subscription
-            FROM users
-            WHERE COALESCE(subscription, 0) > 0
-            ORDER BY subscription DESC, user_id
+            SELECT u.user_id, u.nickname, u.system, u.subscription, t.username, t.full_name
+            FROM users u
+            LEFT JOIN tg_users t ON t.user_id = u.user_id
+            WHERE COALESCE(u.subscription, 0) > 0
+            ORDER BY u.subscription DESC, u.user_id
         """)
         users = cursor.fetchall()
 
         # также подсчитаем общее число таких пользователей и сумму абонементов
         cursor.execute("SELECT COUNT(*), SUM(COALESCE(subscription,0)) FROM users WHERE COALESCE(subscription,0) > 0")
-        stats = cursor.fetchone()
+        return users, cursor.fetchone()
+
+    users, stats = await run_db(load)
 
     if not users:
         await message.answer("📭 Нет пользователей с абонементами.")
@@ -628,14 +574,8 @@ async def list_abonement_users(message: Message):
              f"Σ абонементов: <b>{total_subs}</b>\n",
              "--------------------------------"]
 
-    for user_id, nickname, system, subscription in users:
-        # Пытаемся получить username и полное имя
-        try:
-            chat_member = await message.bot.get_chat_member(chat_id=user_id, user_id=user_id)
-            full_name = chat_member.user.full_name or "—"
-            username = chat_member.user.username
-        except Exception:
-            full_name, username = "—", None
+    for user_id, nickname, system, subscription, username, full_name in users:
+        full_name = full_name or "—"
 
         user_link = f"@{username}" if username else f"<a href='tg://user?id={user_id}'>{full_name}</a>"
 
@@ -670,81 +610,30 @@ async def attendance_stats(message: Message):
     parts = message.text.strip().split(maxsplit=1)
     period = parts[1] if len(parts) > 1 else ""
 
-    admin_placeholders = ",".join("?" for _ in ADMIN_USER_IDS)
+    # помесячные агрегаты (database/stats.py) — читаем только строки нужного периода
+    if not period:
+        title = "📊 Посещаемость за всё время"
+        first_month = last_month = None
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    elif len(period) == 4 and period.isdigit():
+        title = f"📊 Посещаемость за {period} год"
+        first_month, last_month = f"{period}-01", f"{period}-12"
 
-        base_where = f"""
-            t.status != 'cancelled'
-            AND s.user_id NOT IN ({admin_placeholders})
-        """
-
-        if not period:
-            title = "📊 Посещаемость за всё время"
-            sql = f"""
-                SELECT
-                    u.nickname,
-                    COUNT(DISTINCT s.training_id) AS cnt,
-                    SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END) AS sub_cnt,
-                    SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END) AS one_cnt
-                FROM slots s
-                JOIN users u ON u.user_id = s.user_id
-                JOIN trainings t ON t.id = s.training_id
-                WHERE {base_where}
-                GROUP BY u.user_id
-                ORDER BY cnt DESC
-            """
-            params = (*ADMIN_USER_IDS,)
-
-        elif len(period) == 4 and period.isdigit():
-            title = f"📊 Посещаемость за {period} год"
-            sql = f"""
-                SELECT
-                    u.nickname,
-                    COUNT(DISTINCT s.training_id) AS cnt,
-                    SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END) AS sub_cnt,
-                    SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END) AS one_cnt
-                FROM slots s
-                JOIN users u ON u.user_id = s.user_id
-                JOIN trainings t ON t.id = s.training_id
-                WHERE {base_where}
-                  AND strftime('%Y', t.date) = ?
-                GROUP BY u.user_id
-                ORDER BY cnt DESC
-            """
-            params = (*ADMIN_USER_IDS, period)
-
-        elif len(period) == 7 and period[4] == "-":
-            title = f"📊 Посещаемость за {period}"
-            sql = f"""
-                SELECT
-                    u.nickname,
-                    COUNT(DISTINCT s.training_id) AS cnt,
-                    SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END) AS sub_cnt,
-                    SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END) AS one_cnt
-                FROM slots s
-                JOIN users u ON u.user_id = s.user_id
-                JOIN trainings t ON t.id = s.training_id
-                WHERE {base_where}
-                  AND strftime('%Y-%m', t.date) = ?
-                GROUP BY u.user_id
-                ORDER BY cnt DESC
-            """
-            params = (*ADMIN_USER_IDS, period)
+    elif len(period) == 7 and period[4] == "-":
+        title = f"📊 Посещаемость за {period}"
+        first_month = last_month = period
 
-        else:
-            await message.answer(
-                "❗ Неверный формат.\n"
-                "Используй:\n"
-                "• /stats\n"
-                "• /stats 2025\n"
-                "• /stats 2025-01"
-            )
-            return
+    else:
+        await message.answer(
+            "❗ Неверный формат.\n"
+            "Используй:\n"
+            "• /stats\n"
+            "• /stats 2025\n"
+            "• /stats 2025-01"
+        )
+        return
 
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
+    rows = await attendance_rows(first_month, last_month, ADMIN_USER_IDS)
 
     if not rows:
         await message.answer("📭 Нет данных за выбранный период.")
@@ -791,43 +680,12 @@ async def finance_month(message: Message):
         )
         return
 
-    admin_placeholders = ",".join("?" for _ in ADMIN_USER_IDS)
+    # тренировки и слоты месяца (кроме админов) — из помесячных агрегатов
+    trainings_count, total_slots, sub_slots, one_slots = await month_finance(period, ADMIN_USER_IDS)
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # 1️⃣ тренировки месяца
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM trainings
-            WHERE status != 'cancelled'
-              AND strftime('%Y-%m', date) = ?
-        """, (period,))
-        trainings_count = cursor.fetchone()[0]
-
-        if trainings_count == 0:
-            await message.answer("📭 В этом месяце нет тренировок.")
-            return
-
-        # 2️⃣ слоты месяца (кроме админов)
-        sql = f"""
-            SELECT
-                COUNT(*) AS total_slots,
-                SUM(CASE WHEN s.payment_type = 'subscription' THEN 1 ELSE 0 END) AS sub_slots,
-                SUM(CASE WHEN s.payment_type != 'subscription' THEN 1 ELSE 0 END) AS one_slots
-            FROM slots s
-            JOIN trainings t ON t.id = s.training_id
-            WHERE t.status != 'cancelled'
-              AND strftime('%Y-%m', t.date) = ?
-              AND s.user_id NOT IN ({admin_placeholders})
-        """
-        params = (period, *ADMIN_USER_IDS)
-
-        cursor.execute(sql, params)
-        total_slots, sub_slots, one_slots = cursor.fetchone()
-
-        sub_slots = sub_slots or 0
-        one_slots = one_slots or 0
+    if trainings_count == 0:
+        await message.answer("📭 В этом месяце нет тренировок.")
+        return
 
     total_capacity = trainings_count * SLOTS_PER_TRAINING
     free_slots = total_capacity - total_slots
@@ -863,3 +721,60 @@ async def finance_month(message: Message):
 
     for chunk in chunk_text_by_lines("\n".join(lines)):
         await message.answer(chunk, parse_mode=ParseMode.HTML)
+
+
+@router.message(F.text == "/rebuild_stats")
+async def rebuild_stats_command(message: Message):
+    if message.from_user.id not in ADMINS:
+        await message.answer("❌ У тебя нет прав администратора.")
+        return
+
+    await run_db(rebuild_stats)
+    await message.answer("✅ Статистика пересчитана.")
+
+
+@router.message(Command("slow_queries"))
+async def slow_queries_command(message: Message, command: CommandObject):
+    if message.from_user.id not in ADMINS:
+        await message.answer("❌ У тебя нет прав администратора.")
+        return
+
+    limit = 10
+    if command.args:
+        try:
+            limit = max(1, min(int(command.args.strip()), 30))
+        except ValueError:
+            await message.answer("❗ Используй формат: /slow_queries [кол-во]")
+            return
+
+    top = querylog.slowest(limit)
+    if not top:
+        await message.answer("📭 Запросов с момента запуска ещё не было.")
+        return
+
+    lines = [f"🐢 <b>Самые медленные запросы с запуска</b> (порог лога {querylog.SLOW_QUERY_MS:g} мс)", ""]
+    for i, stats in enumerate(top, start=1):
+        sql = stats.sql if len(stats.sql) <= 300 else stats.sql[:300] + "…"
+        lines += [
+            f"<b>{i}. max {stats.max * 1000:.1f} мс</b>, среднее {stats.total / stats.calls * 1000:.2f} мс, "
+            f"вызовов {stats.calls}, медленных {stats.slow}",
+            f"📍 {html.escape(stats.caller)}, строк: {stats.rows}, параметры: {html.escape(stats.params)}",
+            f"<code>{html.escape(sql)}</code>",
+        ]
+        if stats.plan:
+            lines.append(f"🗺 {html.escape(stats.plan)}")
+        lines.append("")
+
+    # BEGIN / COMMIT в топ не попадают: их время — ожидание блокировки записи, а не запрос
+    waits = querylog.lock_waits(5)
+    if waits:
+        lines.append("🔒 <b>Ожидание блокировок</b>")
+        for stats in waits:
+            lines.append(
+                f"<code>{html.escape(stats.sql)}</code>: max {stats.max * 1000:.1f} мс, "
+                f"среднее {stats.total / stats.calls * 1000:.2f} мс, вызовов {stats.calls}, "
+                f"дольше порога {stats.slow} — {html.escape(stats.caller)}"
+            )
+
+    for chunk in chunk_text_by_lines("\n".join(lines)):
+        await message.answer(chunk, parse_mode=ParseMode.HTML)
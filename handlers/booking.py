@@ -1,82 +1,38 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
-from database.db import get_connection
+from database.db import fetch_one, fetch_all, execute, run_db
+from database.seatmap import SeatMapCache
+from notifications.outbox import cancel_slot_messages, enqueue, enqueue_many, wake
+from notifications.capacity import record_capacity
+from database.tg_users import resolve_tg_user
+from database.dates import date_ts
 from config import ADMINS, PAYMENT_LINK, REQUIRED_CHAT_ID, CARD
+from groups import GROUPS, MAX_SLOTS_PER_GROUP, TOTAL_SLOTS, get_group_label
 from datetime import datetime, timedelta
 from logging_config import logger
-from payments.service import create_payment
+from payments.service import create_payment, expire_slot
 USE_YOOKASSA = True
 
 
 
 router = Router()
 
-# ==========================
-# Конфиг групп и каналов
-# ==========================
+# Занятость каналов открытых тренировок в памяти; любое изменение слотов должно
+# пройти через seat_maps.apply(...) или seat_maps.invalidate(training_id)
+seat_maps = SeatMapCache(GROUPS)
 
-GROUPS = {
-    "fast": {
-        "label": "⚡ Быстрая",
-        "channels": ["R1", "R2", "F2", "F4", "R8"],
-    },
-    "standard": {
-        "label": "🚀 Средняя",
-        "channels": ["R1", "R2", "F2", "F4", "R8"],
-    },
-    "third": {
-        "label": "🏁 Стандартная",
-        "channels": ["R1", "R2", "F2", "F4", "R8"],
-    },
-}
 
-# Максимум слотов в каждой группе — по длине списка каналов
-MAX_SLOTS_PER_GROUP = {
-    name: len(cfg["channels"])
-    for name, cfg in GROUPS.items()
-}
-
-# Общее количество слотов на тренировку
-TOTAL_SLOTS = sum(MAX_SLOTS_PER_GROUP.values())
-
-
-def get_group_label(group_name: str) -> str:
-    """Красивое имя группы по её коду."""
-    return GROUPS.get(group_name, {}).get("label", group_name)
-
-
-@router.message(F.text.contains("Записаться"))
-async def show_available_trainings(message: Message):
-    user_id = message.from_user.id
-    now = datetime.now()
-
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        cutoff_date = (now - timedelta(hours=1)).isoformat()
-
-        cursor.execute("""
-            SELECT t.id, t.date,
-                (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND status IN ('pending', 'confirmed')) AS booked_count,
-                (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND user_id = ? AND status IN ('pending', 'confirmed')) AS user_booked,
-                (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND user_id = ? AND status IN ('pending_cancel')) AS user_pending
-            FROM trainings t
-            WHERE t.status = 'open' AND t.date > ?
-            ORDER BY t.date ASC
-            LIMIT 6
-        """, (user_id, user_id, cutoff_date))
-
-        trainings = cursor.fetchall()
+async def build_trainings_keyboard(user_id: int) -> InlineKeyboardMarkup | None:
+    """Кнопки ближайших тренировок для меню «Записаться». None — если открытых тренировок нет."""
+    cutoff_date = (datetime.now() - timedelta(hours=1)).isoformat()
+    trainings = await seat_maps.upcoming(cutoff_date)
 
     if not trainings:
-        await message.answer("❌ Пока нет открытых тренировок.")
-        return
-
-    total_slots = TOTAL_SLOTS
+        return None
 
     keyboard = []
-    for training_id, date_str, booked_count, user_booked, user_pending in trainings:
-        date_obj = datetime.fromisoformat(date_str)
+    for training in trainings:
+        date_obj = datetime.fromisoformat(training.date)
 
         weekday_label = ""
         if date_obj.weekday() == 1:
@@ -84,21 +40,32 @@ async def show_available_trainings(message: Message):
         elif date_obj.weekday() == 5:
             weekday_label = "Суббота "
 
-        free_slots = total_slots - (booked_count or 0)
+        booked = training.booked()
+        user_status = training.user_status(user_id)
+        free_slots = TOTAL_SLOTS - booked
         label = f"{weekday_label}{date_obj.strftime('%d.%m %H:%M')} ({free_slots})"
 
-        if (user_booked or 0) > 0:
+        if user_status in ("pending", "confirmed"):
             label += " ✅"
-        elif (user_pending or 0) > 0:
+        elif user_status == "pending_cancel":
             label += " ⏳"
-        elif (booked_count or 0) >= total_slots:
+        elif booked >= TOTAL_SLOTS:
             label += " ❌"
 
-        keyboard.append([InlineKeyboardButton(text=label, callback_data=f"select_training:{training_id}")])
+        keyboard.append([InlineKeyboardButton(text=label, callback_data=f"select_training:{training.training_id}")])
 
-    await message.answer("Выберите тренировку для записи:", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@router.message(F.text.contains("Записаться"))
+async def show_available_trainings(message: Message):
+    keyboard = await build_trainings_keyboard(message.from_user.id)
+
+    if not keyboard:
+        await message.answer("❌ Пока нет открытых тренировок.")
+        return
+
+    await message.answer("Выберите тренировку для записи:", reply_markup=keyboard)
 
 
 @router.callback_query(F.data.startswith("select_training:"))
@@ -106,57 +73,37 @@ async def show_group_choice(callback: CallbackQuery, training_id_override: int =
     training_id = training_id_override or int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    training = await seat_maps.get(training_id)
 
-        # Проверка: уже записан?
-        cursor.execute("""
-            SELECT COUNT(*) FROM slots
-            WHERE training_id = ? AND user_id = ? AND status IN ('pending', 'confirmed', 'pending_cancel')
-        """, (training_id, user_id))
-        already = cursor.fetchone()[0]
+    if not training:
+        await callback.message.edit_text("❌ Тренировка не найдена.")
+        return
 
-        if already:
-            await callback.answer("Вы уже записаны на эту тренировку.", show_alert=True)
-            return
+    # Проверка: уже записан?
+    if training.user_status(user_id):
+        await callback.answer("Вы уже записаны на эту тренировку.", show_alert=True)
+        return
 
-        # Получаем кол-во занятых мест в каждой группе
-        cursor.execute("""
-            SELECT group_name, COUNT(*)
-            FROM slots
-            WHERE training_id = ? AND status IN ('pending', 'confirmed')
-            GROUP BY group_name
-        """, (training_id,))
-        counts = dict(cursor.fetchall())
-
-        # Формируем список кнопок по всем группам из конфига
-        buttons = []
-        total_free = 0
-        for group_name, cfg in GROUPS.items():
-            used = counts.get(group_name, 0)
-            free = MAX_SLOTS_PER_GROUP[group_name] - used
-            free = max(free, 0)
-            total_free += free
-            buttons.append(
-                InlineKeyboardButton(
-                    text=f"{cfg['label']} ({free})",
-                    callback_data=f"book:{training_id}:{group_name}"
-                )
+    # Формируем список кнопок по всем группам из конфига
+    buttons = []
+    total_free = 0
+    for group_name, cfg in GROUPS.items():
+        used = training.booked(group_name)
+        free = MAX_SLOTS_PER_GROUP[group_name] - used
+        free = max(free, 0)
+        total_free += free
+        buttons.append(
+            InlineKeyboardButton(
+                text=f"{cfg['label']} ({free})",
+                callback_data=f"book:{training_id}:{group_name}"
             )
+        )
 
-        if total_free <= 0:
-            await callback.answer("Мест не осталось ❌", show_alert=True)
-            return
-
-        # Получение даты тренировки
-        cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
-        row = cursor.fetchone()
-
-    if not row:
-        await callback.message.edit_text("❌ Тренировка не найдена.")
+    if total_free <= 0:
+        await callback.answer("Мест не осталось ❌", show_alert=True)
         return
 
-    date_str = datetime.fromisoformat(row[0]).strftime("%d.%m.%Y %H:%M")
+    date_str = datetime.fromisoformat(training.date).strftime("%d.%m.%Y %H:%M")
 
     # Раскладываем кнопки по 2 в ряд
     rows = []
@@ -179,44 +126,13 @@ async def show_group_choice(callback: CallbackQuery, training_id_override: int =
 #Кнопки Назад
 @router.callback_query(F.data == "back_to_trainings")
 async def back_to_trainings(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    now = datetime.now()
-
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    keyboard = await build_trainings_keyboard(callback.from_user.id)
 
-        cutoff_date = (now - timedelta(hours=1)).isoformat()
-
-        cursor.execute("""
-            SELECT t.id, t.date,
-                (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND status IN ('pending', 'confirmed')) AS booked_count,
-                (SELECT COUNT(*) FROM slots WHERE training_id = t.id AND user_id = ? AND status IN ('pending', 'confirmed')) AS user_booked
-            FROM trainings t
-            WHERE t.status = 'open' AND datetime(t.date) > ?
-            ORDER BY t.date ASC
-            LIMIT 6
-        """, (user_id, cutoff_date))
-
-        trainings = cursor.fetchall()
-
-    if not trainings:
+    if not keyboard:
         await callback.message.edit_text("❌ Пока нет открытых тренировок.")
         return
 
-    total_slots = 12
-    keyboard = []
-    for training_id, date_str, booked_count, user_booked in trainings:
-        date_obj = datetime.fromisoformat(date_str)
-        weekday_label = "Вторник " if date_obj.weekday() == 1 else "Суббота " if date_obj.weekday() == 5 else ""
-        free_slots = total_slots - (booked_count or 0)
-        label = f"{weekday_label}{date_obj.strftime('%d.%m %H:%M')} ({free_slots})"
-        if (user_booked or 0) > 0:
-            label += " ✅"
-        elif (booked_count or 0) >= total_slots:
-            label += " ❌"
-        keyboard.append([InlineKeyboardButton(text=label, callback_data=f"select_training:{training_id}")])
-
-    await callback.message.edit_text("Выберите тренировку для записи:", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+    await callback.message.edit_text("Выберите тренировку для записи:", reply_markup=keyboard)
 
 @router.callback_query(F.data.startswith("back_to_groups:"))
 async def back_to_groups(callback: CallbackQuery):
@@ -233,24 +149,14 @@ async def choose_channel(callback: CallbackQuery):
         await callback.message.edit_text("❌ Неизвестная группа.")
         return
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        # Получение даты тренировки
-        cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
-        row = cursor.fetchone()
-
-        if not row:
-            await callback.message.edit_text("❌ Тренировка не найдена.")
-            return
+    training = await seat_maps.get(training_id)
 
-        date_str = datetime.fromisoformat(row[0]).strftime("%d.%m.%Y %H:%M")
-        cursor.execute("""
-            SELECT channel FROM slots
-            WHERE training_id = ? AND group_name = ? AND status IN ('pending', 'confirmed')
-        """, (training_id, group))
-        taken = [r[0] for r in cursor.fetchall()]
+    if not training:
+        await callback.message.edit_text("❌ Тренировка не найдена.")
+        return
 
-    available = [ch for ch in all_channels if ch not in taken]
+    date_str = datetime.fromisoformat(training.date).strftime("%d.%m.%Y %H:%M")
+    available = seat_maps.free_channels(training, group)
 
     if not available:
         await callback.message.edit_text("❌ В этой группе нет свободных каналов.")
@@ -273,6 +179,59 @@ async def choose_channel(callback: CallbackQuery):
     )
 
 
+def reserve_channel(conn, training_id: int, user_id: int, group: str, channel: str, payment_type: str):
+    """
+    Атомарно занимает канал. Занятость канала гарантирует частичный уникальный индекс
+    uq_slots_active_channel, поэтому из двух одновременных нажатий INSERT пройдёт ровно у одного.
+    Если у пользователя есть абонемент — запись сразу confirmed и абонемент списывается
+    в той же транзакции.
+
+    Возвращает ("ok", (date, slot_id, payment_type)), ("taken", None) или ("not_found", None).
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+
+    # Получаем дату тренировки
+    cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
+    row = cursor.fetchone()
+    if not row:
+        return "not_found", None
+
+    # Регистрируем слот; тип оплаты зависит от остатка абонемента
+    cursor.execute("""
+        INSERT INTO slots (training_id, user_id, group_name, channel, status, created_at, payment_type)
+        SELECT ?, ?, ?, ?,
+            CASE WHEN COALESCE(u.subscription, 0) > 0 THEN 'confirmed' ELSE 'pending' END,
+            ?,
+            CASE WHEN COALESCE(u.subscription, 0) > 0 THEN 'subscription' ELSE ? END
+        FROM (SELECT 1)
+        LEFT JOIN users u ON u.user_id = ?
+        WHERE true
+        ON CONFLICT DO NOTHING
+    """, (
+        training_id,
+        user_id,
+        group,
+        channel,
+        datetime.now().isoformat(),
+        payment_type,
+        user_id
+    ))
+    if cursor.rowcount == 0:
+        return "taken", None
+
+    slot_id = cursor.lastrowid
+    cursor.execute("SELECT payment_type FROM slots WHERE id = ?", (slot_id,))
+    payment_type = cursor.fetchone()[0]
+
+    # Списываем абонемент до commit
+    if payment_type == "subscription":
+        cursor.execute("UPDATE users SET subscription = subscription - 1 WHERE user_id = ?", (user_id,))
+        record_capacity(conn, training_id, TOTAL_SLOTS, REQUIRED_CHAT_ID)
+
+    return "ok", (row[0], slot_id, payment_type)
+
+
 @router.callback_query(F.data.startswith("reserve:"))
 async def reserve_slot(callback: CallbackQuery):
     _, training_id, group, channel = callback.data.split(":")
@@ -281,78 +240,37 @@ async def reserve_slot(callback: CallbackQuery):
     username = callback.from_user.username
     full_name = callback.from_user.full_name
 
-    # Проверка: канал занят
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM slots
-            WHERE training_id = ? AND group_name = ? AND channel = ? AND status IN ('pending', 'confirmed')
-        """, (training_id, group, channel))
-        taken = cursor.fetchone()[0]
-
-        if taken:
-            await callback.answer("Этот канал уже занят другим участником.", show_alert=True)
-            return
-
-        # Получаем дату тренировки
-        cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
-        row = cursor.fetchone()
-        if not row:
-            await callback.message.edit_text("❌ Ошибка: тренировка не найдена.")
-            return
-
-        date_str = row[0]
-        date_fmt = datetime.fromisoformat(date_str).strftime("%d.%m.%Y %H:%M")
-
-        # Проверяем абонемент
-        cursor.execute("SELECT subscription FROM users WHERE user_id = ?", (user_id,))
-        sub_row = cursor.fetchone()
-        sub_count = sub_row[0] if sub_row else 0
-
-        if sub_count > 0:
-            payment_type = "subscription"
-            status = "confirmed"
-        else:
-            payment_type = "yookassa" if USE_YOOKASSA else "manual"
-            status = "pending"
+    # Быстрый отказ по кэшу; окончательно канал закрепляет уникальный индекс
+    training = await seat_maps.get(training_id)
+    if training and (group, channel) in training.holders:
+        await callback.answer("Этот канал уже занят другим участником.", show_alert=True)
+        return
 
-        # Регистрируем слот
-        cursor.execute("""
-            INSERT INTO slots (training_id, user_id, group_name, channel, status, created_at, payment_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            training_id,
-            user_id,
-            group,
-            channel,
-            status,
-            datetime.now().isoformat(),
-            payment_type
-        ))
-        slot_id = cursor.lastrowid
-
-        # Списываем абонемент до commit
-        if payment_type == "subscription":
-            cursor.execute("UPDATE users SET subscription = subscription - 1 WHERE user_id = ?", (user_id,))
+    result, reserved = await run_db(
+        reserve_channel, training_id, user_id, group, channel,
+        "yookassa" if USE_YOOKASSA else "manual"
+    )
 
-        conn.commit()
+    if result == "taken":
+        seat_maps.invalidate(training_id)
+        await callback.answer("Этот канал уже занят другим участником.", show_alert=True)
+        return
+    if result == "not_found":
+        await callback.message.edit_text("❌ Ошибка: тренировка не найдена.")
+        return
 
+    date_str, slot_id, payment_type = reserved
+    seat_maps.apply(training_id, group, channel, user_id, "confirmed" if payment_type == "subscription" else "pending")
+    date_fmt = datetime.fromisoformat(date_str).strftime("%d.%m.%Y %H:%M")
     group_label = get_group_label(group)
 
     if payment_type == "subscription":
         # Подсчёт оставшихся мест
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT COUNT(*) FROM slots
-                WHERE training_id = ? AND status = 'confirmed'
-            """, (training_id,))
-            booked = cursor.fetchone()[0]
-            free_slots = TOTAL_SLOTS - booked
-
-            cursor.execute("SELECT subscription FROM users WHERE user_id = ?", (user_id,))
-            sub_row = cursor.fetchone()
-            sub_left = sub_row[0] if sub_row else 0
+        training = await seat_maps.get(training_id)
+        free_slots = TOTAL_SLOTS - training.confirmed_count()
+
+        sub_row = await fetch_one("SELECT subscription FROM users WHERE user_id = ?", (user_id,))
+        sub_left = sub_row[0] if sub_row else 0
 
         await callback.message.edit_text(
             f"📅 <b>Тренировка {date_fmt}</b>\n"
@@ -361,37 +279,46 @@ async def reserve_slot(callback: CallbackQuery):
             f"🎟 Осталось абонементов: <b>{sub_left}</b>"
         )
 
-        await callback.bot.send_message(
+        await enqueue(
             REQUIRED_CHAT_ID,
             f"🛸 {'@' + username if username else full_name} записался на тренировку <b>{date_fmt}</b>\n"
             f"Осталось мест: {free_slots}/{TOTAL_SLOTS}",
             parse_mode="HTML"
         )
 
-        for admin in ADMINS:
-            await callback.bot.send_message(
-                admin,
-                f"✅ {'@' + username if username else full_name} записался через абонемент:\n"
-                f"📅 {date_fmt}\n"
-                f"🏁 <b>{group_label}</b>\n"
-                f"📡 Канал: <b>{channel}</b>\n"
-                f"🎟 Осталось абонементов: <b>{sub_left}</b>",
-                parse_mode="HTML"
-            )
+        await enqueue_many(
+            ADMINS,
+            f"✅ {'@' + username if username else full_name} записался через абонемент:\n"
+            f"📅 {date_fmt}\n"
+            f"🏁 <b>{group_label}</b>\n"
+            f"📡 Канал: <b>{channel}</b>\n"
+            f"🎟 Осталось абонементов: <b>{sub_left}</b>",
+            parse_mode="HTML"
+        )
 
     elif payment_type == "yookassa":
         # 1️⃣ создаём payment СРАЗУ
         payer = f"@{username}" if username else full_name
-        payment_url = create_payment(
-            user_id=user_id,
-            amount=1000,
-            target_type="slot",
-            target_id=slot_id,
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,  # временно, обновим ниже
-            payment_method="sbp",
-            description = f"WhoopClub разовая тренировка| slot:{slot_id} | {payer}"
-        )
+        try:
+            payment_url = await create_payment(
+                user_id=user_id,
+                amount=1000,
+                target_type="slot",
+                target_id=slot_id,
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id,  # временно, обновим ниже
+                payment_method="sbp",
+                description = f"WhoopClub разовая тренировка| slot:{slot_id} | {payer}"
+            )
+        except Exception as e:
+            # без ссылки на оплату бронь только держала бы канал до таймаута — снимаем сразу
+            logger.exception(f"[reserve_slot] slot {slot_id}: платёж не создан, бронь снята: {e}")
+            if await run_db(expire_slot, slot_id):
+                seat_maps.apply(training_id, group, channel, user_id, None)
+            await callback.message.edit_text(
+                "❌ Не удалось создать платёж, бронь снята. Попробуйте записаться ещё раз чуть позже."
+            )
+            return
 
         # 2️⃣ клавиатура С РЕАЛЬНЫМ URL
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -420,13 +347,10 @@ async def reserve_slot(callback: CallbackQuery):
         )
 
         # 4️⃣ обновляем message_id в payments (ВАЖНО)
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE payments SET message_id = ? WHERE target_type='slot' AND target_id = ? AND status='pending'",
-                (msg.message_id, slot_id)
-            )
-            conn.commit()
+        await execute(
+            "UPDATE payments SET message_id = ? WHERE target_type='slot' AND target_id = ? AND status='pending'",
+            (msg.message_id, slot_id)
+        )
 
 
     else:
@@ -450,22 +374,24 @@ async def user_cancel_pending(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        # Проверка: слот существует, принадлежит пользователю и в статусе pending
-        cursor.execute("""
-            SELECT training_id FROM slots
+    # Удаляем слот, только если он существует, принадлежит пользователю и в статусе pending
+    def cancel(conn):
+        row = conn.execute("""
+            SELECT training_id, group_name, channel FROM slots
             WHERE id = ? AND user_id = ? AND status = 'pending'
-        """, (slot_id, user_id))
-        row = cursor.fetchone()
+        """, (slot_id, user_id)).fetchone()
+        if row:
+            conn.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+        return row
 
-        if not row:
-            await callback.answer("Нельзя отменить: слот уже подтверждён или не найден.", show_alert=True)
-            return
+    row = await run_db(cancel)
 
-        # Удаляем слот
-        cursor.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
-        conn.commit()
+    if not row:
+        await callback.answer("Нельзя отменить: слот уже подтверждён или не найден.", show_alert=True)
+        return
+
+    training_id, group, channel = row
+    seat_maps.apply(training_id, group, channel, user_id, None)
 
     await callback.message.edit_text("❌ Ваша бронь отменена. Вы можете выбрать другую тренировку или группу.")
 
@@ -482,15 +408,12 @@ async def confirm_manual_payment(callback: CallbackQuery):
     logger.info(f"  user_id: {user_id}")
     logger.info(f"  username: {username}")
     logger.info(f"  full_name: {full_name}")
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT s.training_id, s.group_name, s.channel, t.date
-            FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            WHERE s.id = ?
-        """, (slot_id,))
-        row = cursor.fetchone()
+    row = await fetch_one("""
+        SELECT s.training_id, s.group_name, s.channel, t.date
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.id = ?
+    """, (slot_id,))
 
     if not row:
         await callback.answer("Запись не найдена.", show_alert=True)
@@ -528,10 +451,7 @@ async def notify_admins_about_booking(bot, training_id, user_id, group, channel,
     if username and "20" in username and ":" in username:
         logger.warning(f"⚠️ ПОДОЗРИТЕЛЬНЫЙ USERNAME: {username} — похоже, это дата!")
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nickname, system, subscription FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
+    user = await fetch_one("SELECT nickname, system, subscription FROM users WHERE user_id = ?", (user_id,))
 
     nickname = user[0] if user else "-"
     system = user[1] if user else "-"
@@ -563,62 +483,88 @@ async def notify_admins_about_booking(bot, training_id, user_id, group, channel,
         f"⏳ Ожидает подтверждения оплаты"
     )
 
-    for admin in ADMINS:
-        msg = await bot.send_message(admin, text, reply_markup=kb, parse_mode="HTML")
-        # сохраняем id отправленного сообщения
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO admin_notifications (slot_id, admin_id, message_id)
-                VALUES (?, ?, ?)
-            """, (slot_id, admin, msg.message_id))
-            conn.commit()
+    # id отправленных сообщений диспетчер сохранит в admin_notifications
+    await enqueue_many(ADMINS, text, reply_markup=kb, parse_mode="HTML", slot_id=slot_id)
+
 
 
+def pop_admin_notifications(conn, slot_id: int) -> list[tuple[int, int]]:
+    """
+    Забирает (admin_id, message_id) уведомлений по слоту и удаляет их из таблицы.
+    Карточки, которые ещё ждут отправки в outbox, снимаются с очереди.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT admin_id, message_id FROM admin_notifications WHERE slot_id = ?", (slot_id,))
+    messages = cursor.fetchall()
+    cursor.execute("DELETE FROM admin_notifications WHERE slot_id = ?", (slot_id,))
+    cancel_slot_messages(conn, slot_id)
+    return messages
+
 
 @router.callback_query(F.data.startswith("confirm:"))
 async def confirm_booking(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # Получаем все необходимые данные
-        cursor.execute("""
-            SELECT s.user_id, s.group_name, s.channel, s.payment_type, t.date, u.nickname, u.system
-            FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            JOIN users u ON s.user_id = u.user_id
-            WHERE s.id = ?
-        """, (slot_id,))
-        row = cursor.fetchone()
+    # Получаем все необходимые данные
+    row = await fetch_one("""
+        SELECT s.user_id, s.group_name, s.channel, s.payment_type, t.date, u.nickname, u.system, t.id
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        JOIN users u ON s.user_id = u.user_id
+        WHERE s.id = ?
+    """, (slot_id,))
 
     if not row:
         await callback.answer("Запись не найдена.", show_alert=True)
         return
 
-    user_id, group, channel, payment_type, training_date, nickname, system = row
+    user_id, group, channel, payment_type, training_date, nickname, system, training_id = row
 
     # ✅ Подтверждение и списание абонемента
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE slots SET status = 'confirmed' WHERE id = ?", (slot_id,))
+    def confirm(conn):
+        """
+        Подтверждает только ожидающую бронь: снятую по таймауту (или уже подтверждённую, отменённую)
+        карточка админа не трогает. Возвращает None, если подтвердили сейчас,
+        иначе (статус слота, занят ли его канал другой записью).
+        """
+        cursor = conn.execute("UPDATE slots SET status = 'confirmed' WHERE id = ? AND status = 'pending'", (slot_id,))
+        if cursor.rowcount == 0:
+            return conn.execute("""
+                SELECT s.status, EXISTS (
+                    SELECT 1 FROM slots o
+                    WHERE o.training_id = s.training_id AND o.group_name = s.group_name AND o.channel = s.channel
+                      AND o.id != s.id AND o.status IN ('pending', 'confirmed', 'pending_cancel')
+                )
+                FROM slots s
+                WHERE s.id = ?
+            """, (slot_id,)).fetchone()
         if payment_type == "subscription":
-            cursor.execute("UPDATE users SET subscription = subscription - 1 WHERE user_id = ?", (user_id,))
-        conn.commit()
+            conn.execute("UPDATE users SET subscription = subscription - 1 WHERE user_id = ?", (user_id,))
+        record_capacity(conn, training_id, TOTAL_SLOTS, REQUIRED_CHAT_ID)
+        return None
+
+    rejected = await run_db(confirm)
+    if rejected is not None:
+        status, channel_taken = rejected
+        if status == "expired" and channel_taken:
+            text = "❗ Бронь снята по таймауту, а канал уже занят другим участником."
+        elif status == "expired":
+            text = "❗ Бронь снята по таймауту. Канал свободен — участнику нужно записаться заново."
+        elif status == "confirmed":
+            text = "Запись уже подтверждена."
+        else:
+            text = f"❗ Запись уже не ожидает подтверждения (статус: {status})."
+        await callback.answer(text, show_alert=True)
+        return
+    seat_maps.apply(training_id, group, channel, user_id, "confirmed")
 
     date_fmt = datetime.fromisoformat(training_date).strftime("%d.%m.%Y %H:%M")
     await callback.message.edit_text("✅ Оплата подтверждена")
-    await callback.bot.send_message(user_id, f"✅ Ваша запись подтверждена! Ждём вас на тренировке {date_fmt}🛸")
+    await enqueue(user_id, f"✅ Ваша запись подтверждена! Ждём вас на тренировке {date_fmt}🛸")
 
     # ✅ Получаем username и имя участника (не админа)
-    try:
-        chat_member = await callback.bot.get_chat_member(chat_id=user_id, user_id=user_id)
-        full_name = chat_member.user.full_name
-        username = chat_member.user.username
-    except:
-        full_name = "Пользователь"
-        username = None
+    username, full_name = await resolve_tg_user(callback.bot, user_id)
+    full_name = full_name or "Пользователь"
 
     user_link = f"@{username}" if username else f"<a href='tg://user?id={user_id}'>{full_name}</a>"
 
@@ -639,12 +585,7 @@ async def confirm_booking(callback: CallbackQuery):
         f"{payment_text}"
     )
     # Удаляем сообщения с кнопками у всех админов
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT admin_id, message_id FROM admin_notifications WHERE slot_id = ?", (slot_id,))
-        messages = cursor.fetchall()
-        cursor.execute("DELETE FROM admin_notifications WHERE slot_id = ?", (slot_id,))
-        conn.commit()
+    messages = await run_db(pop_admin_notifications, slot_id)
 
     for admin_id, message_id in messages:
         try:
@@ -653,14 +594,8 @@ async def confirm_booking(callback: CallbackQuery):
             pass  # сообщение могло быть уже удалено или скрыто
 
     # Подсчёт оставшихся мест
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM slots
-            WHERE training_id = (SELECT training_id FROM slots WHERE id = ?) AND status IN ('confirmed')
-        """, (slot_id,))
-        booked = cursor.fetchone()[0]
-    free_slots = TOTAL_SLOTS - booked
+    training = await seat_maps.get(training_id)
+    free_slots = TOTAL_SLOTS - training.confirmed_count()
 
     # Уведомление в клубный чат
     if username:
@@ -668,26 +603,26 @@ async def confirm_booking(callback: CallbackQuery):
     else:
         display_name = full_name
 
-    await callback.bot.send_message(
+    await enqueue(
         REQUIRED_CHAT_ID,
         f"🛸 {display_name} записался на тренировку <b>{date_fmt}</b>\n"
         f"Осталось мест: {free_slots}/{TOTAL_SLOTS}"
     )
-        
-    for admin in ADMINS:
-        await callback.bot.send_message(admin, admin_message, parse_mode="HTML")
+
+    await enqueue_many(ADMINS, admin_message, parse_mode="HTML")
 
 
 @router.callback_query(F.data.startswith("reject:"))
 async def reject_booking(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
-    with get_connection() as conn:
+
+    def reject(conn):
         cursor = conn.cursor()
 
         # Получаем данные о слоте и пользователе
         cursor.execute("""
             SELECT s.user_id, s.status, s.group_name, s.channel, s.payment_type, t.date,
-                   u.nickname, u.system
+                   u.nickname, u.system, t.id
             FROM slots s
             JOIN trainings t ON s.training_id = t.id
             JOIN users u ON s.user_id = u.user_id
@@ -695,82 +630,80 @@ async def reject_booking(callback: CallbackQuery):
         """, (slot_id,))
         row = cursor.fetchone()
 
-        if not row:
-            await callback.answer("❌ Запись не найдена.", show_alert=True)
-            return
+        # Удаляем только ожидающую запись: подтверждённую мог принять другой админ,
+        # а снятая по таймауту (expired) остаётся в истории
+        cursor.execute("DELETE FROM slots WHERE id = ? AND status = 'pending'", (slot_id,))
+        return row, cursor.rowcount
+
+    row, deleted = await run_db(reject)
 
-        user_id, status, group, channel, payment_type, training_date, nickname, system = row
+    if not row:
+        await callback.answer("❌ Запись не найдена.", show_alert=True)
+        return
 
+    user_id, status, group, channel, payment_type, training_date, nickname, system, training_id = row
+
+    if deleted != 1:
         if status == "confirmed":
-            await callback.answer("❗ Эта запись уже подтверждена другим админом.", show_alert=True)
-            return
+            text = "❗ Эта запись уже подтверждена другим админом."
+        elif status == "expired":
+            text = "❗ Бронь уже снята по таймауту — канал свободен, отклонять нечего."
+        else:
+            text = f"❗ Запись уже не ожидает подтверждения (статус: {status})."
+        await callback.answer(text, show_alert=True)
+        return
 
-        # Удаляем запись
-        cursor.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
-        conn.commit()
+    seat_maps.apply(training_id, group, channel, user_id, None)
 
-        # Уведомление пользователя
-        await callback.message.edit_text("❌ Запись отклонена")
-        await callback.bot.send_message(user_id, "❌ Ваша запись была отклонена. Попробуйте снова или свяжитесь с админом.")
+    # Уведомление пользователя
+    await callback.message.edit_text("❌ Запись отклонена")
+    await enqueue(user_id, "❌ Ваша запись была отклонена. Попробуйте снова или свяжитесь с админом.")
 
-        # Получаем имя и username пользователя
-        try:
-            chat_member = await callback.bot.get_chat_member(chat_id=user_id, user_id=user_id)
-            full_name = chat_member.user.full_name
-            username = chat_member.user.username
-        except:
-            full_name = "Пользователь"
-            username = None
+    # Получаем имя и username пользователя
+    username, full_name = await resolve_tg_user(callback.bot, user_id)
+    full_name = full_name or "Пользователь"
 
-        user_link = f"@{username}" if username else f"<a href='tg://user?id={user_id}'>{full_name}</a>"
-        admin_name = callback.from_user.full_name
+    user_link = f"@{username}" if username else f"<a href='tg://user?id={user_id}'>{full_name}</a>"
+    admin_name = callback.from_user.full_name
 
-        # Формируем лог для админов
-        group_label = get_group_label(group)
-        date_fmt = datetime.fromisoformat(training_date).strftime("%d.%m.%Y %H:%М")
-        payment_text = "🎟 Абонемент" if payment_type == "subscription" else "💳 Оплата по реквизитам"
-
-        admin_message = (
-            f"❌ Запись отклонена админом <b>{admin_name}</b>:\n"
-            f"👤 {user_link} (ID: <code>{user_id}</code>)\n"
-            f"📅 Дата: <b>{date_fmt}</b>\n"
-            f"🏁 Группа: <b>{group_label}</b>\n"
-            f"📡 Канал: <b>{channel}</b>\n"
-            f"🎮 OSD: <b>{nickname}</b>\n"
-            f"🎥 Видео: <b>{system}</b>\n"
-            f"{payment_text}"
-        )
-        # Удаляем сообщения с кнопками у всех админов
-        with get_connection() as conn2:
-            cursor2 = conn2.cursor()
-            cursor2.execute("SELECT admin_id, message_id FROM admin_notifications WHERE slot_id = ?", (slot_id,))
-            messages = cursor2.fetchall()
-            cursor2.execute("DELETE FROM admin_notifications WHERE slot_id = ?", (slot_id,))
-            conn2.commit()
-
-        for admin_id, message_id in messages:
-            try:
-                await callback.bot.delete_message(chat_id=admin_id, message_id=message_id)
-            except:
-                pass  # сообщение могло быть уже удалено или скрыто
-        # Рассылка всем админам
-        for admin in ADMINS:
-            await callback.bot.send_message(admin, admin_message, parse_mode="HTML")
+    # Формируем лог для админов
+    group_label = get_group_label(group)
+    date_fmt = datetime.fromisoformat(training_date).strftime("%d.%m.%Y %H:%M")
+    payment_text = "🎟 Абонемент" if payment_type == "subscription" else "💳 Оплата по реквизитам"
+
+    admin_message = (
+        f"❌ Запись отклонена админом <b>{admin_name}</b>:\n"
+        f"👤 {user_link} (ID: <code>{user_id}</code>)\n"
+        f"📅 Дата: <b>{date_fmt}</b>\n"
+        f"🏁 Группа: <b>{group_label}</b>\n"
+        f"📡 Канал: <b>{channel}</b>\n"
+        f"🎮 OSD: <b>{nickname}</b>\n"
+        f"🎥 Видео: <b>{system}</b>\n"
+        f"{payment_text}"
+    )
+    # Удаляем сообщения с кнопками у всех админов
+    messages = await run_db(pop_admin_notifications, slot_id)
+
+    for admin_id, message_id in messages:
+        try:
+            await callback.bot.delete_message(chat_id=admin_id, message_id=message_id)
+        except:
+            pass  # сообщение могло быть уже удалено или скрыто
+    # Рассылка всем админам
+    await enqueue_many(ADMINS, admin_message, parse_mode="HTML")
 
 @router.message(F.text.contains("Мои записи"))
 async def show_my_bookings(message: Message):
     user_id = message.from_user.id
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT t.date, s.group_name, s.channel, s.status
-            FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            WHERE s.user_id = ? AND t.status != 'cancelled'
-            ORDER BY t.date ASC
-        """, (user_id,))
-        rows = cursor.fetchall()
+    rows = await fetch_all("""
+        SELECT t.date, s.group_name, s.channel, s.status
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.user_id = ? AND t.status != 'cancelled'
+          AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+        ORDER BY t.date ASC
+    """, (user_id,))
 
     if not rows:
         await message.answer("📭 У вас пока нет записей на тренировки.")
@@ -801,16 +734,13 @@ async def show_user_bookings_to_cancel(callback: CallbackQuery):
     user_id = callback.from_user.id
     now = datetime.now()
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT s.id, t.date
-            FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            WHERE s.user_id = ? AND s.status = 'confirmed' AND t.date > ? AND t.status != 'cancelled'
-            ORDER BY t.date ASC
-        """, (user_id, now.isoformat()))
-        bookings = cursor.fetchall()
+    bookings = await fetch_all("""
+        SELECT s.id, t.date
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.user_id = ? AND s.status = 'confirmed' AND t.date_ts > ? AND t.status != 'cancelled'
+        ORDER BY t.date_ts ASC
+    """, (user_id, date_ts(now)))
 
     if not bookings:
         await callback.message.edit_text("❌ У вас нет активных записей для отмены.")
@@ -832,14 +762,11 @@ async def show_user_bookings_to_cancel(callback: CallbackQuery):
 async def ask_to_cancel(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT t.date FROM slots s
-            JOIN trainings t ON s.training_id = t.id
-            WHERE s.id = ?
-        """, (slot_id,))
-        row = cursor.fetchone()
+    row = await fetch_one("""
+        SELECT t.date FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.id = ?
+    """, (slot_id,))
 
     if not row:
         await callback.answer("Запись не найдена", show_alert=True)
@@ -869,7 +796,7 @@ async def confirm_cancel_request(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
-    with get_connection() as conn:
+    def cancel(conn):
         cursor = conn.cursor()
         cursor.execute("""
             SELECT s.payment_type, t.date, s.group_name, s.channel,
@@ -882,24 +809,32 @@ async def confirm_cancel_request(callback: CallbackQuery):
         row = cursor.fetchone()
 
         if not row:
-            await callback.answer("Запись не найдена", show_alert=True)
-            return
+            return None, None
 
-        payment_type, training_date, group, channel, nickname, system, training_id = row
-
-        now = datetime.now()
-        training_dt = datetime.fromisoformat(training_date)
-        hours_before = (training_dt - now).total_seconds() / 3600
+        training_dt = datetime.fromisoformat(row[1])
+        hours_before = (training_dt - datetime.now()).total_seconds() / 3600
 
         cursor.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+        record_capacity(conn, row[6], TOTAL_SLOTS, REQUIRED_CHAT_ID)
 
-        if hours_before > 24:
+        refunded = hours_before > 24
+        if refunded:
             cursor.execute("UPDATE users SET subscription = subscription + 1 WHERE user_id = ?", (user_id,))
-            refund_text = "🎟 Абонемент возвращён."
-        else:
-            refund_text = "💸 Меньше 24 часов — абонемент не возвращается, средства ушли в донат клуба."
+        return row, refunded
+
+    row, refunded = await run_db(cancel)
+
+    if not row:
+        await callback.answer("Запись не найдена", show_alert=True)
+        return
 
-        conn.commit()
+    payment_type, training_date, group, channel, nickname, system, training_id = row
+    seat_maps.apply(training_id, group, channel, user_id, None)
+
+    if refunded:
+        refund_text = "🎟 Абонемент возвращён."
+    else:
+        refund_text = "💸 Меньше 24 часов — абонемент не возвращается, средства ушли в донат клуба."
 
     date_fmt = datetime.fromisoformat(training_date).strftime("%d.%m.%Y %H:%M")
     group_label = get_group_label(group)
@@ -920,34 +855,26 @@ async def confirm_cancel_request(callback: CallbackQuery):
         f"{refund_text}"
     )
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM slots
-            WHERE training_id = ? AND status = 'confirmed'
-        """, (training_id,))
-        booked = cursor.fetchone()[0]
-
-    free_slots = TOTAL_SLOTS - booked
+    training = await seat_maps.get(training_id)
+    free_slots = TOTAL_SLOTS - training.confirmed_count()
 
     await callback.message.edit_text(f"✅ Запись отменена.\n{refund_text}")
 
-    await callback.bot.send_message(
+    await enqueue(
         REQUIRED_CHAT_ID,
         f"🚪 Освободилось место на тренировке <b>{date_fmt}</b>!\n"
         f"Осталось мест: {free_slots}/{TOTAL_SLOTS}",
         parse_mode="HTML"
     )
 
-    for admin in ADMINS:
-        await callback.bot.send_message(admin, admin_log, parse_mode="HTML")
+    await enqueue_many(ADMINS, admin_log, parse_mode="HTML")
 
 @router.callback_query(F.data.startswith("admin_cancel:"))
 async def admin_confirm_cancel(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
     admin_name = callback.from_user.full_name
 
-    with get_connection() as conn:
+    def cancel(conn):
         cursor = conn.cursor()
         cursor.execute("""
             SELECT s.user_id, s.payment_type, t.date, s.group_name, s.channel,
@@ -960,34 +887,37 @@ async def admin_confirm_cancel(callback: CallbackQuery):
         row = cursor.fetchone()
 
         if not row:
-            await callback.answer("Запись не найдена или уже обработана.", show_alert=True)
-            return
-
-        user_id, payment_type, training_date, group, channel, nickname, system, training_id = row
+            return None, None, []
 
         # Считаем, сколько часов до тренировки
-        now = datetime.now()
-        training_dt = datetime.fromisoformat(training_date)
-        hours_before = (training_dt - now).total_seconds() / 3600
+        training_dt = datetime.fromisoformat(row[2])
+        hours_before = (training_dt - datetime.now()).total_seconds() / 3600
 
         # Удаляем слот
         cursor.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+        record_capacity(conn, row[7], TOTAL_SLOTS, REQUIRED_CHAT_ID)
 
         # Возвращаем абонемент только если больше 24 часов
-        refund_text = ""
-        if hours_before > 24:
-            cursor.execute("UPDATE users SET subscription = subscription + 1 WHERE user_id = ?", (user_id,))
-            refund_text = "🎟 Абонемент возвращён."
-        else:
-            refund_text = "💸 Меньше 24 часов — абонемент не возвращается, средства ушли в донат клуба."
-
-        conn.commit()
+        refunded = hours_before > 24
+        if refunded:
+            cursor.execute("UPDATE users SET subscription = subscription + 1 WHERE user_id = ?", (row[0],))
 
         # Удаляем сообщения с кнопками отмены у всех админов
-        cursor.execute("SELECT admin_id, message_id FROM admin_notifications WHERE slot_id = ?", (slot_id,))
-        messages = cursor.fetchall()
-        cursor.execute("DELETE FROM admin_notifications WHERE slot_id = ?", (slot_id,))
-        conn.commit()
+        return row, refunded, pop_admin_notifications(conn, slot_id)
+
+    row, refunded, messages = await run_db(cancel)
+
+    if not row:
+        await callback.answer("Запись не найдена или уже обработана.", show_alert=True)
+        return
+
+    user_id, payment_type, training_date, group, channel, nickname, system, training_id = row
+    seat_maps.apply(training_id, group, channel, user_id, None)
+
+    if refunded:
+        refund_text = "🎟 Абонемент возвращён."
+    else:
+        refund_text = "💸 Меньше 24 часов — абонемент не возвращается, средства ушли в донат клуба."
 
     for admin_id, message_id in messages:
         try:
@@ -1000,19 +930,14 @@ async def admin_confirm_cancel(callback: CallbackQuery):
             await callback.message.edit_text("✅ Запись отменена. Пользователь уведомлён.")
         except:
             pass
-    await callback.bot.send_message(user_id, f"❌ Ваша запись отменена.\n{refund_text}")
+    await enqueue(user_id, f"❌ Ваша запись отменена.\n{refund_text}")
     # Формируем лог админу
     date_fmt = datetime.fromisoformat(training_date).strftime("%d.%m.%Y %H:%M")
     group_label = get_group_label(group)
     payment_text = "🎟 Абонемент" if payment_type == "subscription" else "💳 Оплата по реквизитам"
     
-    try:
-        chat_member = await callback.bot.get_chat_member(chat_id=user_id, user_id=user_id)
-        full_name = chat_member.user.full_name
-        username = chat_member.user.username
-    except:
-        full_name = "Пользователь"
-        username = None
+    username, full_name = await resolve_tg_user(callback.bot, user_id)
+    full_name = full_name or "Пользователь"
 
     user_link = f"@{username}" if username else f"<a href='tg://user?id={user_id}'>{full_name}</a>"
 
@@ -1028,37 +953,41 @@ async def admin_confirm_cancel(callback: CallbackQuery):
         f"{refund_text}"
     )
     # Подсчёт оставшихся мест
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM slots
-            WHERE training_id = ? AND status = 'confirmed'
-        """, (training_id,))
-        booked = cursor.fetchone()[0]
-    free_slots = TOTAL_SLOTS - booked
+    training = await seat_maps.get(training_id)
+    free_slots = TOTAL_SLOTS - training.confirmed_count()
 
     # Уведомление в клубный чат
-    await callback.bot.send_message(
+    await enqueue(
         REQUIRED_CHAT_ID,
         f"🚪 Освободилось место на тренировке <b>{date_fmt}</b>!\n"
         f"Осталось мест: {free_slots}/{TOTAL_SLOTS}",
         parse_mode="HTML"
     )
 
-    for admin in ADMINS:
-        await callback.bot.send_message(admin, admin_log, parse_mode="HTML")
+    await enqueue_many(ADMINS, admin_log, parse_mode="HTML")
 
 
 @router.callback_query(F.data.startswith("admin_reject_cancel:"))
 async def admin_reject_cancel(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[1])
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE slots SET status = 'confirmed' WHERE id = ? AND status = 'pending_cancel'", (slot_id,))
+    def restore(conn):
+        cursor = conn.execute(
+            "UPDATE slots SET status = 'confirmed' WHERE id = ? AND status = 'pending_cancel'", (slot_id,)
+        )
         if cursor.rowcount == 0:
-            await callback.answer("Запись не найдена или уже обработана.", show_alert=True)
-            return
-        conn.commit()
+            return None
+        training_id = conn.execute("SELECT training_id FROM slots WHERE id = ?", (slot_id,)).fetchone()[0]
+        return training_id, record_capacity(conn, training_id, TOTAL_SLOTS, REQUIRED_CHAT_ID)
+
+    row = await run_db(restore)
+    if not row:
+        await callback.answer("Запись не найдена или уже обработана.", show_alert=True)
+        return
+
+    training_id, announced = row
+    seat_maps.invalidate(training_id)
+    if announced:
+        wake()
 
     await callback.message.edit_text("❌ Отмена записи отклонена.")
@@ -1,25 +1,24 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from database.db import get_connection
+from database.db import fetch_all
+from database.dates import date_ts
 from datetime import datetime
+import time
 
-# импортируем конфиг групп из booking
-from handlers.booking import GROUPS, get_group_label
+from groups import GROUPS, get_group_label
+from handlers.booking import seat_maps
 
 router = Router()
 
 
 @router.message(F.text.contains("Участники"))
 async def show_participants_list(message: Message):
-    today = datetime.now().date()
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, date FROM trainings
-            WHERE status = 'open' AND datetime(date) >= ?
-            ORDER BY date ASC
-        """, (today.isoformat(),))
-        rows = cursor.fetchall()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = await fetch_all("""
+        SELECT id, date FROM trainings
+        WHERE status = 'open' AND date_ts >= ?
+        ORDER BY date_ts ASC
+    """, (date_ts(today),))
 
     if not rows:
         await message.answer("❌ Нет активных тренировок.")
@@ -36,61 +35,87 @@ async def show_participants_list(message: Message):
     await message.answer("👥 Выбери тренировку для просмотра участников:", reply_markup=keyboard)
 
 
+# Готовый текст листа участников: {training_id: (карта мест, время рендера, текст)}.
+# Сбрасывается при любом изменении занятости (слушатель seat_maps) и при правке профиля;
+# TTL — страховка от смены username, которую видит только кэш tg_users.
+PARTICIPANTS_TTL = 300
+_rendered: dict[int, tuple[object, float, str]] = {}
+
+
+def invalidate_participants(training_id: int = None):
+    if training_id is None:
+        _rendered.clear()
+    else:
+        _rendered.pop(training_id, None)
+
+
+seat_maps.add_listener(invalidate_participants)
+
+
+async def render_participants(training) -> str:
+    # Занятость берём из карты мест, из БД — ники, видеосистемы и кэш профилей Telegram
+    confirmed = {
+        key: user_id for key, (user_id, status) in training.holders.items() if status == "confirmed"
+    }
+    profiles = {}
+    if confirmed:
+        user_ids = list(set(confirmed.values()))
+        placeholders = ",".join("?" for _ in user_ids)
+        rows = await fetch_all(f"""
+            SELECT u.user_id, u.nickname, u.system, t.username, t.full_name
+            FROM users u
+            LEFT JOIN tg_users t ON t.user_id = u.user_id
+            WHERE u.user_id IN ({placeholders})
+        """, tuple(user_ids))
+        profiles = {row[0]: row[1:] for row in rows}
+
+    pretty_date = datetime.fromisoformat(training.date).strftime("%d.%m.%Y %H:%M")
+    message_lines = [f"📅 Тренировка {pretty_date}\n"]
+
+    # Проходимся по всем группам из конфига
+    for group_key, group_cfg in GROUPS.items():
+        group_label = get_group_label(group_key)  # например "⚡ Быстрая"
+        message_lines.append(f"{group_label} <b>группа</b>")
+
+        CHANNEL_ORDER = group_cfg["channels"]  # например ["R1", "R2", "F2", "F4", "R8"]
+
+        for idx, channel in enumerate(CHANNEL_ORDER, 1):
+            user_id = confirmed.get((group_key, channel))
+
+            if user_id:
+                nickname, system, username, full_name = profiles.get(user_id, (None, None, None, None))
+                user_link = (
+                    f"@{username}"
+                    if username
+                    else f"<a href=\"tg://user?id={user_id}\">{full_name or 'профиль'}</a>"
+                )
+                message_lines.append(
+                    f"{idx}. {channel} — {user_link} "
+                    f"(OSD: <code>{nickname or '-'}</code>, VTX: {system or '-'})"
+                )
+            else:
+                message_lines.append(f"{idx}. {channel} — свободно")
+
+        message_lines.append("")  # пустая строка между группами
+
+    return "\n".join(message_lines)
+
+
 @router.callback_query(F.data.startswith("participants:"))
 async def show_participants(callback: CallbackQuery):
     training_id = int(callback.data.split(":")[1])
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT date FROM trainings WHERE id = ?", (training_id,))
-        row = cursor.fetchone()
-        if not row:
-            await callback.answer("❌ Тренировка не найдена", show_alert=True)
-            return
-
-        date_str = row[0]
-        dt = datetime.fromisoformat(date_str)
-        pretty_date = dt.strftime("%d.%m.%Y %H:%M")
-
-        message_lines = [f"📅 Тренировка {pretty_date}\n"]
-
-        # Проходимся по всем группам из конфига
-        for group_key, group_cfg in GROUPS.items():
-            group_label = get_group_label(group_key)  # например "⚡ Быстрая"
-            message_lines.append(f"{group_label} <b>группа</b>")
-
-            CHANNEL_ORDER = group_cfg["channels"]  # например ["R1", "R2", "F2", "F4", "R8"]
-
-            for idx, channel in enumerate(CHANNEL_ORDER, 1):
-                cursor.execute("""
-                    SELECT s.user_id, u.nickname, u.system
-                    FROM slots s
-                    LEFT JOIN users u ON s.user_id = u.user_id
-                    WHERE s.training_id = ? AND s.group_name = ? AND s.status = 'confirmed' AND s.channel = ?
-                """, (training_id, group_key, channel))
-                result = cursor.fetchone()
-
-                if result:
-                    user_id, nickname, system = result
-                    try:
-                        chat_member = await callback.bot.get_chat_member(user_id=user_id, chat_id=user_id)
-                        username = chat_member.user.username
-                        first_name = chat_member.user.first_name
-                    except:
-                        username = None
-                        first_name = "профиль"
-
-                    user_link = (
-                        f"@{username}"
-                        if username
-                        else f"<a href=\"tg://user?id={user_id}\">{first_name}</a>"
-                    )
-                    message_lines.append(
-                        f"{idx}. {channel} — {user_link} "
-                        f"(OSD: <code>{nickname or '-'}</code>, VTX: {system or '-'})"
-                    )
-                else:
-                    message_lines.append(f"{idx}. {channel} — свободно")
-
-            message_lines.append("")  # пустая строка между группами
-
-    await callback.message.edit_text("\n".join(message_lines))
+
+    training = await seat_maps.get(training_id)
+    if not training:
+        await callback.answer("❌ Тренировка не найдена", show_alert=True)
+        return
+
+    # карта могла перечитаться из БД (TTL) — тогда и текст строим заново
+    cached = _rendered.get(training_id)
+    if cached and cached[0] is training and time.monotonic() - cached[1] < PARTICIPANTS_TTL:
+        text = cached[2]
+    else:
+        text = await render_participants(training)
+        _rendered[training_id] = (training, time.monotonic(), text)
+
+    await callback.message.edit_text(text)
@@ -6,8 +6,9 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton,
     ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 )
-from database.db import get_connection
+from database.db import fetch_one, execute
 from keyboards.menu import get_user_main_keyboard
+from handlers.participants import invalidate_participants
 
 router = Router()
 
@@ -18,10 +19,7 @@ class EditProfile(StatesGroup):
 @router.message(F.text == "👤 Мой профиль")
 async def show_profile(message: Message):
     user_id = message.from_user.id
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nickname, system, subscription FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
+    user = await fetch_one("SELECT nickname, system, subscription FROM users WHERE user_id = ?", (user_id,))
 
     if user:
         nickname, system, subscription = user
@@ -68,14 +66,13 @@ async def process_system(message: Message, state: FSMContext):
     system = message.text
     user_id = message.from_user.id
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO users (user_id, nickname, system)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET nickname=excluded.nickname, system=excluded.system
-        """, (user_id, nickname, system))
-        conn.commit()
+    await execute("""
+        INSERT INTO users (user_id, nickname, system)
+        VALUES (?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET nickname=excluded.nickname, system=excluded.system
+    """, (user_id, nickname, system))
+
+    invalidate_participants()
 
     await message.answer("✅ Профиль обновлён.", reply_markup=get_user_main_keyboard(user_id))
     await state.clear()
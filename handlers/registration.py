@@ -2,7 +2,7 @@ from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
-from database.db import get_connection
+from database.db import fetch_one, execute
 from keyboards.menu import get_user_main_keyboard
 from config import REQUIRED_CHAT_ID
 
@@ -35,10 +35,7 @@ async def start_registration(message: Message, state: FSMContext):
         return
 
     # Проверка регистрации
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nickname, system FROM users WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
+    row = await fetch_one("SELECT nickname, system FROM users WHERE user_id = ?", (user_id,))
 
     if row:
         nickname, system = row
@@ -77,13 +74,10 @@ async def finish_registration(message: Message, state: FSMContext):
     system = data["system"]
 
     # Сохраняем в БД
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO users (user_id, nickname, system) VALUES (?, ?, ?)",
-            (user_id, nickname, system)
-        )
-        conn.commit()
+    await execute(
+        "INSERT OR REPLACE INTO users (user_id, nickname, system) VALUES (?, ?, ?)",
+        (user_id, nickname, system)
+    )
 
     await message.answer(
         f"✅ Регистрация завершена!\n\n"
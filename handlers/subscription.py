@@ -1,6 +1,6 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from database.db import get_connection
+from database.db import fetch_one, execute
 from config import ADMINS, PAYMENT_LINK, CARD
 from datetime import datetime
 from payments.service import create_payment
@@ -31,16 +31,13 @@ async def process_subscription(callback: CallbackQuery):
 
     payer = f"@{username}" if username else full_name
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO subscriptions (user_id, count, status, created_at)
-            VALUES (?, ?, 'pending', ?)
-        """, (user_id, count, datetime.now().isoformat()))
-        subscription_id = cursor.lastrowid
-        conn.commit()
+    cursor = await execute("""
+        INSERT INTO subscriptions (user_id, count, status, created_at)
+        VALUES (?, ?, 'pending', ?)
+    """, (user_id, count, datetime.now().isoformat()))
+    subscription_id = cursor.lastrowid
 
-    payment_url = create_payment(
+    payment_url = await create_payment(
         user_id=user_id,
         amount=price,
         target_type="subscription",
@@ -140,25 +137,21 @@ async def user_cancel_subscription(callback: CallbackQuery):
     subscription_id = int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT status
-            FROM subscriptions
-            WHERE id = ? AND user_id = ?
-        """, (subscription_id, user_id))
-        row = cursor.fetchone()
+    row = await fetch_one("""
+        SELECT status
+        FROM subscriptions
+        WHERE id = ? AND user_id = ?
+    """, (subscription_id, user_id))
 
-        if not row:
-            await callback.answer("❌ Абонемент не найден", show_alert=True)
-            return
+    if not row:
+        await callback.answer("❌ Абонемент не найден", show_alert=True)
+        return
 
-        if row[0] != "pending":
-            await callback.answer("⚠️ Абонемент уже оплачен", show_alert=True)
-            return
+    if row[0] != "pending":
+        await callback.answer("⚠️ Абонемент уже оплачен", show_alert=True)
+        return
 
-        cursor.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,))
-        conn.commit()
+    await execute("DELETE FROM subscriptions WHERE id = ? AND status = 'pending'", (subscription_id,))
 
     await callback.message.edit_text("❌ Покупка абонемента отменена.")
 
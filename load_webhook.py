@@ -0,0 +1,225 @@
+"""
+Нагрузочный прогон приёма апдейтов: записанные апдейты проигрываются в polling и в webhook,
+сравнивается задержка от появления апдейта до начала хендлера (p50 / p99).
+
+    python load_webhook.py --updates updates.jsonl --rate 50 --rtt 40
+
+updates.jsonl — сырые Update из Telegram, по одному JSON в строке (например, выгрузка
+getUpdates); без --updates генерируются текстовые сообщения от разных пользователей.
+Bot API — локальная заглушка, каждый её ответ задерживается на --rtt мс, как через прокси.
+Webhook-режим собирается тем же build_aiohttp_app, что и в bot.py, с секретом и фоновой обработкой.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:LOAD-TEST")
+os.environ.setdefault("WEBHOOK_SECRET", "load-test-secret")
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+import webhook
+from config import BOT_TOKEN, WEBHOOK_PATH, WEBHOOK_SECRET
+
+
+class FakeBotAPI:
+    """getUpdates с long polling и ответ на любые другие методы; очередь апдейтов — push()."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.updates: list[dict] = []
+        self.arrived = asyncio.Event()
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    def push(self, update: dict):
+        self.updates.append(update)
+        self.arrived.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        await asyncio.sleep(self.rtt / 2)  # запрос до Telegram
+
+        if method == "getUpdates":
+            offset = int(data.get("offset") or 0)
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            if not self.updates:
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), float(data.get("timeout") or 0) or 0.01)
+                except asyncio.TimeoutError:
+                    pass
+            result = list(self.updates)
+        elif method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "load", "username": "load_bot"}
+        elif method == "sendMessage":
+            result = {"message_id": 1, "date": int(time.time()), "chat": {"id": int(data["chat_id"]), "type": "private"}}
+        else:
+            result = True
+
+        await asyncio.sleep(self.rtt / 2)  # ответ обратно
+        return web.json_response({"ok": True, "result": result})
+
+
+def load_updates(path: str | None, count: int) -> list[dict]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+        return updates[:count] if count else updates
+    return [
+        {
+            "update_id": n,
+            "message": {
+                "message_id": n,
+                "date": int(time.time()),
+                "chat": {"id": 1000 + n % 50, "type": "private"},
+                "from": {"id": 1000 + n % 50, "is_bot": False, "first_name": f"pilot{n % 50}"},
+                "text": "📅 Записаться на тренировку",
+            },
+        }
+        for n in range(1, count + 1)
+    ]
+
+
+def build(api: FakeBotAPI, started: dict[int, float], done: set[int]) -> tuple[Bot, Dispatcher]:
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api.url)))
+    dp = Dispatcher()
+    router = Router()
+
+    @router.message()
+    @router.callback_query()
+    async def handler(event, event_update):
+        started[event_update.update_id] = time.perf_counter()
+        if isinstance(event, Message):
+            await event.answer("ok")  # ответ через тот же Bot API, как в настоящем хендлере
+        done.add(event_update.update_id)
+
+    dp.include_router(router)
+    return bot, dp
+
+
+async def replay(updates: list[dict], rate: float, send) -> dict[int, float]:
+    injected = {}
+    begin = time.perf_counter()
+    for n, update in enumerate(updates):
+        delay = begin + n / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        injected[update["update_id"]] = time.perf_counter()
+        await send(update)
+    return injected
+
+
+async def wait_all(done: set[int], count: int, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while len(done) < count and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+
+async def run_polling(updates: list[dict], rate: float, rtt: float) -> list[float]:
+    api = FakeBotAPI(rtt)
+    await api.start()
+    started: dict[int, float] = {}
+    done: set[int] = set()
+    bot, dp = build(api, started, done)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+
+    async def send(update):
+        api.push(update)
+
+    injected = await replay(updates, rate, send)
+    await wait_all(done, len(updates))
+    await dp.stop_polling()
+    await polling
+    await bot.session.close()
+    await api.runner.cleanup()
+    return [started[key] - injected[key] for key in started]
+
+
+async def run_webhook(updates: list[dict], rate: float, rtt: float) -> tuple[list[float], list[float]]:
+    api = FakeBotAPI(rtt)
+    await api.start()
+    started: dict[int, float] = {}
+    done: set[int] = set()
+    bot, dp = build(api, started, done)
+
+    runner = web.AppRunner(webhook.build_aiohttp_app(dp, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{WEBHOOK_PATH}"
+
+    acks: list[float] = []
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            await asyncio.sleep(rtt / 2)  # путь от Telegram до нашего сервера
+            sent = time.perf_counter()
+            async with session.post(url, json=update, headers={webhook.SECRET_HEADER: WEBHOOK_SECRET}) as response:
+                assert response.status == 200, response.status
+            acks.append(time.perf_counter() - sent)
+
+        tasks = []
+
+        async def send(update):
+            tasks.append(asyncio.create_task(post(update)))
+
+        injected = await replay(updates, rate, send)
+        await asyncio.gather(*tasks)
+
+        async with session.post(url, json=updates[0], headers={webhook.SECRET_HEADER: "wrong"}) as response:
+            print(f"неверный секрет: HTTP {response.status}")
+
+    # cleanup не ждёт wait_all: остановка сервера сама дожидается апдейтов в обработке
+    await runner.cleanup()
+    assert len(done) == len(updates), f"при остановке потеряно апдейтов: {len(updates) - len(done)}"
+    await api.runner.cleanup()
+    return [started[key] - injected[key] for key in started], acks
+
+
+def report(name: str, latencies: list[float], total: int):
+    latencies = sorted(latencies)
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{name:>8}: обработано {len(latencies)}/{total}, "
+          f"p50 {q[49] * 1000:.1f} мс, p99 {q[98] * 1000:.1f} мс, max {latencies[-1] * 1000:.1f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", help="JSONL с записанными апдейтами")
+    parser.add_argument("--count", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=50, help="апдейтов в секунду")
+    parser.add_argument("--rtt", type=float, default=40, help="задержка Bot API туда-обратно, мс")
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates, args.count)
+    rtt = args.rtt / 1000
+    for name in ("aiogram", "aiohttp.access"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    report("polling", await run_polling(updates, args.rate, rtt), len(updates))
+    handled, acks = await run_webhook(updates, args.rate, rtt)
+    report("webhook", handled, len(updates))
+    report("ack", acks, len(updates))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+
+from metrics import Counter, Histogram
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время хендлера aiogram", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в хендлерах aiogram", ("handler", "error"))
+
+TELEGRAM_SECONDS = Histogram("telegram_api_seconds", "Время запроса к Bot API", ("method",))
+TELEGRAM_ERRORS = Counter("telegram_api_errors_total", "Ошибки запросов к Bot API", ("method", "error"))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner-middleware: к этому моменту фильтры прошли и хендлер выбран (data["handler"]),
+    поэтому время пишется под его именем, например booking.reserve_slot.
+    Зарегистрированная на диспетчере, действует на хендлеры всех вложенных роутеров.
+    """
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        name = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: каждый исходящий вызов Bot API (sendMessage, editMessageText, …)."""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, api_method)
@@ -0,0 +1,26 @@
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from database.db import run_db
+from database.tg_users import remember
+
+
+class TgUserCacheMiddleware(BaseMiddleware):
+    """
+    Пассивно обновляет tg_users из каждого входящего Message / CallbackQuery.
+    В БД пишет только при изменении username / имени, поэтому обычный апдейт стоит одного сравнения в памяти.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._seen: dict[int, tuple[str | None, str | None]] = {}
+
+    async def __call__(self, handler, event, data):
+        user = event.from_user if isinstance(event, (Message, CallbackQuery)) else None
+        if user and not user.is_bot:
+            identity = (user.username, user.full_name)
+            if self._seen.get(user.id) != identity:
+                await run_db(remember, user.id, *identity)
+                self._seen[user.id] = identity
+
+        return await handler(event, data)
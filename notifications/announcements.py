@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from database.db import run_db
+from database.seatmap import SeatMap
+from groups import GROUPS, MAX_SLOTS_PER_GROUP, get_group_label
+from logging_config import logger
+from notifications.outbox import queue_messages, wake
+
+
+def claim_announcement(conn, kind: str, training_id: int, date: str, source: str) -> bool:
+    """Резервирует объявление в транзакции вызывающего. False — такое уже было (kind, training_id, date)."""
+    cursor = conn.execute("""
+        INSERT INTO announcements (kind, training_id, date, source, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (kind, training_id, date) DO NOTHING
+    """, (kind, training_id, date, source, datetime.now().isoformat()))
+    return cursor.rowcount == 1
+
+
+def build_progrev(training: SeatMap) -> str | None:
+    """Текст прогрева по карте мест; None — свободных мест нет."""
+    lines = []
+    total_free = 0
+    for group_name in GROUPS.keys():
+        free = MAX_SLOTS_PER_GROUP[group_name] - training.confirmed_count(group_name)
+        total_free += max(free, 0)
+        status = f"{free} мест" if free > 0 else "места закончились"
+        lines.append(f"{get_group_label(group_name)}: <b>{status}</b>")
+
+    if total_free <= 0:
+        return None
+
+    date_fmt = datetime.fromisoformat(training.date).strftime("%d.%m.%Y %H:%M")
+    return (
+        f"🔥 <b>Остались места на ближайшую тренировку!</b>\n"
+        f"📅 <b>{date_fmt}</b>\n\n"
+        + "\n".join(lines) +
+        "\n\n"
+        f"🚀 Успей записаться, пока есть места!"
+    )
+
+
+async def send_progrev(training: SeatMap, source: str, chat_id) -> str:
+    """
+    Прогрев в чат клуба chat_id — общий для задачи планировщика и /progrev.
+    Не чаще раза в день на тренировку: отметка в announcements и сообщение в outbox — одной транзакцией.
+    Возвращает "sent", "duplicate" или "no_seats".
+    """
+    text = build_progrev(training)
+    if text is None:
+        return "no_seats"
+
+    today = datetime.now().date().isoformat()
+
+    def claim_and_queue(conn):
+        if not claim_announcement(conn, "progrev", training.training_id, today, source):
+            return False
+        queue_messages(conn, [chat_id], text, parse_mode="HTML")
+        return True
+
+    if not await run_db(claim_and_queue):
+        return "duplicate"
+    wake()
+    logger.info(f"[announcements] прогрев по тренировке {training.training_id} ({source})")
+    return "sent"
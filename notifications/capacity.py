@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from logging_config import logger
+from notifications.outbox import queue_messages
+
+
+def record_capacity(conn, training_id: int, total_slots: int, chat_id) -> bool:
+    """
+    Вызывается в транзакции, которая подтвердила или освободила слот.
+    Если тренировка перешла в «заполнена» или обратно, пишет переход в capacity_log,
+    а при заполнении кладёт объявление в чат клуба chat_id в outbox — той же транзакцией, поэтому ровно один раз.
+    Параллельные записи сериализует блокировка записи SQLite: слот уже изменён в этой транзакции.
+
+    Возвращает True, если объявление поставлено в очередь (после коммита нужен wake()).
+    """
+    confirmed = conn.execute(
+        "SELECT COUNT(*) FROM slots WHERE training_id = ? AND status = 'confirmed'", (training_id,)
+    ).fetchone()[0]
+    state = "full" if confirmed >= total_slots else "open"
+
+    last = conn.execute(
+        "SELECT state FROM capacity_log WHERE training_id = ? ORDER BY id DESC LIMIT 1", (training_id,)
+    ).fetchone()
+    if (last[0] if last else "open") == state:
+        return False
+
+    conn.execute("""
+        INSERT INTO capacity_log (training_id, state, confirmed, created_at)
+        VALUES (?, ?, ?, ?)
+    """, (training_id, state, confirmed, datetime.now().isoformat()))
+    logger.info(f"[capacity] тренировка {training_id}: {state} ({confirmed}/{total_slots})")
+
+    if state != "full":
+        # об освободившемся месте чат узнаёт из уведомления об отмене
+        return False
+
+    date_str = conn.execute("SELECT date FROM trainings WHERE id = ?", (training_id,)).fetchone()[0]
+    date_fmt = datetime.fromisoformat(date_str).strftime("%d.%m %H:%M")
+    queue_messages(
+        conn, [chat_id],
+        f"❌ Все места на тренировку <b>{date_fmt}</b> закончились!",
+        parse_mode="HTML"
+    )
+    return True
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from database.db import run_db
+from logging_config import logger
+
+# Лимиты Telegram: ~30 сообщений/с на бота, ~1/с в личный чат, ~20/мин в группу
+GLOBAL_RATE = 25
+GLOBAL_BURST = 5
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+
+MAX_PARALLEL = 8        # одновременных запросов send_message
+MAX_ATTEMPTS = 5        # сетевые ошибки; RetryAfter попыткой не считается
+BATCH_SIZE = 50
+IDLE_CHECK = 30         # проверка очереди без пробуждения, сек
+KEEP_SENT_DAYS = 7
+
+_wakeup = asyncio.Event()
+
+
+# ==========================
+# Постановка в очередь
+# ==========================
+
+def _chat_id(chat_id: int | str) -> int | str:
+    """Числовой id строкой (REQUIRED_CHAT_ID из .env) — в int; @username группы или канала — как есть."""
+    if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+        return int(chat_id)
+    return chat_id
+
+
+def queue_messages(conn, chat_ids, text: str, *, slot_id: int = None, **params):
+    """
+    Кладёт сообщение в outbox для каждого чата — внутри транзакции вызывающего.
+    params — аргументы send_message (parse_mode, reply_markup, disable_web_page_preview).
+    После коммита нужно вызвать wake(), иначе диспетчер заметит сообщение только через IDLE_CHECK.
+    """
+    if "reply_markup" in params:
+        params["reply_markup"] = params["reply_markup"].model_dump(exclude_none=True)
+    payload = json.dumps(params, ensure_ascii=False) if params else None
+    now = datetime.now().isoformat()
+    conn.executemany("""
+        INSERT INTO outbox (chat_id, text, params, slot_id, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(_chat_id(chat_id), text, payload, slot_id, now) for chat_id in chat_ids])
+
+
+def cancel_slot_messages(conn, slot_id: int) -> int:
+    """
+    Снимает с очереди ещё не отправленные карточки заявки slot_id — заявку уже подтвердили
+    или отклонили, кнопки в них устарели. Карточку, которая уходит прямо сейчас,
+    диспетчер удалит сам: _mark_sent не найдёт её строку в outbox.
+    """
+    cursor = conn.execute("DELETE FROM outbox WHERE slot_id = ? AND status = 'pending'", (slot_id,))
+    return cursor.rowcount
+
+
+def wake():
+    _wakeup.set()
+
+
+async def enqueue_many(chat_ids, text: str, **kwargs):
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return
+    await run_db(lambda conn: queue_messages(conn, chat_ids, text, **kwargs))
+    wake()
+
+
+async def enqueue(chat_id, text: str, **kwargs):
+    await enqueue_many([chat_id], text, **kwargs)
+
+
+# ==========================
+# Диспетчер
+# ==========================
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _fetch_due(conn, now: float, limit: int):
+    # только первое ожидающее сообщение каждого чата — так сохраняется порядок внутри чата
+    return conn.execute("""
+        SELECT o.id, o.chat_id, o.text, o.params, o.slot_id, o.attempts
+        FROM outbox o
+        WHERE o.id IN (SELECT MIN(id) FROM outbox WHERE status = 'pending' GROUP BY chat_id)
+          AND o.not_before <= ?
+        ORDER BY o.id
+        LIMIT ?
+    """, (now, limit)).fetchall()
+
+
+def _next_due(conn):
+    return conn.execute("SELECT MIN(not_before) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+
+def _mark_sent(conn, outbox_id: int, slot_id: int | None, chat_id: int, message_id: int) -> bool:
+    """False — строку сняли с очереди (cancel_slot_messages), пока сообщение отправлялось."""
+    cursor = conn.execute(
+        "UPDATE outbox SET status = 'sent', sent_at = ? WHERE id = ? AND status = 'pending'",
+        (datetime.now().isoformat(), outbox_id)
+    )
+    if cursor.rowcount == 0:
+        return False
+    if slot_id is not None:
+        conn.execute("""
+            INSERT INTO admin_notifications (slot_id, admin_id, message_id)
+            VALUES (?, ?, ?)
+        """, (slot_id, chat_id, message_id))
+    return True
+
+
+def _reschedule(conn, outbox_id: int, delay: float, error: str, count_attempt: bool):
+    conn.execute("""
+        UPDATE outbox
+        SET not_before = ?, last_error = ?, attempts = attempts + ?
+        WHERE id = ?
+    """, (time.time() + delay, error, int(count_attempt), outbox_id))
+
+
+def _mark_failed(conn, outbox_id: int, error: str):
+    conn.execute(
+        "UPDATE outbox SET status = 'failed', last_error = ?, attempts = attempts + 1 WHERE id = ?",
+        (error, outbox_id)
+    )
+
+
+def _purge_sent(conn):
+    border = (datetime.now() - timedelta(days=KEEP_SENT_DAYS)).isoformat()
+    conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (border,))
+
+
+class OutboxDispatcher:
+    """
+    Отправляет сообщения из outbox с учётом общего лимита бота и лимита на чат.
+    Сообщения одного чата уходят строго по очереди; RetryAfter откладывает только этот чат.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._semaphore = asyncio.Semaphore(MAX_PARALLEL)
+        self._chat_ready: dict[int, float] = {}  # chat_id -> time.monotonic(), раньше которого не слать
+
+    async def run(self):
+        logger.info("[outbox] dispatcher started")
+        last_purge = 0.0
+
+        while True:
+            _wakeup.clear()
+            try:
+                rows = await run_db(_fetch_due, time.time(), BATCH_SIZE)
+                now = time.monotonic()
+                ready = [row for row in rows if self._chat_ready.get(row[1], 0) <= now]
+                if ready:
+                    await asyncio.gather(*(self._send(row) for row in ready))
+                    continue
+
+                if time.time() - last_purge > 3600:
+                    await run_db(_purge_sent)
+                    self._chat_ready = {chat_id: t for chat_id, t in self._chat_ready.items() if t > now}
+                    last_purge = time.time()
+
+                delay = IDLE_CHECK
+                next_due = await run_db(_next_due)
+                if next_due is not None:
+                    delay = min(delay, max(next_due - time.time(), 0.05))
+                busy = [ready_at - now for chat_id, ready_at in self._chat_ready.items() if ready_at > now]
+                if busy and rows:
+                    delay = min(delay, min(busy))
+            except Exception as e:
+                logger.exception(f"[outbox] dispatcher error: {e}")
+                delay = 5
+
+            try:
+                await asyncio.wait_for(_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _chat_interval(self, chat_id: int | str) -> float:
+        # @username бывает только у групп и каналов, у групп и id отрицательный
+        if isinstance(chat_id, str) or chat_id < 0:
+            return GROUP_CHAT_INTERVAL
+        return PRIVATE_CHAT_INTERVAL
+
+    async def _send(self, row):
+        outbox_id, chat_id, text, params, slot_id, attempts = row
+        kwargs = json.loads(params) if params else {}
+        if "reply_markup" in kwargs:
+            kwargs["reply_markup"] = InlineKeyboardMarkup.model_validate(kwargs["reply_markup"])
+
+        async with self._semaphore:
+            await self._bucket.acquire()
+            self._chat_ready[chat_id] = time.monotonic() + self._chat_interval(chat_id)
+            try:
+                message = await self.bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as e:
+                logger.warning(f"[outbox] RetryAfter {e.retry_after}s для чата {chat_id}")
+                self._chat_ready[chat_id] = time.monotonic() + e.retry_after
+                await run_db(_reschedule, outbox_id, e.retry_after, str(e), False)
+                return
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # бот заблокирован / чат не найден / кривой HTML — повтор не поможет
+                logger.warning(f"[outbox] сообщение {outbox_id} в чат {chat_id} не доставлено: {e}")
+                await run_db(_mark_failed, outbox_id, str(e))
+                return
+            except Exception as e:
+                if attempts + 1 >= MAX_ATTEMPTS:
+                    logger.error(f"[outbox] сообщение {outbox_id} в чат {chat_id} не доставлено: {e}")
+                    await run_db(_mark_failed, outbox_id, str(e))
+                else:
+                    await run_db(_reschedule, outbox_id, 2 ** attempts, str(e), True)
+                return
+
+        if not await run_db(_mark_sent, outbox_id, slot_id, chat_id, message.message_id):
+            # карточка заявки, которую уже закрыли, — без этого у админа остались бы живые кнопки
+            try:
+                await self.bot.delete_message(chat_id, message.message_id)
+            except Exception as e:
+                logger.warning(f"[outbox] не удалось удалить устаревшее сообщение {outbox_id}: {e}")
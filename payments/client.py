@@ -0,0 +1,119 @@
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+
+from logging_config import logger
+from metrics import Counter, Histogram
+
+YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
+YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
+
+# Ответы, после которых запрос имеет смысл повторить (с тем же Idempotence-Key)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+YOOKASSA_SECONDS = Histogram("yookassa_request_seconds", "Время одной попытки запроса к Юкассе", ("method", "endpoint"))
+YOOKASSA_REQUESTS = Counter(
+    "yookassa_requests_total", "Попытки запросов к Юкассе по HTTP-статусу или ошибке", ("method", "endpoint", "status")
+)
+
+
+class YooKassaError(RuntimeError):
+    def __init__(self, status: int, text: str):
+        super().__init__(f"YooKassa error {status}: {text}")
+        self.status = status
+        self.text = text
+
+
+class YooKassaClient:
+    """
+    Асинхронный клиент Юкассы: одна keep-alive сессия на процесс,
+    ограничение параллельных запросов и повторы с экспоненциальной паузой.
+    Повтор идёт с тем же Idempotence-Key, поэтому Юкасса не создаст второй платёж.
+    """
+
+    def __init__(
+        self,
+        base_url: str = YOOKASSA_API_URL,
+        shop_id: str | None = YOOKASSA_SHOP_ID,
+        secret_key: str | None = YOOKASSA_SECRET_KEY,
+        *,
+        max_connections: int = 10,
+        max_concurrency: int = 5,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.shop_id = shop_id
+        self.secret_key = secret_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60),
+                auth=aiohttp.BasicAuth(self.shop_id or "", self.secret_key or ""),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, path: str, *, json: dict | None = None,
+                      idempotence_key: str | None = None) -> dict:
+        headers = {"Idempotence-Key": idempotence_key} if idempotence_key else {}
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        # payments/2f3c… -> payments/{id}: id платежа в метки не попадает
+        resource, _, object_id = path.strip("/").partition("/")
+        endpoint = f"{resource}/{{id}}" if object_id else resource
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    started, status = time.perf_counter(), "error"
+                    try:
+                        async with self._get_session().request(method, url, json=json, headers=headers) as response:
+                            status = str(response.status)
+                            if response.status in (200, 201):
+                                return await response.json()
+                            text = await response.text()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        status = type(e).__name__
+                        raise
+                    finally:
+                        YOOKASSA_SECONDS.observe(time.perf_counter() - started, method, endpoint)
+                        YOOKASSA_REQUESTS.inc(method, endpoint, status)
+                error = YooKassaError(response.status, text)
+                if response.status not in RETRY_STATUSES:
+                    raise error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == self.retries:
+                raise error
+
+            delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+            logger.warning(f"[yookassa] {method} {path}: {error!r}, повтор через {delay:.1f}с")
+            await asyncio.sleep(delay)
+
+    async def create_payment(self, payload: dict, idempotence_key: str) -> dict:
+        return await self.request("POST", "payments", json=payload, idempotence_key=idempotence_key)
+
+    async def get_payment(self, yookassa_payment_id: str) -> dict:
+        return await self.request("GET", f"payments/{yookassa_payment_id}")
+
+
+# Общий клиент процесса; закрывается в on_shutdown бота
+yookassa = YooKassaClient()
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import socket
+
+from database.db import DB_PATH
+from logging_config import logger
+
+# Локальный канал api_server → бот: unix datagram сокет рядом с базой.
+# Одна датаграмма = id одного успешного платежа.
+PAYMENT_EVENTS_SOCKET = os.getenv(
+    "PAYMENT_EVENTS_SOCKET", os.path.join(os.path.dirname(DB_PATH), "payment_events.sock")
+)
+
+
+def notify_payment_succeeded(payment_id: int):
+    """
+    Вызывается api_server после коммита платежа. Не блокирует и не падает:
+    если бот не слушает, платёж подберёт страховочный проход sweep_payments.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(str(payment_id).encode(), PAYMENT_EVENTS_SOCKET)
+    except OSError as e:
+        logger.warning(f"[payment_events] бот не получил платёж {payment_id}: {e}")
+
+
+class PaymentEventListener:
+    """Сторона бота: копит пришедшие id и будит ожидающего через asyncio.Event."""
+
+    def __init__(self, path: str = PAYMENT_EVENTS_SOCKET):
+        self.path = path
+        self._sock: socket.socket | None = None
+        self._pending: set[int] = set()
+        self._event = asyncio.Event()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+        logger.info(f"[payment_events] слушаем {self.path}")
+
+    def close(self):
+        if self._sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                break
+            try:
+                self._pending.add(int(data))
+            except ValueError:
+                logger.warning(f"[payment_events] мусор в сокете: {data!r}")
+        if self._pending:
+            self._event.set()
+
+    async def wait(self, timeout: float | None) -> set[int] | None:
+        """id пришедших платежей или None, если за timeout ничего не пришло (timeout=None — ждать без срока)."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._event.clear()
+        ids, self._pending = self._pending, set()
+        return ids
@@ -0,0 +1,99 @@
+"""
+Сверка зависших платежей с Юкассой.
+
+Если вебхук payment.succeeded не дошёл до api_server, платёж так и остаётся pending,
+а слот — неподтверждённым. Сверка берёт pending-платежи старше RECONCILE_AGE_MINUTES минут
+пачками по RECONCILE_BATCH, спрашивает их статус у Юкассы (не больше RECONCILE_CONCURRENCY
+запросов одновременно) и применяет результат:
+
+    succeeded           → apply_succeeded_event, тот же путь и тот же event_key, что у вебхука
+    canceled            → платёж у себя тоже 'canceled' (ссылка истекла, оплату отклонили)
+    pending / waiting…  → ничего, проверим в следующий раз
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from config import RECONCILE_AGE_MINUTES, REQUIRED_CHAT_ID
+from database.db import fetch_all, run_db
+from logging_config import logger
+from payments.client import yookassa
+from payments.service import apply_succeeded_event
+
+RECONCILE_BATCH = 100
+RECONCILE_CONCURRENCY = 5
+
+
+def cancel_payment(conn, payment_id: int) -> bool:
+    """Платёж отменён в Юкассе — отменяем у себя, если он всё ещё pending."""
+    cursor = conn.execute(
+        "UPDATE payments SET status = 'canceled' WHERE id = ? AND status = 'pending'", (payment_id,)
+    )
+    return cursor.rowcount > 0
+
+
+async def check_payment(payment_id: int, yookassa_payment_id: str) -> tuple[str, int | None]:
+    """
+    Запрашивает статус платежа в Юкассе и применяет его к базе.
+    Возвращает (статус в Юкассе, payment_id, если платёж применён именно сейчас).
+    """
+    status = (await yookassa.get_payment(yookassa_payment_id))["status"]
+
+    applied = None
+    if status == "succeeded":
+        applied = await run_db(
+            apply_succeeded_event, f"payment.succeeded:{yookassa_payment_id}", payment_id, yookassa_payment_id,
+            REQUIRED_CHAT_ID,
+        )
+    elif status == "canceled":
+        await run_db(cancel_payment, payment_id)
+    return status, applied
+
+
+async def reconcile_payments(age_minutes: int = RECONCILE_AGE_MINUTES) -> tuple[dict[str, int], set[int]]:
+    """
+    Один проход сверки. Возвращает счётчики fixed / expired / pending / failed
+    и id платежей, применённых сейчас, — о них ещё нужно сообщить пользователю.
+    """
+    border = (datetime.now() - timedelta(minutes=age_minutes)).isoformat()
+    semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+    counts: dict[str, int] = {"fixed": 0, "expired": 0, "pending": 0, "failed": 0}
+    applied: set[int] = set()
+
+    async def check(payment_id: int, yookassa_payment_id: str):
+        async with semaphore:
+            try:
+                status, applied_id = await check_payment(payment_id, yookassa_payment_id)
+            except Exception as e:
+                logger.warning(f"[reconcile] платёж {payment_id} ({yookassa_payment_id}): {e!r}")
+                counts["failed"] += 1
+                return
+
+        if applied_id:
+            applied.add(applied_id)
+            counts["fixed"] += 1
+        elif status == "canceled":
+            counts["expired"] += 1
+        elif status != "succeeded":  # succeeded без применения — вебхук успел раньше
+            counts["pending"] += 1
+
+    last_id = 0
+    while True:
+        batch = await fetch_all("""
+            SELECT id, yookassa_payment_id
+            FROM payments
+            WHERE status = 'pending'
+              AND yookassa_payment_id IS NOT NULL
+              AND created_at < ?
+              AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (border, last_id, RECONCILE_BATCH))
+        if not batch:
+            break
+
+        await asyncio.gather(*(check(payment_id, yookassa_payment_id) for payment_id, yookassa_payment_id in batch))
+        last_id = batch[-1][0]
+        if len(batch) < RECONCILE_BATCH:
+            break
+
+    return counts, applied
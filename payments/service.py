@@ -1,23 +1,22 @@
-import sqlite3
 import uuid
-import requests
 from datetime import datetime
-from requests.auth import HTTPBasicAuth
-import os
 from logging_config import logger
-
-YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
-YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
-YOOKASSA_API_URL = "https://api.yookassa.ru/v3/payments"
-
-DB_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(__file__)),
-    "database",
-    "bot.db"
-)
-
-
-def create_payment(
+from database.db import execute
+from payments.client import yookassa, YOOKASSA_SHOP_ID
+from notifications.capacity import record_capacity
+from groups import TOTAL_SLOTS
+
+# Сообщение оплаты слота (expire_slot); план запроса проверяет tests/test_query_plans.py
+SLOT_PAYMENT_SQL = """
+    SELECT chat_id, message_id
+    FROM payments
+    WHERE target_type = 'slot' AND target_id = ? AND status IN ('pending', 'canceled')
+    ORDER BY id DESC
+    LIMIT 1
+"""
+
+
+async def create_payment(
     *,
     user_id: int,
     amount: int,
@@ -35,11 +34,8 @@ def create_payment(
 
     now = datetime.now().isoformat()
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     # 1️⃣ создаём payment у себя
-    cursor.execute("""
+    cursor = await execute("""
         INSERT INTO payments (
             user_id,
             amount,
@@ -66,11 +62,8 @@ def create_payment(
     ))
 
     payment_id = cursor.lastrowid
-    conn.commit()
-    logger.info(
-    f"YooKassa request: shop_id={YOOKASSA_SHOP_ID}, "
-    f"secret_prefix={YOOKASSA_SECRET_KEY[:6] if YOOKASSA_SECRET_KEY else None}"
-)
+    logger.info(f"YooKassa request: shop_id={YOOKASSA_SHOP_ID}, payment_id={payment_id}")
+
     # 2️⃣ payload для Юкассы
     payload = {
         "amount": {
@@ -93,37 +86,19 @@ def create_payment(
     else:
         payload["payment_method_data"] = {"type": "bank_card"}
 
-    headers = {
-        "Idempotence-Key": str(uuid.uuid4()),
-        "Content-Type": "application/json"
-    }
-
-    # 3️⃣ запрос в Юкассу
-    response = requests.post(
-        YOOKASSA_API_URL,
-        json=payload,
-        headers=headers,
-        auth=HTTPBasicAuth(YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY),
-        timeout=10
-    )
-
-    if response.status_code not in (200, 201):
-        cursor.execute("""
+    # 3️⃣ запрос в Юкассу (ключ идемпотентности общий для всех повторов)
+    try:
+        data = await yookassa.create_payment(payload, idempotence_key=str(uuid.uuid4()))
+    except Exception:
+        await execute("""
             UPDATE payments
             SET status = 'canceled'
             WHERE id = ?
         """, (payment_id,))
-        conn.commit()
-        conn.close()
-
-        raise RuntimeError(
-            f"YooKassa error {response.status_code}: {response.text}"
-        )
-
-    data = response.json()
+        raise
 
     # 4️⃣ сохраняем yookassa_payment_id
-    cursor.execute("""
+    await execute("""
         UPDATE payments
         SET yookassa_payment_id = ?
         WHERE id = ?
@@ -132,15 +107,52 @@ def create_payment(
         payment_id
     ))
 
-    conn.commit()
-    conn.close()
-
     return data["confirmation"]["confirmation_url"]
 
 
-def apply_payment(payment: dict):
+def apply_succeeded_event(
+    conn, event_key: str, payment_id: int, yookassa_payment_id: str | None, chat_id
+) -> int | None:
     """
-    Применяет успешный платёж к бизнес-логике.
+    Весь вебхук payment.succeeded — одна транзакция (run_db): отметка события,
+    статус платежа, подтверждение слота или начисление абонемента, объявление в outbox.
+    Повтор того же события упирается в PRIMARY KEY webhook_events и больше ничего не делает.
+    chat_id — чат клуба для объявления «мест нет»; config сюда не импортируется,
+    чтобы api_server поднимался без BOT_TOKEN.
+
+    Возвращает id платежа, если он применён сейчас; None — дубль или платёж не найден.
+    """
+    cursor = conn.execute("""
+        INSERT INTO webhook_events (event_key, payment_id, received_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT (event_key) DO NOTHING
+    """, (event_key, payment_id, datetime.now().isoformat()))
+    if cursor.rowcount == 0:
+        return None
+
+    cursor = conn.execute("""
+        UPDATE payments
+        SET
+            status = 'succeeded',
+            yookassa_payment_id = ?,
+            paid_at = ?
+        WHERE id = ? AND status != 'succeeded'
+    """, (yookassa_payment_id, datetime.now().isoformat(), payment_id))
+    if cursor.rowcount == 0:
+        return None
+
+    status, target_type, target_id = conn.execute(
+        "SELECT status, target_type, target_id FROM payments WHERE id = ?", (payment_id,)
+    ).fetchone()
+    apply_payment(
+        conn, {"id": payment_id, "status": status, "target_type": target_type, "target_id": target_id}, chat_id
+    )
+    return payment_id
+
+
+def apply_payment(conn, payment, chat_id):
+    """
+    Применяет успешный платёж к бизнес-логике — в транзакции вызывающего.
     payment — dict / sqlite3.Row из таблицы payments
     """
 
@@ -154,53 +166,88 @@ def apply_payment(payment: dict):
     target_id = payment["target_id"]
 
     if target_type == "slot":
-        confirm_slot(target_id)
+        confirm_slot(conn, target_id, chat_id)
 
     elif target_type == "subscription":
-        activate_subscription(target_id)
+        activate_subscription(conn, target_id)
 
     else:
         logger.warning(
             f"[apply_payment] unknown target_type: {target_type}"
         )
 
-def confirm_slot(slot_id: int):
-    conn = sqlite3.connect(DB_PATH)
+
+def confirm_slot(conn, slot_id: int, chat_id):
     cursor = conn.cursor()
 
     # 1️⃣ проверяем слот
     cursor.execute("""
-        SELECT status
+        SELECT status, training_id
         FROM slots
         WHERE id = ?
     """, (slot_id,))
     row = cursor.fetchone()
 
     if not row:
-        conn.close()
         logger.error(f"[confirm_slot] slot {slot_id} not found")
         return
 
-    if row[0] == "confirmed":
+    status, training_id = row
+    if status == "confirmed":
         # идемпотентность
-        conn.close()
-        return
+        return True
 
-    # 2️⃣ подтверждаем
+    # 2️⃣ подтверждаем; бронь, снятую по таймауту (expired), поздняя оплата возвращает,
+    # если канал ещё свободен — иначе uq_slots_active_channel, и OR IGNORE ничего не меняет
     cursor.execute("""
-        UPDATE slots
+        UPDATE OR IGNORE slots
         SET status = 'confirmed'
         WHERE id = ?
     """, (slot_id,))
+    if cursor.rowcount == 0:
+        logger.warning(f"[confirm_slot] slot {slot_id} ({status}): канал уже занят, оплата без места")
+        return False
 
-    conn.commit()
-    conn.close()
+    # 3️⃣ переход «тренировка заполнена» — в той же транзакции
+    record_capacity(conn, training_id, TOTAL_SLOTS, chat_id)
 
     logger.info(f"[confirm_slot] slot {slot_id} confirmed")
+    return True
 
 
-def activate_subscription(subscription_id: int):
-    conn = sqlite3.connect(DB_PATH)
+def expire_slot(conn, slot_id: int):
+    """
+    Снимает неоплаченную бронь по таймауту — в транзакции вызывающего (run_db).
+    Слот уходит в 'expired' и освобождает канал, ожидающий платёж по нему — в 'canceled'.
+    Если вебхук успел подтвердить слот раньше, условие status = 'pending' не сработает.
+    UPDATE идёт первым: транзакция (и блокировка записи) начинается с него, а не с SELECT.
+
+    Возвращает (training_id, group, channel, user_id, date, chat_id, message_id) или None.
+    """
+    cursor = conn.execute("UPDATE slots SET status = 'expired' WHERE id = ? AND status = 'pending'", (slot_id,))
+    if cursor.rowcount == 0:
+        return None
+
+    row = conn.execute("""
+        SELECT s.training_id, s.group_name, s.channel, s.user_id, t.date
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.id = ?
+    """, (slot_id,)).fetchone()
+
+    # платёж могла уже отменить сверка (payments/reconcile.py) — сообщение оплаты всё равно его
+    payment = conn.execute(SLOT_PAYMENT_SQL, (slot_id,)).fetchone()
+    conn.execute("""
+        UPDATE payments
+        SET status = 'canceled'
+        WHERE target_type = 'slot' AND target_id = ? AND status = 'pending'
+    """, (slot_id,))
+
+    logger.info(f"[expire_slot] slot {slot_id} expired")
+    return (*row, *(payment or (None, None)))
+
+
+def activate_subscription(conn, subscription_id: int):
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -211,12 +258,10 @@ def activate_subscription(subscription_id: int):
     row = cursor.fetchone()
 
     if not row:
-        conn.close()
         return
 
     user_id, count, status = row
     if status == "confirmed":
-        conn.close()
         return
 
     cursor.execute("""
@@ -238,9 +283,6 @@ def activate_subscription(subscription_id: int):
     """, (user_id,))
     total = cursor.fetchone()[0]
 
-    conn.commit()
-    conn.close()
-
     logger.info(
         f"[activate_subscription] sub {subscription_id} +{count}, total={total}"
     )
@@ -0,0 +1,256 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from database.db import fetch_all, run_db
+from logging_config import logger
+from metrics import Counter, Histogram
+
+JOB_SECONDS = Histogram("job_run_seconds", "Длительность запуска фоновой задачи планировщика", ("job",))
+JOB_FAILURES = Counter("job_failures_total", "Запуски фоновых задач, завершившиеся исключением", ("job",))
+
+# ==========================
+# Cron-выражения
+# ==========================
+
+def _parse_field(spec: str, low: int, high: int) -> set[int]:
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = map(int, part.split("-"))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"cron: значение {part!r} вне диапазона {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """
+    Классический cron из пяти полей: минута, час, день месяца, месяц, день недели (0 и 7 — воскресенье).
+    Поддерживаются *, списки, диапазоны и шаг. Время — локальное, как везде в боте.
+    """
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron: ожидалось 5 полей, получено {expr!r}")
+        self.expr = expr
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _parse_field(fields[4], 0, 7)}
+        # если ограничены оба поля дня, cron срабатывает по любому из них
+        self._any_day = fields[2] != "*" and fields[4] != "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        in_month = dt.day in self.days
+        in_week = (dt.weekday() + 1) % 7 in self.weekdays
+        return (in_month or in_week) if self._any_day else (in_month and in_week)
+
+    def next_after(self, after: datetime) -> datetime:
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"cron: {self.expr!r} никогда не срабатывает")
+
+
+# ==========================
+# Задачи
+# ==========================
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[..., Awaitable]
+    args: tuple = ()
+    every: float | None = None          # интервальная задача, сек
+    cron: Cron | None = None
+    jitter: float = 0                   # случайная добавка к паузе, сек
+    catch_up: float | None = None       # cron: догонять пропущенный запуск, если опоздали не больше, сек
+    run_at_start: bool = False          # интервальная: первый проход сразу после старта
+
+    runs: int = 0
+    failures: int = 0
+    last_duration: float | None = None
+    max_duration: float = 0
+    total_duration: float = 0
+    next_run: datetime | None = None
+    running: bool = field(default=False)
+
+
+class Scheduler:
+    """
+    Один планировщик на процесс: cron- и интервальные задачи, фоновые сервисы.
+    Последний запуск каждой задачи хранится в job_runs — после перезапуска интервальная
+    задача продолжает свой ритм, а пропущенный cron-запуск догоняется (в пределах catch_up).
+    Задачи одного имени не перекрываются: следующая пауза считается после завершения.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def every(self, seconds: float, func, *args, name: str = None, jitter: float = 0, run_at_start: bool = False):
+        job = Job(name or func.__name__, func, args, every=seconds, jitter=jitter, run_at_start=run_at_start)
+        self.jobs[job.name] = job
+        return job
+
+    def cron(self, expr: str, func, *args, name: str = None, jitter: float = 0, catch_up: float | None = None):
+        job = Job(name or func.__name__, func, args, cron=Cron(expr), jitter=jitter, catch_up=catch_up)
+        self.jobs[job.name] = job
+        return job
+
+    def service(self, name: str, coro):
+        """Долгоживущая корутина (слушатель, диспетчер очереди): запускается сразу, отменяется в shutdown."""
+        self._tasks[name] = asyncio.create_task(self._run_service(name, coro))
+
+    async def start(self):
+        last_runs = dict(await fetch_all("SELECT name, last_started_at FROM job_runs"))
+        for job in self.jobs.values():
+            self._tasks[job.name] = asyncio.create_task(self._loop(job, last_runs.get(job.name)))
+        logger.info(f"[scheduler] запущено задач: {len(self.jobs)}")
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        logger.info("[scheduler] остановлен")
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "name": job.name,
+                "runs": job.runs,
+                "failures": job.failures,
+                "last_duration": job.last_duration,
+                "avg_duration": job.total_duration / job.runs if job.runs else None,
+                "max_duration": job.max_duration,
+                "next_run": job.next_run,
+                "running": job.running,
+            }
+            for job in self.jobs.values()
+        ]
+
+    # --- расписание ---
+
+    def _first_run(self, job: Job, last_started: float | None) -> datetime:
+        now = datetime.now()
+        if job.every is not None:
+            if job.run_at_start or last_started is None:
+                return now
+            return max(now, datetime.fromtimestamp(last_started + job.every))
+
+        if last_started is not None and job.catch_up:
+            # догоняем последний пропущенный запуск, а не первый: за несколько дней простоя
+            # первый давно вне окна catch_up, а вчерашний или сегодняшний ещё в нём;
+            # запуски старше окна не интересны, поэтому перебор начинается с его начала
+            window = now - timedelta(seconds=job.catch_up + 1)
+            missed = None
+            occurrence = job.cron.next_after(max(datetime.fromtimestamp(last_started), window))
+            while occurrence <= now:
+                missed = occurrence
+                occurrence = job.cron.next_after(occurrence)
+            if missed is not None and (now - missed).total_seconds() <= job.catch_up:
+                logger.info(f"[scheduler] {job.name}: догоняем пропущенный запуск {missed:%d.%m %H:%M}")
+                return now
+        return job.cron.next_after(now)
+
+    def _next_run(self, job: Job) -> datetime:
+        now = datetime.now()
+        if job.every is not None:
+            return now + timedelta(seconds=job.every)
+        return job.cron.next_after(now)
+
+    async def _loop(self, job: Job, last_started: float | None):
+        job.next_run = self._first_run(job, last_started)
+        while True:
+            delay = (job.next_run - datetime.now()).total_seconds()
+            if job.jitter:
+                delay += random.uniform(0, job.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._execute(job)
+            job.next_run = self._next_run(job)
+
+    async def _execute(self, job: Job):
+        started = time.time()
+        job.running = True
+        status, error = "ok", None
+        try:
+            await job.func(*job.args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status, error = "error", repr(e)
+            job.failures += 1
+            JOB_FAILURES.inc(job.name)
+            logger.exception(f"[scheduler] {job.name} упала: {e}")
+        finally:
+            job.running = False
+
+        duration = time.time() - started
+        job.runs += 1
+        job.last_duration = duration
+        job.max_duration = max(job.max_duration, duration)
+        job.total_duration += duration
+        JOB_SECONDS.observe(duration, job.name)
+        if status == "ok":
+            logger.debug(f"[scheduler] {job.name}: ok за {duration * 1000:.0f} мс")
+
+        try:
+            await run_db(_save_run, job.name, started, duration, status, error)
+        except Exception as e:
+            logger.warning(f"[scheduler] не удалось записать запуск {job.name}: {e}")
+
+    async def _run_service(self, name: str, coro):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"[scheduler] сервис {name} упал: {e}")
+
+
+def _save_run(conn, name: str, started: float, duration: float, status: str, error: str | None):
+    conn.execute("""
+        INSERT INTO job_runs (name, last_started_at, last_finished_at, last_duration, last_status, last_error,
+                              runs, failures, total_duration)
+        VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            last_started_at = excluded.last_started_at,
+            last_finished_at = excluded.last_finished_at,
+            last_duration = excluded.last_duration,
+            last_status = excluded.last_status,
+            last_error = excluded.last_error,
+            runs = runs + 1,
+            failures = failures + excluded.failures,
+            total_duration = total_duration + excluded.total_duration
+    """, (name, started, started + duration, duration, status, error, int(status == "error"), duration))
+
+
+# Общий планировщик процесса; задачи регистрируются в on_startup бота
+scheduler = Scheduler()
@@ -0,0 +1,33 @@
+"""
+Общие фикстуры тестов. Каждый тест получает свою временную БД со всеми миграциями —
+database/bot.db не трогается.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+# config.py без BOT_TOKEN завершает процесс; настоящий токен тестам не нужен
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("REQUIRED_CHAT_ID", "-1001234567890")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from database import db
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Пустая БД со схемой последней версии; пулы соединений закрываются после теста."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    db.init_db()
+    yield db.DB_PATH
+    db.close_pool()
+
+
+@pytest.fixture
+def conn(database):
+    connection = db.get_connection()
+    yield connection
+    connection.close()
@@ -0,0 +1,112 @@
+"""
+Локальная заглушка API Юкассы (/v3/payments) на aiohttp для тестов клиента и сверки.
+
+Умеет то, на что рассчитаны payments/client.py и payments/reconcile.py:
+идемпотентность по Idempotence-Key (повтор с тем же ключом возвращает тот же платёж),
+задержку ответа, 5xx до и после создания платежа и GET статуса платежа.
+"""
+import asyncio
+import random
+import uuid
+
+from aiohttp import web
+
+
+class FakeYooKassa:
+    def __init__(self, *, latency: tuple[float, float] = (0, 0), error_rate: float = 0,
+                 fail_first: int = 0, lost_responses: int = 0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate            # доля случайных 503 до создания платежа
+        self.fail_first = fail_first            # первые N попыток каждого ключа — 503
+        self.lost_responses = lost_responses    # следующие N попыток: платёж создан, а ответ — 503
+        self.rng = random.Random(seed)
+
+        self.attempts: dict[str, int] = {}      # Idempotence-Key -> число POST
+        self.by_key: dict[str, dict] = {}       # Idempotence-Key -> созданный платёж
+        self.payments: dict[str, dict] = {}     # id в Юкассе -> платёж
+        self.requests: list[tuple[str, str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self.app = web.Application()
+        self.app.router.add_post("/v3/payments", self.create)
+        self.app.router.add_get("/v3/payments/{payment_id}", self.get)
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def start(self) -> "FakeYooKassa":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v3"
+        return self
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def add_payment(self, status: str, metadata: dict | None = None) -> str:
+        """Платёж, который «уже есть» в Юкассе, — для сверки."""
+        payment_id = str(uuid.uuid4())
+        self.payments[payment_id] = {"id": payment_id, "status": status, "metadata": metadata or {}}
+        return payment_id
+
+    async def _delay(self):
+        low, high = self.latency
+        if high:
+            await asyncio.sleep(self.rng.uniform(low, high))
+
+    async def create(self, request: web.Request) -> web.Response:
+        key = request.headers.get("Idempotence-Key")
+        self.requests.append(("POST", key))
+        if not key:
+            return web.json_response({"type": "error", "code": "invalid_request"}, status=400)
+
+        body = await request.json()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self._delay()
+            attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+            if attempt <= self.fail_first or self.rng.random() < self.error_rate:
+                return web.json_response({"type": "error", "code": "internal_server_error"}, status=503)
+
+            payment = self.by_key.get(key)
+            if payment is None:
+                payment_id = str(uuid.uuid4())
+                payment = self.by_key[key] = self.payments[payment_id] = {
+                    "id": payment_id,
+                    "status": "pending",
+                    "amount": body["amount"],
+                    "metadata": body.get("metadata", {}),
+                    "confirmation": {"type": "redirect", "confirmation_url": f"https://pay.test/{payment_id}"},
+                }
+            if attempt <= self.fail_first + self.lost_responses:
+                return web.json_response({"type": "error", "code": "internal_server_error"}, status=503)
+            return web.json_response(payment)
+        finally:
+            self.in_flight -= 1
+
+    async def get(self, request: web.Request) -> web.Response:
+        payment_id = request.match_info["payment_id"]
+        self.requests.append(("GET", payment_id))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self._delay()
+            if self.rng.random() < self.error_rate:
+                return web.json_response({"type": "error", "code": "internal_server_error"}, status=503)
+            payment = self.payments.get(payment_id)
+            if payment is None:
+                return web.json_response({"type": "error", "code": "not_found"}, status=404)
+            return web.json_response(payment)
+        finally:
+            self.in_flight -= 1
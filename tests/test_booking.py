@@ -0,0 +1,149 @@
+"""Хендлеры записи: подтверждение и отклонение админом только ожидающей брони, снятие брони без платежа."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from handlers import booking
+from handlers.booking import confirm_booking, reject_booking, reserve_slot, seat_maps
+
+
+class FakeMessage:
+    def __init__(self):
+        self.chat = SimpleNamespace(id=42)
+        self.message_id = 7
+        self.edits: list[str] = []
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+        return self
+
+
+class FakeBot:
+    async def get_chat_member(self, chat_id, user_id):
+        return SimpleNamespace(user=SimpleNamespace(username=f"user{user_id}", full_name=f"User {user_id}"))
+
+    async def delete_message(self, chat_id, message_id):
+        pass
+
+
+class FakeCallback:
+    def __init__(self, data: str, user_id: int = 42):
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id, username="pilot", full_name="Pilot")
+        self.message = FakeMessage()
+        self.bot = FakeBot()
+        self.alerts: list[str] = []
+
+    async def answer(self, text=None, show_alert=False, **kwargs):
+        self.alerts.append(text)
+
+
+@pytest.fixture
+def training(conn):
+    seat_maps.invalidate()
+    with conn:
+        conn.execute("INSERT INTO trainings (date, status) VALUES ('2026-11-01T19:00:00', 'open')")
+        conn.executemany(
+            "INSERT INTO users (user_id, nickname, system) VALUES (?, ?, 'HDZero')", [(42, "pilot"), (43, "other")]
+        )
+    yield 1
+    seat_maps.invalidate()
+
+
+def add_slot(conn, user_id: int, status: str, payment_type: str = "manual") -> int:
+    with conn:
+        return conn.execute("""
+            INSERT INTO slots (training_id, user_id, group_name, channel, status, created_at, payment_type)
+            VALUES (1, ?, 'fast', 'R1', ?, '2026-10-18T12:00:00', ?)
+        """, (user_id, status, payment_type)).lastrowid
+
+
+def slot_status(conn, slot_id: int) -> str:
+    return conn.execute("SELECT status FROM slots WHERE id = ?", (slot_id,)).fetchone()[0]
+
+
+@pytest.mark.parametrize("taken, alert", [
+    (False, "Канал свободен"),
+    (True, "канал уже занят"),
+])
+def test_admin_cannot_confirm_expired_slot(conn, training, taken, alert):
+    slot_id = add_slot(conn, 42, "expired")
+    if taken:
+        add_slot(conn, 43, "pending")
+
+    callback = FakeCallback(f"confirm:{slot_id}")
+    asyncio.run(confirm_booking(callback))
+
+    assert alert in callback.alerts[0]
+    assert slot_status(conn, slot_id) == "expired"
+    assert callback.message.edits == []
+
+
+def test_second_confirm_is_rejected(conn, training):
+    slot_id = add_slot(conn, 42, "confirmed")
+
+    callback = FakeCallback(f"confirm:{slot_id}")
+    asyncio.run(confirm_booking(callback))
+
+    assert callback.alerts == ["Запись уже подтверждена."]
+    assert conn.execute("SELECT COUNT(*) FROM capacity_log").fetchone()[0] == 0
+
+
+def test_failed_payment_releases_channel(conn, training, monkeypatch):
+    async def create_payment(**kwargs):
+        raise RuntimeError("YooKassa error 503")
+    monkeypatch.setattr(booking, "create_payment", create_payment)
+    monkeypatch.setattr(booking, "USE_YOOKASSA", True)
+
+    callback = FakeCallback("reserve:1:fast:R1")
+    asyncio.run(reserve_slot(callback))
+
+    assert conn.execute("SELECT status FROM slots").fetchall() == [("expired",)]
+    assert "бронь снята" in callback.message.edits[-1]
+    free = asyncio.run(seat_maps.get(1))
+    assert "R1" in seat_maps.free_channels(free, "fast")
+
+
+def test_reject_deletes_pending_and_frees_channel(conn, training):
+    slot_id = add_slot(conn, 42, "pending")
+    assert "R1" not in seat_maps.free_channels(asyncio.run(seat_maps.get(1)), "fast")
+
+    callback = FakeCallback(f"reject:{slot_id}", user_id=1)
+    asyncio.run(reject_booking(callback))
+
+    assert callback.message.edits == ["❌ Запись отклонена"]
+    assert conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0] == 0
+    assert "R1" in seat_maps.free_channels(asyncio.run(seat_maps.get(1)), "fast")
+
+
+@pytest.mark.parametrize("status, alert", [
+    ("expired", "снята по таймауту"),
+    ("confirmed", "уже подтверждена"),
+])
+def test_reject_keeps_slot_that_is_no_longer_pending(conn, training, status, alert):
+    slot_id = add_slot(conn, 42, status)
+    if status == "expired":
+        # канал после таймаута занял другой участник
+        add_slot(conn, 43, "pending")
+    before = asyncio.run(seat_maps.get(1)).holders.copy()
+
+    callback = FakeCallback(f"reject:{slot_id}", user_id=1)
+    asyncio.run(reject_booking(callback))
+
+    assert alert in callback.alerts[0]
+    assert callback.message.edits == []
+    # снятая по таймауту бронь остаётся в истории
+    assert slot_status(conn, slot_id) == status
+    assert asyncio.run(seat_maps.get(1)).holders == before
+
+
+def test_release_of_other_holder_keeps_channel(conn, training):
+    add_slot(conn, 43, "pending")
+    seat_map = asyncio.run(seat_maps.get(1))
+
+    # запоздалое освобождение брони 42: канал уже у 43
+    seat_maps.apply(1, "fast", "R1", 42, None)
+
+    assert seat_map.holders[("fast", "R1")] == (43, "pending")
+    assert "R1" not in seat_maps.free_channels(seat_map, "fast")
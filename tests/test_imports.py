@@ -0,0 +1,20 @@
+"""api_server поднимается без BOT_TOKEN: платёжный путь не тянет config и хендлеры бота."""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_api_server_imports_without_bot_token(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k not in ("BOT_TOKEN", "BOT_IN_API")}
+    env["PYTHONPATH"] = ROOT
+    result = subprocess.run(
+        [sys.executable, "-c", (
+            "import sys, api.api_server; "
+            "assert 'config' not in sys.modules, 'config'; "
+            "assert not any(m.startswith('handlers') for m in sys.modules), 'handlers'"
+        )],
+        cwd=tmp_path, env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,80 @@
+"""Диспетчер outbox: чаты @username и устаревшие карточки заявок."""
+import asyncio
+from types import SimpleNamespace
+
+from database import db
+from handlers.booking import pop_admin_notifications
+from notifications.outbox import (
+    GROUP_CHAT_INTERVAL, PRIVATE_CHAT_INTERVAL, OutboxDispatcher, _fetch_due, queue_messages,
+)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent: list[tuple] = []
+        self.deleted: list[tuple] = []
+        self.before_reply = None       # вызывается посреди send_message, до ответа Telegram
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.before_reply is not None:
+            await self.before_reply()
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append((chat_id, message_id))
+
+
+def send_due(dispatcher: OutboxDispatcher):
+    async def scenario():
+        rows = await db.run_db(_fetch_due, 1e12, 50)
+        await asyncio.gather(*(dispatcher._send(row) for row in rows))
+    asyncio.run(scenario())
+
+
+def test_chat_ids_from_env_and_usernames(conn):
+    with conn:
+        queue_messages(conn, ["-1001234567890", "@whoopclub", 42], "hello")
+    assert [row[0] for row in conn.execute("SELECT chat_id FROM outbox ORDER BY id")] == [
+        -1001234567890, "@whoopclub", 42,
+    ]
+
+    bot = FakeBot()
+    dispatcher = OutboxDispatcher(bot)
+    send_due(dispatcher)
+
+    assert sorted(map(str, (chat_id for chat_id, _ in bot.sent))) == ["-1001234567890", "42", "@whoopclub"]
+    assert conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0] == 3
+    assert dispatcher._chat_interval("@whoopclub") == GROUP_CHAT_INTERVAL
+    assert dispatcher._chat_interval(42) == PRIVATE_CHAT_INTERVAL
+
+
+def test_closed_request_cards_are_not_sent(conn):
+    with conn:
+        queue_messages(conn, [1, 2], "📥 Новая запись", slot_id=7)
+        queue_messages(conn, [1], "✅ Запись подтверждена")
+        # заявку закрыли раньше, чем диспетчер дошёл до карточек
+        pop_admin_notifications(conn, 7)
+
+    bot = FakeBot()
+    send_due(OutboxDispatcher(bot))
+
+    assert bot.sent == [(1, "✅ Запись подтверждена")]
+    assert conn.execute("SELECT COUNT(*) FROM admin_notifications").fetchone()[0] == 0
+
+
+def test_card_closed_while_sending_is_deleted(conn):
+    with conn:
+        queue_messages(conn, [1], "📥 Новая запись", slot_id=7)
+
+    bot = FakeBot()
+
+    async def close_request():
+        await db.run_db(pop_admin_notifications, 7)
+    bot.before_reply = close_request
+
+    send_due(OutboxDispatcher(bot))
+
+    assert bot.sent == [(1, "📥 Новая запись")]
+    assert bot.deleted == [(1, 1)]
+    assert conn.execute("SELECT COUNT(*) FROM admin_notifications").fetchone()[0] == 0
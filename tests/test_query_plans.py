@@ -0,0 +1,186 @@
+"""
+EXPLAIN QUERY PLAN горячих запросов хендлеров и фоновых задач: ни один не должен
+откатиться к полному просмотру slots / trainings / payments / admin_notifications.
+Запросы, вынесенные в константы, берутся из кода; остальные тексты — те же, что в коде:
+поменяли запрос — поменяйте и здесь.
+"""
+import re
+
+import pytest
+
+from api.api_server import PARTICIPANTS_SQL
+from database.seatmap import LOAD_SQL, UPCOMING_SQL
+from payments.service import SLOT_PAYMENT_SQL
+
+# таблицы, полный SCAN которых на горячем пути — регрессия
+INDEXED_TABLES = {"slots", "trainings", "payments", "admin_notifications"}
+
+HOT_QUERIES = {
+    # database/seatmap.py: карта мест открытых тренировок
+    "seatmap.load": LOAD_SQL.format(statuses="?, ?, ?", placeholders="?, ?"),
+    "seatmap.upcoming": UPCOMING_SQL,
+    # handlers/booking.py
+    "booking.cancel_pending": """
+        SELECT training_id, group_name, channel FROM slots
+        WHERE id = ? AND user_id = ? AND status = 'pending'
+    """,
+    "booking.admin_notifications": "SELECT admin_id, message_id FROM admin_notifications WHERE slot_id = ?",
+    "booking.my_bookings": """
+        SELECT t.date, s.group_name, s.channel, s.status
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.user_id = ? AND t.status != 'cancelled'
+          AND s.status IN ('pending', 'confirmed', 'pending_cancel')
+    """,
+    "booking.bookings_to_cancel": """
+        SELECT s.id, t.date
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        WHERE s.user_id = ? AND s.status = 'confirmed' AND t.date_ts > ? AND t.status != 'cancelled'
+    """,
+    "booking.update_payment_message": """
+        UPDATE payments SET message_id = ? WHERE target_type='slot' AND target_id = ? AND status='pending'
+    """,
+    # notifications/capacity.py
+    "capacity.confirmed": "SELECT COUNT(*) FROM slots WHERE training_id = ? AND status = 'confirmed'",
+    # handlers/admin.py
+    "admin.training_participants": "SELECT s.user_id, s.status FROM slots s WHERE s.training_id = ?",
+    "admin.resend_pending": """
+        SELECT s.id, s.training_id, s.user_id, s.group_name, s.channel, s.payment_type, s.created_at,
+               t.date, u.nickname, u.system, tg.username, tg.full_name
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        JOIN users u ON s.user_id = u.user_id
+        LEFT JOIN tg_users tg ON tg.user_id = s.user_id
+        WHERE s.status = 'pending'
+          AND NOT EXISTS (
+            SELECT 1 FROM admin_notifications n WHERE n.slot_id = s.id
+          )
+    """,
+    # background_tasks.py: потерянные уведомления админам
+    "tasks.lost_notifications": """
+        SELECT s.id, s.training_id, s.user_id, s.group_name, s.channel, s.payment_type, s.created_at,
+               t.date, u.nickname, u.system
+        FROM slots s
+        JOIN trainings t ON s.training_id = t.id
+        JOIN users u ON s.user_id = u.user_id
+        WHERE s.status = 'pending'
+        AND s.created_at < ?
+        AND NOT EXISTS (
+            SELECT 1 FROM admin_notifications n WHERE n.slot_id = s.id
+        )
+    """,
+    # background_payments.py
+    "payments.ui_watcher": """
+        SELECT p.id, p.user_id, p.chat_id, p.message_id, p.target_type, p.target_id
+        FROM payments p
+        WHERE p.status = 'succeeded'
+          AND p.ui_status = 'shown'
+          AND p.target_type IN ('slot', 'subscription')
+    """,
+    "payments.reap_pending_slots": """
+        SELECT s.id, p.id, p.yookassa_payment_id
+        FROM slots s
+        LEFT JOIN payments p
+            ON p.target_type = 'slot' AND p.target_id = s.id AND p.status = 'pending'
+        WHERE s.status = 'pending'
+          AND s.created_at < ?
+          AND s.payment_type = ?
+    """,
+    # payments/service.py
+    "payments.slot_payment": SLOT_PAYMENT_SQL,
+    # payments/reconcile.py
+    "payments.reconcile": """
+        SELECT id, yookassa_payment_id
+        FROM payments
+        WHERE status = 'pending'
+          AND yookassa_payment_id IS NOT NULL
+          AND created_at < ?
+          AND id > ?
+        ORDER BY id
+        LIMIT ?
+    """,
+    # api/api_server.py: участники тренировки
+    "api.participants": PARTICIPANTS_SQL,
+}
+
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"where", "join", "left", "inner", "on", "order", "group", "limit", "set"}
+
+
+def query_plan(conn, sql: str) -> list[str]:
+    parameters = (None,) * sql.count("?")
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+
+
+def table_aliases(sql: str) -> dict[str, str]:
+    """{имя в плане: таблица} — в плане таблица с алиасом видна под алиасом («SCAN s»)."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(sql: str, plan: list[str], tables=INDEXED_TABLES) -> list[str]:
+    """
+    Строки плана, где индексируемая таблица читается целиком («SCAN s») или через
+    AUTOMATIC INDEX, который SQLite строит на лету, потому что своего индекса нет.
+    """
+    aliases = table_aliases(sql)
+    bad = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] not in ("SCAN", "SEARCH") or aliases.get(words[1]) not in tables:
+            continue
+        if "AUTOMATIC" in words or (words[0] == "SCAN" and "USING" not in words):
+            bad.append(detail)
+    return bad
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(conn, name):
+    sql = HOT_QUERIES[name]
+    plan = query_plan(conn, sql)
+    assert not full_scans(sql, plan), f"{name}: полный просмотр таблицы\n" + "\n".join(plan)
+
+
+# Предикаты по дате тренировки (миграция 0013) — через свои индексы, а не функцию от trainings.date
+DATE_QUERIES = {
+    # handlers/admin.py: /cancel_training
+    "admin.cancel_training": ("""
+        SELECT id, date FROM trainings
+        WHERE status = 'open' AND date_ts > ?
+        ORDER BY date_ts ASC
+    """, "idx_trainings_status_date_ts"),
+    # database/seatmap.py: ближайшие открытые тренировки, граница и LIMIT в SQL
+    "seatmap.upcoming": (UPCOMING_SQL, "idx_trainings_status_date_ts"),
+    # handlers/participants.py: список тренировок
+    "participants.trainings": ("""
+        SELECT id, date FROM trainings
+        WHERE status = 'open' AND date_ts >= ?
+        ORDER BY date_ts ASC
+    """, "idx_trainings_status_date_ts"),
+    # api/api_server.py: тренировка по дню
+    "api.training_version": ("""
+        SELECT t.id, COALESCE(v.version, 0)
+        FROM trainings t
+        LEFT JOIN training_versions v ON v.training_id = t.id
+        WHERE t.date_key = ? AND t.status != 'cancelled'
+        LIMIT 1
+    """, "idx_trainings_date_key"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(DATE_QUERIES))
+def test_date_predicate_uses_its_index(conn, name):
+    sql, index = DATE_QUERIES[name]
+    plan = query_plan(conn, sql)
+    trainings = [detail for detail in plan if detail.split()[1:2] in (["trainings"], ["t"])]
+    assert trainings and all(
+        detail.startswith("SEARCH") and f"USING INDEX {index} " in f"{detail} " for detail in trainings
+    ), f"{name}: ожидался SEARCH по {index}\n" + "\n".join(plan)
+    # ORDER BY date_ts идёт по тому же индексу, без отдельной сортировки
+    assert not any("TEMP B-TREE" in detail for detail in plan), "\n".join(plan)
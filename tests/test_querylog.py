@@ -0,0 +1,82 @@
+"""Журнал медленных запросов: ожидание блокировок отдельно, вызывающий — код проекта, сброс вне пула."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from database import db, querylog
+
+
+class FakeLogger:
+    def __init__(self):
+        self.warnings: list[str] = []
+
+    def warning(self, text):
+        self.warnings.append(text)
+
+
+@pytest.fixture
+def log(monkeypatch):
+    fake = FakeLogger()
+    monkeypatch.setattr(querylog, "logger", fake)
+    return fake
+
+
+def test_begin_waiting_for_lock_is_a_lock_wait(database, log, monkeypatch):
+    monkeypatch.setattr(querylog, "SLOW_QUERY_MS", 50)
+    began, released = threading.Event(), threading.Event()
+
+    def hold_write_lock():
+        holder = db.get_connection(isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        began.set()
+        time.sleep(0.2)
+        holder.execute("COMMIT")
+        holder.close()
+        released.set()
+
+    threading.Thread(target=hold_write_lock).start()
+    began.wait()
+
+    conn = db.get_connection(isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("COMMIT")
+    conn.close()
+    released.wait()
+
+    waits = {stats.sql: stats for stats in querylog.lock_waits()}
+    assert waits["BEGIN IMMEDIATE"].max >= 0.1
+    assert "BEGIN IMMEDIATE" not in {stats.sql for stats in querylog.slowest(1000)}
+    begin_lines = [line for line in log.warnings if "BEGIN IMMEDIATE" in line]
+    assert begin_lines and all(line.startswith("[lock_wait]") and "план" not in line for line in begin_lines)
+
+
+def test_caller_skips_asyncio_frames(database, log, monkeypatch):
+    monkeypatch.setattr(querylog, "SLOW_QUERY_MS", 0)
+
+    async def scenario():
+        # gather оборачивает run_db в Task: прямо над ним в стеке — цикл событий asyncio
+        await asyncio.gather(db.run_db(lambda conn: conn.execute("SELECT 'caller-check'").fetchone()))
+
+    asyncio.run(scenario())
+
+    [line] = [line for line in log.warnings if "SELECT ?" in line and "[slow_query]" in line]
+    assert "tests/test_querylog.py:test_caller_skips_asyncio_frames" in line
+    assert "asyncio/" not in line
+
+
+def test_slow_statements_outside_pool_are_flushed(database, log, monkeypatch):
+    monkeypatch.setattr(querylog, "SLOW_QUERY_MS", 0)
+
+    # как init_db: with get_connection() — без run_db и его flush_statements
+    with db.get_connection() as conn:
+        conn.execute("SELECT COUNT(*) FROM trainings WHERE date_key = ?", ("2026-10-18",)).fetchone()
+    assert conn._slow == []
+    assert any("trainings" in line and "idx_trainings_date_key" in line for line in log.warnings)
+
+    log.warnings.clear()
+    other = db.get_connection()
+    other.execute("SELECT COUNT(*) FROM slots").fetchone()
+    other.close()
+    assert any("FROM slots" in line for line in log.warnings)
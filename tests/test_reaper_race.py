@@ -0,0 +1,126 @@
+"""
+Гонка снятия неоплаченной брони (reap_pending_slots → release_slot) и позднего вебхука
+payment.succeeded: при любом порядке оплата не теряется, а канал не занят дважды.
+"""
+import asyncio
+
+from background_payments import release_slot
+from database import db
+from handlers.booking import reserve_channel, seat_maps
+from payments.service import apply_succeeded_event
+
+CHAT_ID = -1001234567890
+ROUNDS = 40
+
+
+class FakeBot:
+    def __init__(self):
+        self.edited: list[tuple[int, int]] = []
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.edited.append((chat_id, message_id))
+
+
+def add_booking(conn, training_id: int, user_id: int = 42, channel: str = "R1") -> tuple[int, int]:
+    """Ожидающая оплаты бронь и её платёж в Юкассе, как после reserve_slot."""
+    with conn:
+        slot_id = conn.execute("""
+            INSERT INTO slots (training_id, user_id, group_name, channel, status, created_at, payment_type)
+            VALUES (?, ?, 'fast', ?, 'pending', '2026-10-18T12:00:00', 'yookassa')
+        """, (training_id, user_id, channel)).lastrowid
+        payment_id = conn.execute("""
+            INSERT INTO payments (user_id, amount, currency, payment_method, status, target_type, target_id,
+                                  chat_id, message_id, ui_status, created_at, yookassa_payment_id)
+            VALUES (?, 1000, 'RUB', 'sbp', 'pending', 'slot', ?, ?, 1, 'shown', '2026-10-18T12:00:00', ?)
+        """, (user_id, slot_id, user_id, f"yk-{slot_id}")).lastrowid
+    return slot_id, payment_id
+
+
+def add_training(conn, day: int) -> int:
+    with conn:
+        return conn.execute(
+            "INSERT INTO trainings (date, status) VALUES (?, 'open')", (f"2026-11-{day:02d}T19:00:00",)
+        ).lastrowid
+
+
+def add_users(conn):
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, nickname, system) VALUES (?, ?, 'HDZero')", [(42, "pilot"), (43, "other")]
+        )
+
+
+def webhook(payment_id: int, slot_id: int):
+    return db.run_db(
+        apply_succeeded_event, f"payment.succeeded:yk-{slot_id}", payment_id, f"yk-{slot_id}", CHAT_ID
+    )
+
+
+def state(conn, slot_id: int, payment_id: int) -> tuple[str, str]:
+    return (
+        conn.execute("SELECT status FROM slots WHERE id = ?", (slot_id,)).fetchone()[0],
+        conn.execute("SELECT status FROM payments WHERE id = ?", (payment_id,)).fetchone()[0],
+    )
+
+
+def test_reaper_and_late_webhook_race(conn):
+    seat_maps.invalidate()
+    add_users(conn)
+    bot = FakeBot()
+
+    async def scenario():
+        for n in range(ROUNDS):
+            slot_id, payment_id = add_booking(conn, add_training(conn, n % 28 + 1))
+            applied, _ = await asyncio.gather(webhook(payment_id, slot_id), release_slot(bot, slot_id, 30))
+
+            # платёж применён ровно один раз при любом порядке
+            assert applied == payment_id
+            # снятая раньше вебхука бронь возвращается — канал никто не занял
+            assert state(conn, slot_id, payment_id) == ("confirmed", "succeeded")
+
+    asyncio.run(scenario())
+    seat_maps.invalidate()
+
+
+def test_webhook_first_wins_over_reaper(conn):
+    seat_maps.invalidate()
+    add_users(conn)
+    slot_id, payment_id = add_booking(conn, add_training(conn, 1))
+    bot = FakeBot()
+
+    async def scenario():
+        assert await webhook(payment_id, slot_id) == payment_id
+        await release_slot(bot, slot_id, 30)
+
+    asyncio.run(scenario())
+    seat_maps.invalidate()
+    assert state(conn, slot_id, payment_id) == ("confirmed", "succeeded")
+    assert bot.edited == []
+
+
+def test_late_webhook_after_channel_taken(conn):
+    seat_maps.invalidate()
+    add_users(conn)
+    training_id = add_training(conn, 1)
+    slot_id, payment_id = add_booking(conn, training_id)
+    bot = FakeBot()
+
+    async def scenario():
+        await release_slot(bot, slot_id, 30)
+        # канал освободился, его занимает другой участник, и только потом приходит оплата
+        result, _ = await db.run_db(reserve_channel, training_id, 43, "fast", "R1", "yookassa")
+        assert result == "ok"
+        assert await webhook(payment_id, slot_id) == payment_id
+        # повтор того же вебхука ничего не меняет
+        assert await webhook(payment_id, slot_id) is None
+
+    asyncio.run(scenario())
+    seat_maps.invalidate()
+    assert bot.edited == [(42, 1)]
+    # деньги учтены, но место осталось у того, кто занял канал первым
+    assert state(conn, slot_id, payment_id) == ("expired", "succeeded")
+    assert conn.execute("""
+        SELECT COUNT(*) FROM slots
+        WHERE training_id = ? AND group_name = 'fast' AND channel = 'R1'
+          AND status IN ('pending', 'confirmed', 'pending_cancel')
+    """, (training_id,)).fetchone()[0] == 1
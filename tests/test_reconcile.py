@@ -0,0 +1,126 @@
+"""Сверка зависших платежей (payments/reconcile.py) против локальной заглушки Юкассы."""
+import asyncio
+
+import pytest
+
+from fake_yookassa import FakeYooKassa
+from payments import reconcile
+from payments.client import YooKassaClient
+
+OLD = "2026-10-18T12:00:00"
+GROUPS = ("fast", "standard", "third")
+CHANNELS = ("R1", "R2", "F2", "F4", "R8")
+
+
+@pytest.fixture
+def booking(conn):
+    with conn:
+        conn.execute("INSERT INTO trainings (date, status) VALUES ('2030-11-01T19:00:00', 'open')")
+        conn.execute("INSERT INTO users (user_id, nickname, system) VALUES (42, 'pilot', 'HDZero')")
+    return conn
+
+
+def add_payment(conn, n: int, yookassa_payment_id: str, created_at: str = OLD) -> tuple[int, int]:
+    """n-я ожидающая оплаты бронь (свой канал) и её pending-платёж; (payment_id, slot_id)."""
+    with conn:
+        slot_id = conn.execute("""
+            INSERT INTO slots (training_id, user_id, group_name, channel, status, created_at, payment_type)
+            VALUES (1, 42, ?, ?, 'pending', ?, 'yookassa')
+        """, (GROUPS[n // len(CHANNELS)], CHANNELS[n % len(CHANNELS)], created_at)).lastrowid
+        payment_id = conn.execute("""
+            INSERT INTO payments (user_id, amount, currency, payment_method, status, target_type, target_id,
+                                  chat_id, message_id, ui_status, created_at, yookassa_payment_id)
+            VALUES (42, 1000, 'RUB', 'sbp', 'pending', 'slot', ?, 42, 1, 'shown', ?, ?)
+        """, (slot_id, created_at, yookassa_payment_id)).lastrowid
+    return payment_id, slot_id
+
+
+def status_of(conn, table: str, row_id: int) -> str:
+    return conn.execute(f"SELECT status FROM {table} WHERE id = ?", (row_id,)).fetchone()[0]
+
+
+async def reconcile_with(fake: FakeYooKassa, monkeypatch, passes: int = 1, **client_kwargs):
+    client = YooKassaClient(fake.url, "shop", "secret", backoff=0.01, **client_kwargs)
+    monkeypatch.setattr(reconcile, "yookassa", client)
+    try:
+        return [await reconcile.reconcile_payments(age_minutes=10) for _ in range(passes)]
+    finally:
+        await client.close()
+
+
+def test_statuses_from_yookassa_are_applied(booking, monkeypatch):
+    conn = booking
+
+    async def scenario():
+        async with FakeYooKassa() as fake:
+            ids = {status: fake.add_payment(status) for status in ("succeeded", "canceled", "waiting_for_capture")}
+            ids["unknown"] = "missing-in-yookassa"
+            ids["fresh"] = fake.add_payment("succeeded")
+            rows = {
+                name: add_payment(conn, n, yookassa_payment_id, "2999-01-01T00:00:00" if name == "fresh" else OLD)
+                for n, (name, yookassa_payment_id) in enumerate(ids.items())
+            }
+            [result] = await reconcile_with(fake, monkeypatch)
+            return fake, ids, rows, result
+
+    fake, ids, rows, (counts, applied) = asyncio.run(scenario())
+
+    assert counts == {"fixed": 1, "expired": 1, "pending": 1, "failed": 1}
+    # оплата без вебхука — платёж и слот подтверждены тем же путём и с тем же event_key, что у вебхука
+    payment_id, slot_id = rows["succeeded"]
+    assert applied == {payment_id}
+    assert (status_of(conn, "payments", payment_id), status_of(conn, "slots", slot_id)) == ("succeeded", "confirmed")
+    assert conn.execute("SELECT event_key FROM webhook_events").fetchall() == [
+        (f"payment.succeeded:{ids['succeeded']}",)
+    ]
+    assert status_of(conn, "payments", rows["canceled"][0]) == "canceled"
+    assert status_of(conn, "payments", rows["waiting_for_capture"][0]) == "pending"
+    # 404 — ошибка сверки, платёж не трогаем
+    assert status_of(conn, "payments", rows["unknown"][0]) == "pending"
+    # свежий платёж ещё ждёт вебхука — в Юкассу за ним не ходили
+    assert status_of(conn, "payments", rows["fresh"][0]) == "pending"
+    assert ("GET", ids["fresh"]) not in fake.requests
+
+
+def test_second_pass_and_late_webhook_do_not_reapply(booking, monkeypatch):
+    conn = booking
+
+    async def scenario():
+        async with FakeYooKassa() as fake:
+            yookassa_payment_id = fake.add_payment("succeeded")
+            payment_id, _ = add_payment(conn, 0, yookassa_payment_id)
+            passes = await reconcile_with(fake, monkeypatch, passes=2)
+            # вебхук дошёл после сверки: тот же event_key — дубль
+            late = await reconcile.run_db(
+                reconcile.apply_succeeded_event, f"payment.succeeded:{yookassa_payment_id}",
+                payment_id, yookassa_payment_id, None,
+            )
+            return passes, late
+
+    (first, second), late = asyncio.run(scenario())
+    assert first[0]["fixed"] == 1
+    assert second == ({"fixed": 0, "expired": 0, "pending": 0, "failed": 0}, set())
+    assert late is None
+    assert conn.execute("SELECT COUNT(*) FROM webhook_events").fetchone()[0] == 1
+
+
+def test_batches_under_latency_and_errors(booking, monkeypatch):
+    conn = booking
+    monkeypatch.setattr(reconcile, "RECONCILE_BATCH", 8)
+
+    async def scenario():
+        async with FakeYooKassa(latency=(0.01, 0.03), error_rate=0.3, seed=23) as fake:
+            for n in range(15):
+                add_payment(conn, n, fake.add_payment("canceled" if n % 3 == 0 else "succeeded"))
+            # у клиента лимит выше — одновременность ограничивает сама сверка
+            [result] = await reconcile_with(fake, monkeypatch, retries=8, max_concurrency=50)
+            return fake, result
+
+    fake, (counts, applied) = asyncio.run(scenario())
+
+    assert counts == {"fixed": 10, "expired": 5, "pending": 0, "failed": 0}
+    assert len(applied) == 10
+    assert conn.execute("SELECT COUNT(*) FROM payments WHERE status = 'pending'").fetchone()[0] == 0
+    # 5xx повторялись с тем же запросом, но к Юкассе одновременно — не больше RECONCILE_CONCURRENCY
+    assert len(fake.requests) > 15
+    assert 1 < fake.max_in_flight <= reconcile.RECONCILE_CONCURRENCY
@@ -0,0 +1,63 @@
+"""
+Гонка за канал: много одновременных reserve_channel на одну тренировку через пул run_db.
+На каждый канал группы должна пройти ровно одна запись, остальные — "taken";
+абонемент списывается только у победителей.
+"""
+import asyncio
+import random
+from collections import Counter
+
+from database import db
+from handlers.booking import GROUPS, reserve_channel
+
+USERS = 500
+
+
+def seed(conn):
+    with conn:
+        conn.execute("INSERT INTO trainings (date, status) VALUES ('2026-11-01T19:00:00', 'open')")
+        # каждый третий — с абонементом: его запись сразу confirmed, в той же транзакции списание
+        conn.executemany(
+            "INSERT INTO users (user_id, nickname, system, subscription) VALUES (?, ?, 'HDZero', ?)",
+            [(user_id, f"pilot{user_id}", 1 if user_id % 3 == 0 else 0) for user_id in range(1, USERS + 1)],
+        )
+
+
+def test_exactly_one_winner_per_channel(conn):
+    seed(conn)
+    channels = [(group, channel) for group, cfg in GROUPS.items() for channel in cfg["channels"]]
+    rng = random.Random(5)
+    attempts = [(user_id, *rng.choice(channels)) for user_id in range(1, USERS + 1)]
+
+    async def storm():
+        return await asyncio.gather(*(
+            db.run_db(reserve_channel, 1, user_id, group, channel, "yookassa")
+            for user_id, group, channel in attempts
+        ))
+
+    results = asyncio.run(storm())
+
+    winners = Counter()
+    for (user_id, group, channel), (result, _) in zip(attempts, results):
+        assert result in ("ok", "taken")
+        if result == "ok":
+            winners[group, channel] += 1
+    contested = {(group, channel) for _, group, channel in attempts}
+    assert winners == Counter(dict.fromkeys(contested, 1))
+
+    active = conn.execute("""
+        SELECT group_name, channel, COUNT(*) FROM slots
+        WHERE training_id = 1 AND status IN ('pending', 'confirmed', 'pending_cancel')
+        GROUP BY group_name, channel
+    """).fetchall()
+    assert {(group, channel): count for group, channel, count in active} == dict.fromkeys(contested, 1)
+
+    # абонемент списан ровно у тех, чья запись прошла как subscription
+    spent = conn.execute("""
+        SELECT COUNT(*) FROM users u
+        WHERE u.subscription = 0 AND u.user_id % 3 = 0
+    """).fetchone()[0]
+    by_subscription = conn.execute(
+        "SELECT COUNT(*) FROM slots WHERE training_id = 1 AND payment_type = 'subscription'"
+    ).fetchone()[0]
+    assert spent == by_subscription
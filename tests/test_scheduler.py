@@ -0,0 +1,43 @@
+"""Первый запуск cron-задачи после перезапуска: догоняется последний пропущенный запуск."""
+from datetime import datetime
+
+import pytest
+
+import scheduler
+from scheduler import Scheduler
+
+NOW = datetime(2026, 10, 21, 14, 0)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+@pytest.fixture(autouse=True)
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(scheduler, "datetime", FrozenDatetime)
+
+
+async def noop():
+    pass
+
+
+def first_run(catch_up: float, last_started: datetime) -> datetime:
+    sched = Scheduler()
+    job = sched.cron("0 13 * * *", noop, catch_up=catch_up)
+    return sched._first_run(job, last_started.timestamp())
+
+
+def test_catches_up_latest_missed_run():
+    # простой с 18.10: первый пропуск (19.10 13:00) вне окна, последний (21.10 13:00) — в нём
+    assert first_run(6 * 3600, datetime(2026, 10, 18, 13, 0)) == NOW
+
+
+def test_missed_run_outside_window_waits_for_schedule():
+    assert first_run(30 * 60, datetime(2026, 10, 18, 13, 0)) == datetime(2026, 10, 22, 13, 0)
+
+
+def test_nothing_missed():
+    assert first_run(6 * 3600, datetime(2026, 10, 21, 13, 0, 5)) == datetime(2026, 10, 22, 13, 0)
@@ -0,0 +1,97 @@
+"""Кэш карт мест (database/seatmap.py): окно ближайших тренировок из SQL с границей и LIMIT."""
+import asyncio
+
+import pytest
+
+from database import seatmap
+from database.seatmap import SeatMapCache
+from groups import GROUPS
+
+
+@pytest.fixture
+def trainings(conn):
+    with conn:
+        conn.executemany("INSERT INTO trainings (date, status) VALUES (?, ?)", [
+            ("2026-11-01T19:00:00", "open"),
+            ("2026-11-03T19:00:00", "cancelled"),
+            ("2026-11-05T19:00:00", "open"),
+            ("2026-10-20T19:00:00", "open"),
+            ("2026-11-07T19:00:00", "open"),
+        ])
+    return conn
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Обращения кэша к БД через run_db."""
+    sent = []
+    run_db = seatmap.run_db
+
+    async def counting(fn, *args, **kwargs):
+        sent.append(fn)
+        return await run_db(fn, *args, **kwargs)
+
+    monkeypatch.setattr(seatmap, "run_db", counting)
+    return sent
+
+
+def dates(seat_maps) -> list[str]:
+    return [seat_map.date for seat_map in seat_maps]
+
+
+def test_upcoming_is_bounded_and_ordered(trainings):
+    cache = SeatMapCache(GROUPS)
+    assert dates(asyncio.run(cache.upcoming("2026-10-25T00:00:00", limit=2))) == [
+        "2026-11-01T19:00:00", "2026-11-05T19:00:00",
+    ]
+    # граница строгая, отменённые не попадают
+    assert dates(asyncio.run(SeatMapCache(GROUPS).upcoming("2026-11-01T19:00:00"))) == [
+        "2026-11-05T19:00:00", "2026-11-07T19:00:00",
+    ]
+
+
+def test_later_bound_reuses_window(trainings, queries):
+    cache = SeatMapCache(GROUPS)
+
+    async def scenario():
+        full = await cache.upcoming("2026-10-01T00:00:00")
+        shifted = await cache.upcoming("2026-10-25T00:00:00")
+        return full, shifted
+
+    full, shifted = asyncio.run(scenario())
+    assert len(full) == 4
+    assert dates(shifted) == ["2026-11-01T19:00:00", "2026-11-05T19:00:00", "2026-11-07T19:00:00"]
+    # окно + карты; окно неполное — это все открытые тренировки, второй вызов в БД не ходил
+    assert len(queries) == 2
+
+
+def test_window_is_reloaded_when_it_runs_short(trainings, queries):
+    cache = SeatMapCache(GROUPS)
+
+    async def scenario():
+        first = await cache.upcoming("2026-10-01T00:00:00", limit=2)
+        # в окне из двух строк после новой границы осталась одна — за третьей нужно в БД
+        second = await cache.upcoming("2026-10-25T00:00:00", limit=2)
+        # граница раньше окна — тоже в БД
+        third = await cache.upcoming("2026-09-01T00:00:00", limit=2)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert dates(first) == ["2026-10-20T19:00:00", "2026-11-01T19:00:00"]
+    assert dates(second) == ["2026-11-01T19:00:00", "2026-11-05T19:00:00"]
+    assert dates(third) == dates(first)
+    # окно + карты, окно + недостающая карта, окно (карты уже в кэше)
+    assert len(queries) == 5
+
+
+def test_new_training_is_seen_after_invalidate_schedule(trainings):
+    cache = SeatMapCache(GROUPS)
+    assert len(asyncio.run(cache.upcoming("2026-10-01T00:00:00"))) == 4
+
+    with trainings:
+        trainings.execute("INSERT INTO trainings (date, status) VALUES ('2026-10-22T19:00:00', 'open')")
+    cache.invalidate_schedule()
+
+    assert dates(asyncio.run(cache.upcoming("2026-10-01T00:00:00", limit=2))) == [
+        "2026-10-20T19:00:00", "2026-10-22T19:00:00",
+    ]
@@ -0,0 +1,123 @@
+"""
+Агрегаты /stats и /finance: после случайной последовательности изменений slots и trainings
+то, что насчитали триггеры, совпадает с rebuild_stats() с нуля.
+"""
+import random
+import sqlite3
+
+import pytest
+
+from database.stats import rebuild_stats
+
+STEPS = 600
+CHECK_EVERY = 50
+USERS = range(1, 9)
+SLOT_STATUSES = ("pending", "confirmed", "pending_cancel", "expired", "canceled")
+PAYMENT_TYPES = ("subscription", "manual", "yookassa")
+CHANNELS = [(group, channel) for group in ("fast", "standard", "third") for channel in ("R1", "R2", "F2")]
+
+
+def snapshot(conn) -> tuple[list, list]:
+    # триггеры оставляют обнулённые строки месяца, пересчёт их не создаёт
+    return (
+        conn.execute("""
+            SELECT month, user_id, visits, slots, sub_slots, one_slots FROM stats_user_month
+            WHERE visits != 0 OR slots != 0 OR sub_slots != 0 OR one_slots != 0
+            ORDER BY month, user_id
+        """).fetchall(),
+        conn.execute("SELECT training_id, month, active, slots FROM stats_training ORDER BY training_id").fetchall(),
+    )
+
+
+def assert_matches_rebuild(conn):
+    maintained = snapshot(conn)
+    rebuild_stats(conn)
+    rebuilt = snapshot(conn)
+    conn.rollback()
+    assert maintained == rebuilt
+
+
+def random_date(rng: random.Random) -> str:
+    # несколько лет, чтобы тренировки переезжали между месяцами и годами
+    return f"{rng.randint(2024, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T19:00:00"
+
+
+def pick(conn, rng: random.Random, sql: str):
+    rows = conn.execute(sql).fetchall()
+    return rng.choice(rows) if rows else None
+
+
+def mutate(conn, rng: random.Random):
+    action = rng.choices(
+        ("add_training", "add_slot", "slot_status", "slot_payment", "move_slot", "delete_slot",
+         "cancel_training", "reopen_training", "move_training", "delete_training"),
+        weights=(2, 10, 8, 2, 2, 3, 2, 1, 2, 1),
+    )[0]
+
+    if action == "add_training":
+        conn.execute(
+            "INSERT INTO trainings (date, status) VALUES (?, ?)",
+            (random_date(rng), "cancelled" if rng.random() < 0.1 else "open"),
+        )
+        return
+
+    if action in ("cancel_training", "reopen_training", "move_training", "delete_training"):
+        training = pick(conn, rng, "SELECT id FROM trainings")
+        if training is None:
+            return
+        if action == "cancel_training":
+            conn.execute("UPDATE trainings SET status = 'cancelled' WHERE id = ?", training)
+        elif action == "reopen_training":
+            conn.execute("UPDATE trainings SET status = 'open' WHERE id = ?", training)
+        elif action == "move_training":
+            conn.execute("UPDATE trainings SET date = ? WHERE id = ?", (random_date(rng), *training))
+        else:
+            # внешние ключи выключены: слоты удалённой тренировки остаются сиротами
+            conn.execute("DELETE FROM trainings WHERE id = ?", training)
+        return
+
+    if action == "add_slot":
+        training = pick(conn, rng, "SELECT id FROM trainings")
+        if training is None:
+            return
+        group, channel = rng.choice(CHANNELS)
+        try:
+            conn.execute("""
+                INSERT INTO slots (training_id, user_id, group_name, channel, payment_type, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, '2026-01-01T12:00:00')
+            """, (*training, rng.choice(USERS), group, channel, rng.choice(PAYMENT_TYPES), rng.choice(SLOT_STATUSES)))
+        except sqlite3.IntegrityError:
+            pass  # канал уже занят активной бронью (uq_slots_active_channel)
+        return
+
+    slot = pick(conn, rng, "SELECT id FROM slots")
+    if slot is None:
+        return
+    try:
+        if action == "slot_status":
+            conn.execute("UPDATE slots SET status = ? WHERE id = ?", (rng.choice(SLOT_STATUSES), *slot))
+        elif action == "slot_payment":
+            conn.execute("UPDATE slots SET payment_type = ? WHERE id = ?", (rng.choice(PAYMENT_TYPES), *slot))
+        elif action == "move_slot":
+            training = pick(conn, rng, "SELECT id FROM trainings")
+            if training:
+                conn.execute(
+                    "UPDATE slots SET training_id = ?, user_id = ? WHERE id = ?", (*training, rng.choice(USERS), *slot)
+                )
+        else:
+            conn.execute("DELETE FROM slots WHERE id = ?", slot)
+    except sqlite3.IntegrityError:
+        pass
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_triggers_match_rebuild(conn, seed):
+    rng = random.Random(seed)
+    for step in range(1, STEPS + 1):
+        mutate(conn, rng)
+        conn.commit()
+        if step % CHECK_EVERY == 0:
+            assert_matches_rebuild(conn)
+
+    assert conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0] > 50
+    assert conn.execute("SELECT MIN(visits), MIN(slots) FROM stats_user_month").fetchone() >= (0, 0)
@@ -0,0 +1,78 @@
+"""Фоновое обновление tg_users: неудачные попытки записываются и не вытесняют остальных."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from database import tg_users
+from database.tg_users import refresh_tg_users, resolve_tg_user
+
+
+class FakeBot:
+    """get_chat_member падает для failing (пользователь заблокировал бота, удалил аккаунт, …)."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls: list[int] = []
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append(user_id)
+        if user_id in self.failing:
+            raise RuntimeError("Bad Request: chat not found")
+        return SimpleNamespace(user=SimpleNamespace(username=f"user{user_id}", full_name=f"User {user_id}"))
+
+
+@pytest.fixture
+def users(conn, monkeypatch):
+    monkeypatch.setattr(tg_users, "REFRESH_BATCH", 3)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, nickname, system) VALUES (?, ?, 'HDZero')",
+            [(user_id, f"pilot{user_id}") for user_id in range(1, 8)],
+        )
+    return conn
+
+
+def fetched(conn) -> set[int]:
+    return {row[0] for row in conn.execute("SELECT user_id FROM tg_users WHERE fetched_at IS NOT NULL")}
+
+
+def test_failing_users_do_not_starve_the_batch(users):
+    conn = users
+    bot = FakeBot(failing={1, 2, 3})
+
+    for _ in range(3):
+        asyncio.run(refresh_tg_users(bot))
+
+    # первый пакет целиком неудачный, но следующие берут ещё не опробованных
+    assert bot.calls[:3] == [1, 2, 3]
+    assert fetched(conn) == {4, 5, 6, 7}
+    attempts = dict(conn.execute("SELECT user_id, last_attempt_at FROM tg_users WHERE fetched_at IS NULL"))
+    assert set(attempts) == {1, 2, 3} and all(attempts.values())
+
+
+def test_attempt_keeps_stale_profile(users, monkeypatch):
+    conn = users
+    monkeypatch.setattr(tg_users, "REFRESH_BATCH", 10)
+    with conn:
+        conn.execute("""
+            INSERT INTO tg_users (user_id, username, full_name, fetched_at)
+            VALUES (1, 'old', 'Old Name', '2020-01-01T00:00:00')
+        """)
+
+    asyncio.run(refresh_tg_users(FakeBot(failing={1})))
+
+    assert conn.execute(
+        "SELECT username, fetched_at, last_attempt_at IS NOT NULL FROM tg_users WHERE user_id = 1"
+    ).fetchone() == ("old", "2020-01-01T00:00:00", 1)
+
+
+def test_resolve_retries_after_failed_attempt(users):
+    conn = users
+    asyncio.run(resolve_tg_user(FakeBot(failing={5}), 5))
+
+    # строка с одной лишь попыткой — не профиль: следующий resolve снова спрашивает Telegram
+    bot = FakeBot()
+    assert asyncio.run(resolve_tg_user(bot, 5)) == ("user5", "User 5")
+    assert bot.calls == [5]
+    assert fetched(conn) == {5}
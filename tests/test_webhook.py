@@ -0,0 +1,94 @@
+"""Приём апдейтов webhook: обязательный секрет, 401 без него и ожидание фоновых апдейтов при остановке."""
+import asyncio
+
+import aiohttp
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiohttp import web
+
+import webhook
+
+SECRET = "s3cret"
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "pilot"},
+        "text": "hi",
+    },
+}
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", SECRET)
+
+
+def slow_dispatcher(handled: list):
+    dp = Dispatcher()
+    router = Router()
+
+    @router.message()
+    async def handler(message):
+        await asyncio.sleep(0.3)
+        handled.append(message.message_id)
+
+    dp.include_router(router)
+    return dp
+
+
+def test_webhook_requires_secret(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", None)
+    with pytest.raises(RuntimeError):
+        webhook.build_aiohttp_app(Dispatcher(), Bot("123456:TEST"))
+    with pytest.raises(RuntimeError):
+        webhook.build_fastapi_router(Dispatcher(), Bot("123456:TEST"))
+
+
+def test_aiohttp_secret_and_drain_on_shutdown(secret):
+    handled = []
+
+    async def scenario():
+        runner = web.AppRunner(webhook.build_aiohttp_app(slow_dispatcher(handled), Bot("123456:TEST")))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{webhook.WEBHOOK_PATH}"
+
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=UPDATE) as response:
+                assert response.status == 401
+            async with session.post(url, json=UPDATE, headers={webhook.SECRET_HEADER: "wrong"}) as response:
+                assert response.status == 401
+            async with session.post(url, json=UPDATE, headers={webhook.SECRET_HEADER: SECRET}) as response:
+                assert response.status == 200
+
+        # 200 ушёл сразу, хендлер ещё работает — остановка должна его дождаться
+        assert handled == []
+        await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert handled == [1]
+
+
+def test_fastapi_secret_and_drain(secret):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    handled = []
+    app = FastAPI()
+    app.include_router(webhook.build_fastapi_router(slow_dispatcher(handled), Bot("123456:TEST")))
+
+    with TestClient(app) as client:
+        assert client.post(webhook.WEBHOOK_PATH, json=UPDATE).status_code == 401
+        assert client.post(
+            webhook.WEBHOOK_PATH, json=UPDATE, headers={webhook.SECRET_HEADER: "wrong"}
+        ).status_code == 401
+        assert client.post(
+            webhook.WEBHOOK_PATH, json=UPDATE, headers={webhook.SECRET_HEADER: SECRET}
+        ).status_code == 200
+        assert handled == []
+        client.portal.call(webhook.drain_updates)
+        assert handled == [1]
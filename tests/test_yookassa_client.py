@@ -0,0 +1,123 @@
+"""YooKassaClient против локальной заглушки: задержки, 5xx, таймауты и повторы с одним Idempotence-Key."""
+import asyncio
+import uuid
+
+import pytest
+
+from fake_yookassa import FakeYooKassa
+from payments.client import YooKassaClient, YooKassaError
+
+PAYLOAD = {"amount": {"value": "1000.00", "currency": "RUB"}, "metadata": {"payment_id": "1"}}
+
+
+def client_for(fake: FakeYooKassa, **kwargs) -> YooKassaClient:
+    kwargs.setdefault("backoff", 0.01)
+    return YooKassaClient(fake.url, "shop", "secret", **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_retry_reuses_idempotence_key():
+    async def scenario():
+        async with FakeYooKassa(fail_first=2) as fake:
+            client = client_for(fake)
+            try:
+                payment = await client.create_payment(PAYLOAD, idempotence_key="key-1")
+            finally:
+                await client.close()
+            return fake, payment
+
+    fake, payment = run(scenario())
+    assert fake.requests == [("POST", "key-1")] * 3
+    assert list(fake.by_key) == ["key-1"]
+    assert payment["id"] == fake.by_key["key-1"]["id"]
+
+
+def test_lost_response_does_not_create_second_payment():
+    # платёж создан, но ответ потерян (503) — повтор с тем же ключом возвращает тот же платёж
+    async def scenario():
+        async with FakeYooKassa(lost_responses=2) as fake:
+            client = client_for(fake)
+            try:
+                payment = await client.create_payment(PAYLOAD, idempotence_key="key-1")
+            finally:
+                await client.close()
+            return fake, payment
+
+    fake, payment = run(scenario())
+    assert fake.attempts == {"key-1": 3}
+    assert len(fake.payments) == 1
+    assert payment["id"] in fake.payments
+
+
+def test_concurrent_payments_under_latency_and_errors():
+    async def scenario():
+        async with FakeYooKassa(latency=(0.02, 0.08), error_rate=0.3, seed=8) as fake:
+            client = client_for(fake, retries=6, max_concurrency=5)
+            keys = [str(uuid.uuid4()) for _ in range(50)]
+            try:
+                payments = await asyncio.gather(*(client.create_payment(PAYLOAD, key) for key in keys))
+            finally:
+                await client.close()
+            return fake, keys, payments
+
+    fake, keys, payments = run(scenario())
+    # каждый ключ — ровно один платёж, хотя часть запросов повторялась
+    assert len({payment["id"] for payment in payments}) == 50
+    assert len(fake.payments) == 50
+    assert set(fake.by_key) == set(keys)
+    assert max(fake.attempts.values()) > 1
+    assert fake.max_in_flight <= 5
+
+
+def test_timeout_is_retried():
+    async def scenario():
+        async with FakeYooKassa(latency=(0.3, 0.3)) as fake:
+            client = client_for(fake, timeout=0.1, retries=2)
+            try:
+                with pytest.raises(asyncio.TimeoutError):
+                    await client.create_payment(PAYLOAD, idempotence_key="slow")
+            finally:
+                await client.close()
+            # ответа дождаться не успели, но ключ во всех попытках один
+            await asyncio.sleep(0.35)
+            return fake
+
+    fake = run(scenario())
+    assert fake.requests == [("POST", "slow")] * 3
+    assert len(fake.payments) == 1
+
+
+def test_gives_up_after_retries():
+    async def scenario():
+        async with FakeYooKassa(fail_first=100) as fake:
+            client = client_for(fake, retries=3)
+            try:
+                with pytest.raises(YooKassaError) as error:
+                    await client.create_payment(PAYLOAD, idempotence_key="key-1")
+            finally:
+                await client.close()
+            return fake, error.value
+
+    fake, error = run(scenario())
+    assert error.status == 503
+    assert fake.attempts == {"key-1": 4}
+    assert not fake.payments
+
+
+def test_client_error_is_not_retried():
+    async def scenario():
+        async with FakeYooKassa() as fake:
+            client = client_for(fake)
+            try:
+                with pytest.raises(YooKassaError) as error:
+                    await client.request("GET", "payments/unknown")
+            finally:
+                await client.close()
+            return fake, error.value
+
+    fake, error = run(scenario())
+    assert error.status == 404
+    assert fake.requests == [("GET", "unknown")]
@@ -0,0 +1,47 @@
+"""Вебхук Юкассы в api_server: событие, которое нельзя применить, подтверждается 200, а не 500."""
+import pytest
+from fastapi.testclient import TestClient
+
+from api.api_server import app
+
+
+@pytest.fixture
+def client(database):
+    return TestClient(app)
+
+
+def event(metadata) -> dict:
+    return {"event": "payment.succeeded", "object": {"id": "yk-1", "status": "succeeded", "metadata": metadata}}
+
+
+@pytest.mark.parametrize("body", [
+    event({}),
+    event(None),
+    event({"payment_id": "abc"}),
+    event({"payment_id": ["1"]}),
+    {"event": "payment.succeeded", "object": None},
+    ["payment.succeeded"],
+])
+def test_unusable_event_is_acknowledged(client, conn, body):
+    response = client.post("/yookassa/webhook", json=body)
+    assert response.status_code == 200
+    assert conn.execute("SELECT COUNT(*) FROM webhook_events").fetchone()[0] == 0
+
+
+def test_body_not_json_is_acknowledged(client):
+    response = client.post("/yookassa/webhook", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+
+
+def test_numeric_string_payment_id_is_applied(client, conn):
+    with conn:
+        conn.execute("""
+            INSERT INTO payments (user_id, amount, status, payment_method, target_type, target_id, created_at)
+            VALUES (1, 1000, 'pending', 'sbp', 'unknown', 0, '2026-10-18T12:00:00')
+        """)
+    payment_id = conn.execute("SELECT id FROM payments").fetchone()[0]
+
+    response = client.post("/yookassa/webhook", json=event({"payment_id": str(payment_id)}))
+
+    assert response.status_code == 200
+    assert conn.execute("SELECT status FROM payments WHERE id = ?", (payment_id,)).fetchone()[0] == "succeeded"
@@ -0,0 +1,112 @@
+import asyncio
+import hmac
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from logging_config import logger
+from metrics import handle_metrics
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# сколько при остановке ждать апдейты, которые ещё обрабатываются в фоне
+DRAIN_TIMEOUT = 30
+
+# фоновые задачи апдейтов роутера FastAPI; ссылки держим, чтобы задачи не собрал GC
+_background: set[asyncio.Task] = set()
+
+
+def require_secret():
+    """Без WEBHOOK_SECRET эндпоинт принимал бы апдейты от кого угодно — webhook-режим не стартует."""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("❌ WEBHOOK_URL задан, а WEBHOOK_SECRET нет — webhook без секрета не запускаем")
+
+
+async def drain(tasks: set[asyncio.Task], timeout: float = DRAIN_TIMEOUT):
+    """Остановка: дожидается апдейтов в обработке; не успевшие за timeout отменяются."""
+    if not tasks:
+        return
+    logger.info(f"[webhook] ждём апдейтов в обработке: {len(tasks)}")
+    _, pending = await asyncio.wait(set(tasks), timeout=timeout)
+    if pending:
+        logger.warning(f"[webhook] не дождались {len(pending)} апдейтов за {timeout} с, отменяем")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def drain_updates():
+    """То же для роутера FastAPI — вызывается в lifespan api_server до dp.shutdown."""
+    await drain(_background)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    SimpleRequestHandler, который при остановке сервера сначала дожидается фоновых апдейтов
+    и только потом закрывает сессию бота — иначе хендлеры не смогли бы ответить.
+    """
+
+    async def close(self):
+        await drain(self._background_feed_update_tasks)
+        await super().close()
+
+
+async def register_webhook(bot: Bot, dispatcher: Dispatcher):
+    """Регистрирует webhook в Telegram. Вызывается из dp.startup (аргументы подставляет aiogram)."""
+    url = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+    await bot.set_webhook(
+        url=url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+    )
+    logger.info(f"[webhook] зарегистрирован {url}")
+
+
+def build_aiohttp_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """
+    Отдельный aiohttp-сервер для апдейтов. handle_in_background: Telegram сразу получает 200,
+    апдейт обрабатывается в фоновой задаче. Неверный secret token — 401.
+    Здесь же GET /metrics бота.
+    """
+    require_secret()
+    app = web.Application()
+    DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/metrics", handle_metrics)
+    setup_application(app, dp, bot=bot)  # dp.startup / dp.shutdown вместе с сервером
+    return app
+
+
+def build_fastapi_router(dp: Dispatcher, bot: Bot):
+    """
+    Тот же приём апдейтов, но как роутер для api/api_server.py (совмещённый деплой).
+    startup / shutdown диспетчера вызывает приложение, в которое роутер подключён;
+    перед shutdown оно должно дождаться drain_updates().
+    """
+    from fastapi import APIRouter, HTTPException, Request
+
+    require_secret()
+    router = APIRouter()
+
+    @router.post(WEBHOOK_PATH)
+    async def telegram_webhook(request: Request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET):
+            raise HTTPException(status_code=401)
+
+        task = asyncio.create_task(process(await request.json()))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        return {"ok": True}
+
+    async def process(data: dict):
+        try:
+            await dp.feed_raw_update(bot, data)
+        except Exception as e:
+            logger.exception(f"[webhook] ошибка обработки апдейта: {e}")
+
+    return router